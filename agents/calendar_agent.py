@@ -1,7 +1,10 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from clients.notion_client import NotionClient
 from clients.gemini_client import GeminiClient
-from utils.utils import parse_date_string, parse_natural_language_date
+from utils.date_parser import parse_date, parse_natural_language_date, tomorrow
+from utils import deadline, timezones, tracing
+from utils.interval_index import IntervalIndex
+from utils.name_index import AMBIGUITY_MARGIN, NameIndex, ttl_from_env
 
 class CalendarAgent:
     """Agent for managing calendar events in Notion with AI capabilities."""
@@ -11,11 +14,102 @@ class CalendarAgent:
         self.notion_client = NotionClient()
         self.gemini_client = GeminiClient(memory_manager=memory_manager)
         self.memory_manager = memory_manager
+        # Event names for resolving "the standup" to an event, kept in step with Notion
+        self.event_names = NameIndex("event_name", date_field="start_date")
+        self.name_index_ttl = ttl_from_env()
+        # Event times for finding overlaps, kept in step with the name index
+        self.event_spans = IntervalIndex()
     
+    def _sync_events(self, events):
+        """Bring the event indexes in line with a fresh list of every event."""
+        self.event_names.sync(events)
+        self.event_spans.sync(events)
+    
+    def _current_events(self):
+        """All events, from the indexes while they're fresh, else fetched from Notion (re-syncing them)."""
+        if not self.event_names.is_fresh(self.name_index_ttl):
+            self._sync_events(self.notion_client.get_calendar_events())
+        return self.event_names.items()
+    
+    def _remember_event(self, event):
+        """Index a created or updated event and find the events it overlaps.
+        
+        Returns:
+            list: The other events overlapping it, by start time
+        """
+        self._current_events()
+        self.event_names.add(event)
+        self.event_spans.add(event)
+        return self.event_spans.conflicts_with(event)
+    
+    @staticmethod
+    def _conflict_note(conflicts):
+        """Sentence warning about overlapping events, or "" if there are none."""
+        if not conflicts:
+            return ""
+        names = ", ".join(f"'{event.get('event_name', 'Untitled')}' ({event.get('start_date', 'unknown date')})"
+                          for event in conflicts)
+        return f". Note: it overlaps with {names}"
+    
+    def find_conflicts(self, start=None, end=None):
+        """Find every pair of events that overlap within a time range.
+        
+        Args:
+            start: Range start (datetime, date, or a string such as "2025-03-05" or "next monday"; defaults to now)
+            end: Range end (defaults to a week after start)
+            
+        Returns:
+            list: (earlier event, later event) tuples, by the later event's start
+        
+        Raises:
+            ValueError: If start or end is a string that isn't a date
+        """
+        self._current_events()
+        if start is None:
+            start = timezones.now()
+        start, end = self._parse_bound(start), self._parse_bound(end)
+        if end is None:
+            end = start + timedelta(days=7)
+        return self.event_spans.find_conflicts(start, end)
+    
+    @staticmethod
+    def _parse_bound(value):
+        """Parse a find_conflicts range bound given as a string (ISO or natural language)."""
+        if not isinstance(value, str):
+            return value
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f"Could not parse date: {value}")
+        return parsed
+    
+    def _resolve_event(self, event_name, action):
+        """Find the event an event name refers to through the name index.
+        
+        Args:
+            event_name (str): Event name as the user wrote it
+            action (str): What is being done, for the message asking which event was meant
+        
+        Returns:
+            tuple: (event, None) for a match, (None, error result listing the candidates) when
+                several events match about equally well, or (None, None) when nothing matches
+        """
+        resolution = self.event_names.resolve(event_name)
+        if resolution["ambiguous"]:
+            close = [event for event, score in resolution["candidates"] if resolution["score"] - score < AMBIGUITY_MARGIN]
+            names = ", ".join(f"'{event.get('event_name', 'Untitled')}' on {event.get('start_date', 'unknown date')}" for event in close)
+            return None, {
+                "status": "error",
+                "message": f"Several events match '{event_name}': {names}. Which one do you want to {action}?",
+                "candidates": close
+            }
+        return resolution["item"], None
+    
+    @tracing.traced("calendar_agent.process_request")
     def process_request(self, user_input):
         """Process a natural language request from the user."""
         # Get current events for context
         current_events = self.notion_client.get_calendar_events()
+        self._sync_events(current_events)
         
         # Use Gemini to suggest what action to take
         action_suggestion = self.gemini_client.suggest_calendar_actions(user_input, current_events)
@@ -40,6 +134,7 @@ class CalendarAgent:
         else:
             return {"status": "error", "message": "I'm not sure what you want to do with your calendar."}
     
+    @tracing.traced("calendar_agent.create_event_from_text")
     def create_event_from_text(self, text):
         """Create a new calendar event from natural language text."""
         # Extract event information from text
@@ -55,29 +150,31 @@ class CalendarAgent:
         if "start_date" in event_data:
             try:
                 # Try to convert natural language date to ISO string
-                from utils.date_parser import parse_natural_language_date
                 parsed_date = parse_natural_language_date(event_data["start_date"])
                 if parsed_date:
                     event_data["start_date"] = parsed_date
                 else:
                     # If date parsing fails, set to tomorrow
-                    event_data["start_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+                    event_data["start_date"] = tomorrow().isoformat()
             except Exception as e:
                 print(f"Error parsing date: {str(e)}")
                 # If date parsing fails, set to tomorrow
-                event_data["start_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+                event_data["start_date"] = tomorrow().isoformat()
         else:
             # Default start date to tomorrow if not specified
-            event_data["start_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+            event_data["start_date"] = tomorrow().isoformat()
         
         # Create the event in Notion
         result = self.notion_client.create_calendar_event(event_data)
         
         if result:
+            conflicts = self._remember_event(result)
             return {
                 "status": "success",
-                "message": f"Created event '{result.get('event_name', 'Untitled')}' on {result.get('start_date', 'unknown date')}",
-                "event": result
+                "message": f"Created event '{result.get('event_name', 'Untitled')}' on {result.get('start_date', 'unknown date')}"
+                           f"{self._conflict_note(conflicts)}",
+                "event": result,
+                "conflicts": conflicts
             }
         else:
             return {
@@ -85,6 +182,7 @@ class CalendarAgent:
                 "message": "Failed to create the event in Notion."
             }
     
+    @tracing.traced("calendar_agent.read_events_from_text")
     def read_events_from_text(self, text):
         """Read calendar events based on natural language text."""
         # Extract date information from text
@@ -95,30 +193,35 @@ class CalendarAgent:
         
         if "start_date" in date_info:
             try:
-                start_date = parse_natural_language_date(date_info["start_date"])
+                start_date = parse_date(date_info["start_date"])
             except ValueError:
                 pass
         
         if "end_date" in date_info:
             try:
-                end_date = parse_natural_language_date(date_info["end_date"])
+                end_date = parse_date(date_info["end_date"])
             except ValueError:
                 pass
         
         # If no dates specified, default to current week
         if not start_date and not end_date:
-            today = datetime.now()
+            # Whole days in the user's zone, so the range doesn't shift with the time of day
+            today = timezones.now().replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
             start_of_week = today - timedelta(days=today.weekday())
-            end_of_week = start_of_week + timedelta(days=6)
-            start_date = start_of_week
-            end_date = end_of_week
+            end_of_week = start_of_week + timedelta(days=7) - timedelta(microseconds=1)
+            start_date = timezones.localize(start_of_week, timezones.current_zone())
+            end_date = timezones.localize(end_of_week, timezones.current_zone())
         
         # Get events from Notion
         events = self.notion_client.get_calendar_events(start_date, end_date)
         
         if events:
-            # Generate a summary of the events
-            summary = self.gemini_client.generate_event_summary(events)
+            if deadline.should_degrade():
+                # Not enough of the request's budget left for an LLM summary; return the raw list
+                summary = f"Found {len(events)} event(s)."
+            else:
+                # Generate a summary of the events
+                summary = self.gemini_client.generate_event_summary(events)
             return {
                 "status": "success",
                 "message": summary,
@@ -139,38 +242,27 @@ class CalendarAgent:
                 "events": []
             }
     
+    @tracing.traced("calendar_agent.update_event_from_text")
     def update_event_from_text(self, text, event_id=None):
         """Update an existing calendar event based on natural language text."""
-        # Get current events for context
-        current_events = self.notion_client.get_calendar_events()
-        
         # Extract event information from text
         update_data = self.gemini_client.process_natural_language(text)
         
-        # If no event_id provided, try to find the event based on name or description
+        # If no event_id provided, try to find the event by name
         if not event_id:
-            event_keywords = ['software event', 'software', 'tech world']
-            matching_events = []
-            
-            for event in current_events:
-                event_name = event.get('event_name', '').lower()
-                for keyword in event_keywords:
-                    if keyword in text.lower() and keyword in event_name:
-                        matching_events.append(event)
-                        break
-            
-            if len(matching_events) == 1:
-                event_id = matching_events[0].get('id')
+            self._current_events()
+            match, ambiguous = self._resolve_event(update_data.get("event_name") or text, "update")
+            if ambiguous:
+                return ambiguous
+            if match:
+                event_id = match.get('id')
+                # The name identified the event; it isn't a new name for it
+                update_data.pop("event_name", None)
                 # Update the event data with existing values
                 update_data = {
-                    **matching_events[0],  # Keep existing data
+                    **match,  # Keep existing data
                     **update_data,  # Override with new data
                 }
-            elif len(matching_events) > 1:
-                return {
-                    "status": "error",
-                    "message": "Multiple matching events found. Please specify which event you want to update."
-                }
         
         if not event_id:
             return {
@@ -186,10 +278,12 @@ class CalendarAgent:
         result = self.notion_client.update_calendar_event(event_id, update_data)
         
         if result:
+            conflicts = self._remember_event(result)
             return {
                 "status": "success",
-                "message": f"Updated event '{result.get('event_name', 'Untitled')}' with new details",
-                "event": result
+                "message": f"Updated event '{result.get('event_name', 'Untitled')}' with new details{self._conflict_note(conflicts)}",
+                "event": result,
+                "conflicts": conflicts
             }
         else:
             return {
@@ -197,26 +291,34 @@ class CalendarAgent:
                 "message": "Failed to update the event in Notion."
             }
     
+    @staticmethod
+    def _same_moment(notion_date, requested_date):
+        """Whether a date Notion returned and a requested date are the same instant, whatever their zones."""
+        stored = timezones.from_notion(notion_date)
+        requested = parse_date(requested_date)
+        return stored is not None and requested is not None and timezones.utc_key(stored) == timezones.utc_key(requested)
+    
+    @tracing.traced("calendar_agent.delete_event_from_text")
     def delete_event_from_text(self, text, event_id=None):
         """Delete a calendar event based on natural language text."""
         # If no event_id provided, try to identify the event from the text
         if not event_id:
             # Get recent events to compare with
-            events = self.notion_client.get_calendar_events()
+            events = self._current_events()
             
             # Use Gemini to try to identify which event to delete
             event_data = self.gemini_client.process_natural_language(text)
             
-            # Try to match by name or date
-            if events and ("event_name" in event_data or "start_date" in event_data):
+            # Try to match by name, then by date
+            if events and "event_name" in event_data:
+                match, ambiguous = self._resolve_event(event_data["event_name"], "delete")
+                if ambiguous:
+                    return ambiguous
+                if match:
+                    event_id = match["id"]
+            if not event_id and events and "start_date" in event_data:
                 for event in events:
-                    if ("event_name" in event_data and 
-                        event.get("event_name", "").lower() == event_data["event_name"].lower()):
-                        event_id = event["id"]
-                        break
-                    elif ("start_date" in event_data and 
-                          "start_date" in event and 
-                          event["start_date"] == event_data["start_date"]):
+                    if "start_date" in event and self._same_moment(event["start_date"], event_data["start_date"]):
                         event_id = event["id"]
                         break
         
@@ -230,6 +332,8 @@ class CalendarAgent:
         result = self.notion_client.delete_calendar_event(event_id)
         
         if result:
+            self.event_names.remove(event_id)
+            self.event_spans.remove(event_id)
             return {
                 "status": "success",
                 "message": "Event deleted successfully."
@@ -2,8 +2,9 @@
 from clients.notion_client import NotionClient
 from clients.gemini_client import GeminiClient
 from utils import utils
-from utils.date_parser import parse_date_string, parse_natural_language_date
-from datetime import datetime, timedelta
+from utils.date_parser import parse_date_string, parse_natural_language_date, tomorrow
+from utils import deadline, tracing
+from utils.name_index import AMBIGUITY_MARGIN, NameIndex, ttl_from_env
 
 class TodoAgent:
     """Agent for managing todo items in Notion with AI capabilities."""
@@ -13,11 +14,46 @@ class TodoAgent:
         self.notion_client = NotionClient()
         self.gemini_client = GeminiClient(memory_manager=memory_manager)
         self.memory_manager = memory_manager
+        # Todo names for resolving "the report" to a todo, kept in step with Notion
+        self.todo_names = NameIndex("task_name", date_field="due_date")
+        self.name_index_ttl = ttl_from_env()
     
+    def _current_todos(self):
+        """All todos, from the name index while it's fresh, else fetched from Notion (re-syncing the index)."""
+        if not self.todo_names.is_fresh(self.name_index_ttl):
+            self.todo_names.sync(self.notion_client.get_todo_items())
+        return self.todo_names.items()
+    
+    def _resolve_todo(self, task_name, action):
+        """Find the todo a task name refers to through the name index.
+        
+        Args:
+            task_name (str): Task name as the user wrote it
+            action (str): What is being done, for the message asking which todo was meant
+        
+        Returns:
+            tuple: (todo_id, None) for a match, (None, error result listing the candidates) when
+                several todos match about equally well, or (None, None) when nothing matches
+        """
+        resolution = self.todo_names.resolve(task_name)
+        if resolution["ambiguous"]:
+            close = [todo for todo, score in resolution["candidates"] if resolution["score"] - score < AMBIGUITY_MARGIN]
+            names = ", ".join(f"'{todo.get('task_name', 'Untitled')}'" for todo in close)
+            return None, {
+                "status": "error",
+                "message": f"Several todo items match '{task_name}': {names}. Which one do you want to {action}?",
+                "candidates": close
+            }
+        if resolution["item"]:
+            return resolution["item"]["id"], None
+        return None, None
+    
+    @tracing.traced("todo_agent.process_request")
     def process_request(self, user_input):
         """Process a natural language request from the user."""
         # Get current todos for context
         current_todos = self.notion_client.get_todo_items()
+        self.todo_names.sync(current_todos)
         
         # Use Gemini to suggest what action to take
         action_suggestion = self.gemini_client.suggest_todo_actions(user_input, current_todos)
@@ -43,6 +79,7 @@ class TodoAgent:
             return {"status": "error", "message": "I'm not sure what you want to do with your todo list."}
     
     ## 2. Now, let's update the TodoAgent's create_todo_from_text method:
+    @tracing.traced("todo_agent.create_todo_from_text")
     def create_todo_from_text(self, text):
         """Create a new todo item from natural language text."""
         # Extract todo information from text
@@ -58,25 +95,25 @@ class TodoAgent:
         if "due_date" in todo_data:
             try:
                 # Try to convert natural language date to ISO string
-                from utils.date_parser import parse_natural_language_date
                 parsed_date = parse_natural_language_date(todo_data["due_date"])
                 if parsed_date:
                     todo_data["due_date"] = parsed_date
                 else:
                     # If date parsing fails, set to tomorrow
-                    todo_data["due_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+                    todo_data["due_date"] = tomorrow().isoformat()
             except Exception as e:
                 print(f"Error parsing date: {str(e)}")
                 # If date parsing fails, set to tomorrow
-                todo_data["due_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+                todo_data["due_date"] = tomorrow().isoformat()
         else:
             # Default due date to tomorrow if not specified
-            todo_data["due_date"] = (datetime.now() + timedelta(days=1)).isoformat()
+            todo_data["due_date"] = tomorrow().isoformat()
         
         # Create the todo in Notion
         result = self.notion_client.create_todo_item(todo_data)
         
         if result:
+            self.todo_names.add(result)
             due_date_str = ""
             if "due_date" in result and result["due_date"]:
                 due_date_str = f" with due date {result['due_date']}"
@@ -94,6 +131,7 @@ class TodoAgent:
                 "message": "Failed to create the todo item in Notion."
             }
     
+    @tracing.traced("todo_agent.read_todos_from_text")
     def read_todos_from_text(self, text):
         """Read todo items based on natural language text."""
         # Extract filter information from text
@@ -112,8 +150,12 @@ class TodoAgent:
         todos = self.notion_client.get_todo_items(filter_info)
         
         if todos:
-            # Generate a summary of the todos
-            summary = self.gemini_client.generate_todo_summary(todos)
+            if deadline.should_degrade():
+                # Not enough of the request's budget left for an LLM summary; return the raw list
+                summary = f"Found {len(todos)} todo item(s)."
+            else:
+                # Generate a summary of the todos
+                summary = self.gemini_client.generate_todo_summary(todos)
             return {
                 "status": "success",
                 "message": summary,
@@ -126,34 +168,22 @@ class TodoAgent:
                 "todos": []
             }
     
+    @tracing.traced("todo_agent.update_todo_from_text")
     def update_todo_from_text(self, text, todo_id=None):
         """Update an existing todo item from natural language text."""
         # If no todo_id provided, try to identify the todo from the text
         if not todo_id:
             # Get recent todos to compare with
-            todos = self.notion_client.get_todo_items()
+            todos = self._current_todos()
             
             # Use Gemini to try to identify which todo to update
             todo_data = self.gemini_client.process_natural_language(text)
             
-            # Try to match by name using fuzzy matching
+            # Find the best-matching todo by name
             if todos and "task_name" in todo_data:
-                task_name_lower = todo_data["task_name"].lower()
-                
-                # First try exact match
-                for todo in todos:
-                    if todo.get("task_name", "").lower() == task_name_lower:
-                        todo_id = todo["id"]
-                        break
-                
-                # If no exact match, try partial match
-                if not todo_id:
-                    for todo in todos:
-                        todo_name_lower = todo.get("task_name", "").lower()
-                        # Check if the task name contains the search term or vice versa
-                        if task_name_lower in todo_name_lower or todo_name_lower in task_name_lower:
-                            todo_id = todo["id"]
-                            break
+                todo_id, ambiguous = self._resolve_todo(todo_data["task_name"], "update")
+                if ambiguous:
+                    return ambiguous
             
             # If still no match and "status" indicates completion, try to find incomplete tasks
             if not todo_id and todo_data.get("status", "").lower() in ["done", "completed", "complete"]:
@@ -182,6 +212,7 @@ class TodoAgent:
         result = self.notion_client.update_todo_item(todo_id, update_data)
         
         if result:
+            self.todo_names.add(result)
             return {
                 "status": "success",
                 "message": f"Updated todo '{result.get('task_name', 'Untitled')}'",
@@ -193,34 +224,22 @@ class TodoAgent:
                 "message": "Failed to update the todo item in Notion."
             }
     
+    @tracing.traced("todo_agent.delete_todo_from_text")
     def delete_todo_from_text(self, text, todo_id=None):
         """Delete a todo item based on natural language text."""
         # If no todo_id provided, try to identify the todo from the text
         if not todo_id:
             # Get recent todos to compare with
-            todos = self.notion_client.get_todo_items()
+            todos = self._current_todos()
             
             # Use Gemini to try to identify which todo to delete
             todo_data = self.gemini_client.process_natural_language(text)
             
-            # Try to match by name using fuzzy matching
+            # Find the best-matching todo by name
             if todos and "task_name" in todo_data:
-                task_name_lower = todo_data["task_name"].lower()
-                
-                # First try exact match
-                for todo in todos:
-                    if todo.get("task_name", "").lower() == task_name_lower:
-                        todo_id = todo["id"]
-                        break
-                
-                # If no exact match, try partial match
-                if not todo_id:
-                    for todo in todos:
-                        todo_name_lower = todo.get("task_name", "").lower()
-                        # Check if the task name contains the search term or vice versa
-                        if task_name_lower in todo_name_lower or todo_name_lower in task_name_lower:
-                            todo_id = todo["id"]
-                            break
+                todo_id, ambiguous = self._resolve_todo(todo_data["task_name"], "delete")
+                if ambiguous:
+                    return ambiguous
             
             # If still no match and "status" indicates completion, try to find incomplete tasks
             if not todo_id and todo_data.get("status", "").lower() in ["done", "completed", "complete"]:
@@ -240,6 +259,7 @@ class TodoAgent:
         result = self.notion_client.delete_todo_item(todo_id)
         
         if result:
+            self.todo_names.remove(todo_id)
             return {
                 "status": "success",
                 "message": "Todo item deleted successfully."
@@ -250,23 +270,30 @@ class TodoAgent:
                 "message": "Failed to delete the todo item in Notion."
             }
 
+    @tracing.traced("todo_agent.mark_todo_as_done")
     def mark_todo_as_done(self, text):
         """Mark a todo item as done based on natural language text."""
         # Get recent todos to compare with
-        todos = self.notion_client.get_todo_items()
+        todos = self._current_todos()
         
         # Use Gemini to try to identify which todo to mark as done
         todo_data = self.gemini_client.process_natural_language(text)
         
+        # "Mark groceries, laundry and the report as done" names several todos
+        task_names = todo_data.get("task_names")
+        if isinstance(task_names, str):
+            task_names = [task_names]
+        if todos and isinstance(task_names, list) and len(task_names) > 1:
+            return self._mark_todos_as_done([str(name) for name in task_names])
+        if task_names and "task_name" not in todo_data:
+            todo_data["task_name"] = str(task_names[0])
+        
         todo_id = None
-        # Try to match by name
+        # Find the best-matching todo by name; open todos win ties over completed ones
         if todos and "task_name" in todo_data:
-            print(f"Looking for task: '{todo_data['task_name']}'")
-            for todo in todos:
-                if "task_name" in todo and todo_data["task_name"].lower() in todo["task_name"].lower():
-                    todo_id = todo["id"]
-                    print(f"Found matching task: '{todo['task_name']}' with ID: {todo_id}")
-                    break
+            todo_id, ambiguous = self._resolve_todo(todo_data["task_name"], "mark as done")
+            if ambiguous:
+                return ambiguous
         
         if not todo_id:
             return {
@@ -279,6 +306,7 @@ class TodoAgent:
         result = self.notion_client.update_todo_item(todo_id, update_data)
         
         if result:
+            self.todo_names.add(result)
             return {
                 "status": "success",
                 "message": f"Marked todo '{result.get('task_name', 'Untitled')}' as completed",
@@ -288,4 +316,52 @@ class TodoAgent:
             return {
                 "status": "error",
                 "message": "Failed to update the todo item in Notion."
-            }
\ No newline at end of file
+            }
+    
+    def _mark_todos_as_done(self, task_names):
+        """Mark several todos as done with one concurrent round of updates.
+        
+        Every name is resolved against the name index first; the todos found are then updated
+        together under the Notion rate limit, and the outcome is reported as one result.
+        
+        Args:
+            task_names (list): Task names as the user wrote them
+            
+        Returns:
+            dict: Combined result; "todos" holds the todos marked as done and "unresolved" the
+                names that matched no todo, or several equally well
+        """
+        todo_ids = []
+        unresolved = []
+        problems = []
+        for task_name in task_names:
+            todo_id, ambiguous = self._resolve_todo(task_name, "mark as done")
+            if ambiguous:
+                unresolved.append(task_name)
+                problems.append(ambiguous["message"])
+            elif not todo_id:
+                unresolved.append(task_name)
+                problems.append(f"No todo item matches '{task_name}'.")
+            elif todo_id not in todo_ids:
+                todo_ids.append(todo_id)
+        
+        results = self.notion_client.update_todo_items([(todo_id, {"status": "Completed"}) for todo_id in todo_ids])
+        completed = []
+        for todo_id, result in zip(todo_ids, results):
+            if result:
+                self.todo_names.add(result)
+                completed.append(result)
+            else:
+                problems.append(f"Failed to update '{self.todo_names.get(todo_id, {}).get('task_name', todo_id)}' in Notion.")
+        
+        messages = []
+        if completed:
+            names = ", ".join(f"'{todo.get('task_name', 'Untitled')}'" for todo in completed)
+            messages.append(f"Marked {len(completed)} todo(s) as completed: {names}.")
+        messages.extend(problems)
+        return {
+            "status": "success" if completed and not problems else "error",
+            "message": " ".join(messages) or "I couldn't identify which todo items you want to mark as done.",
+            "todos": completed,
+            "unresolved": unresolved
+        }
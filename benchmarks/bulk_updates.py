@@ -0,0 +1,70 @@
+"""Throughput of marking many todos as done: one PATCH after another vs. update_todo_items.
+
+Notion is simulated with a fixed latency per request, so no API key or network is needed. For each
+rate limit the bulk path should approach min(rate, workers / latency) updates per second:
+
+    python benchmarks/bulk_updates.py --todos 12 --latency-ms 300 --rates 3 6 12
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholders so NotionClient can be created without credentials; nothing is sent
+os.environ.setdefault("NOTION_API_KEY", "benchmark")
+os.environ.setdefault("NOTION_ENDPOINT", "https://api.notion.com/v1")
+os.environ.setdefault("NOTION_PAGE_ID", "00000000-0000-0000-0000-000000000000")
+
+from clients.notion_client import NotionClient
+from utils.rate_limiter import RateLimiter
+
+
+class SimulatedNotionClient(NotionClient):
+    """NotionClient whose requests take a fixed time and echo the page back instead of going out."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def _send_request(self, method, url, data, span):
+        time.sleep(self.latency)
+        properties = {"Task": {"title": [{"text": {"content": url.rsplit("/", 1)[-1]}}]},
+                      "Due Date": {"date": None}, "Priority": {"select": None}, "Notes": {"rich_text": []},
+                      "Status": {"select": (data or {}).get("properties", {}).get("Status", {}).get("select")}}
+        return {"id": url.rsplit("/", 1)[-1], "properties": properties}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sequential and bulk todo updates")
+    parser.add_argument("--todos", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent requests (default NOTION_BULK_WORKERS)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[3, 6, 12], help="Rate limits to try (requests/s)")
+    args = parser.parse_args()
+
+    client = SimulatedNotionClient(args.latency_ms / 1000)
+    if args.workers:
+        client.bulk_workers = args.workers
+    updates = [(f"todo-{i}", {"status": "Completed"}) for i in range(args.todos)]
+
+    started = time.perf_counter()
+    for todo_id, todo_data in updates:
+        client.update_todo_item(todo_id, todo_data)
+    sequential = time.perf_counter() - started
+    print(f"{args.todos} todos, {args.latency_ms:.0f} ms per request, {client.bulk_workers} workers")
+    print(f"  one by one:       {sequential:6.2f} s ({args.todos / sequential:5.1f} updates/s)")
+
+    for rate in args.rates:
+        client.rate_limiter = RateLimiter(rate, burst=client.bulk_workers)
+        started = time.perf_counter()
+        results = client.update_todo_items(updates)
+        elapsed = time.perf_counter() - started
+        failed = sum(result is None for result in results)
+        print(f"  bulk at {rate:4.1f}/s:   {elapsed:6.2f} s ({args.todos / elapsed:5.1f} updates/s)"
+              + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Finding overlapping events: comparing against every event vs. the interval index.
+
+Builds a synthetic calendar (timed meetings plus some all-day events), then times the conflict
+check run when an event is created, and listing every overlapping pair in a week, both ways:
+
+    python benchmarks/calendar_conflicts.py --events 5000 --checks 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import timezones
+from utils.interval_index import IntervalIndex, event_span
+
+NOTION_FORMAT = "%Y-%m-%dT%H:%M:%S.000+00:00"
+
+
+def synthetic_events(count, days=365, seed=5):
+    """Events over a year: mostly 15 minute to 3 hour meetings, one in ten all day."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    events = []
+    for number in range(count):
+        begins = start + timedelta(minutes=15 * rng.randrange(days * 24 * 4))
+        event = {"id": f"event-{number}", "event_name": f"Event {number}"}
+        if rng.random() < 0.1:
+            event["start_date"] = begins.date().isoformat()
+        else:
+            event["start_date"] = begins.strftime(NOTION_FORMAT)
+            event["end_date"] = (begins + timedelta(minutes=15 * rng.randrange(1, 13))).strftime(NOTION_FORMAT)
+        events.append(event)
+    return events
+
+
+def overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare linear and indexed event conflict detection")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--checks", type=int, default=1000)
+    args = parser.parse_args()
+
+    with timezones.user_zone(timezones.get_zone("UTC")):
+        events = synthetic_events(args.events)
+        spans = [event_span(event) for event in events]
+        checks = random.Random(9).sample(range(len(events)), min(args.checks, len(events)))
+
+        started = time.perf_counter()
+        index = IntervalIndex()
+        index.sync(events)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        linear = [sum(1 for j, span in enumerate(spans) if j != i and overlaps(spans[i], span)) for i in checks]
+        linear_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        indexed = [len(index.conflicts_with(events[i])) for i in checks]
+        indexed_ms = (time.perf_counter() - started) * 1000
+
+        week_start, week_end = datetime(2025, 6, 2), datetime(2025, 6, 9)
+        window = (week_start.replace(tzinfo=timezones.get_zone("UTC")).timestamp(),
+                  week_end.replace(tzinfo=timezones.get_zone("UTC")).timestamp())
+        started = time.perf_counter()
+        in_week = [span for span in spans if overlaps(span, window)]
+        pairwise = sum(1 for i, a in enumerate(in_week) for b in in_week[i + 1:] if overlaps(a, b))
+        pairwise_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        swept = len(index.find_conflicts(week_start, week_end))
+        sweep_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{args.events} events (index built in {build_ms:.0f} ms)")
+    print(f"  conflicts of one event, linear: {linear_ms * 1000 / len(checks):8.1f} us")
+    print(f"  conflicts of one event, index:  {indexed_ms * 1000 / len(checks):8.1f} us")
+    print(f"  overlapping pairs in a week, pairwise: {pairwise_ms:7.2f} ms ({pairwise} pairs)")
+    print(f"  overlapping pairs in a week, sweep:    {sweep_ms:7.2f} ms ({swept} pairs)")
+    if linear != indexed or pairwise != swept:
+        print("  MISMATCH between linear and indexed results")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Formatting a column of dates for Notion one by one vs. in bulk, as when importing many rows.
+
+Builds rows with the date shapes imports bring (ISO dates, datetimes with and without offsets,
+a share of natural language) and times format_date_for_notion per row against
+format_dates_for_notion over the whole column:
+
+    python benchmarks/date_bulk.py --rows 10000 --natural 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import timezones
+from utils.date_parser import engine, np
+from utils.utils import format_date_for_notion, format_dates_for_notion
+
+NATURAL = ["tomorrow", "next friday at 3pm", "in 2 weeks", "monday at noon", "March 5", "day after tomorrow"]
+
+
+def synthetic_column(rows, natural_share, seed=3):
+    """Date strings shaped like the ones imported events and todos carry."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    column = []
+    for _ in range(rows):
+        moment = start + timedelta(minutes=rng.randrange(2 * 365 * 24 * 4) * 15)
+        kind = rng.random()
+        if kind < natural_share:
+            column.append(rng.choice(NATURAL))
+        elif kind < 0.4:
+            column.append(moment.strftime("%Y-%m-%d"))
+        elif kind < 0.7:
+            column.append(moment.strftime("%Y-%m-%dT%H:%M:%S"))
+        else:
+            column.append(moment.strftime("%Y-%m-%dT%H:%M:%S.000") + rng.choice(["Z", "+02:00", "-05:00"]))
+    return column
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and bulk date formatting")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--natural", type=float, default=0.05, help="Share of natural-language dates")
+    parser.add_argument("--zone", default="Europe/Berlin")
+    args = parser.parse_args()
+
+    column = synthetic_column(args.rows, args.natural)
+    print(f"{args.rows} rows, {args.natural:.0%} natural language, NumPy {'on' if np is not None else 'off'}")
+    with timezones.user_zone(timezones.get_zone(args.zone)):
+        engine.clear()
+        started = time.perf_counter()
+        one_by_one = [format_date_for_notion(value) for value in column]
+        row_ms = (time.perf_counter() - started) * 1000
+
+        engine.clear()
+        started = time.perf_counter()
+        bulk = format_dates_for_notion(column)
+        bulk_ms = (time.perf_counter() - started) * 1000
+
+    mismatches = sum(timezones.from_notion(a) != timezones.from_notion(b) for a, b in zip(one_by_one, bulk))
+    print(f"  per row: {row_ms:8.1f} ms ({row_ms * 1000 / args.rows:.2f} us/row)")
+    print(f"  bulk:    {bulk_ms:8.1f} ms ({bulk_ms * 1000 / args.rows:.2f} us/row), {row_ms / bulk_ms:.1f}x faster")
+    if mismatches:
+        print(f"  MISMATCH: {mismatches} rows differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
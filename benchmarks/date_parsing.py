@@ -0,0 +1,76 @@
+"""Per-call latency of date parsing over a corpus of the date expressions the agents receive.
+
+Compares the date engine without its memo (grammar, dateparser only as a fallback), the engine
+with its memo, and calling dateparser on every expression as the agents used to:
+
+    python benchmarks/date_parsing.py --rounds 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import metrics
+from utils.date_parser import DateEngine
+
+# Due and start dates as Gemini extracts them from requests, plus a few the grammar leaves to dateparser
+CORPUS = [
+    "today", "tomorrow", "Tomorrow", "tonight", "next week", "next month", "in 3 days", "in 2 weeks",
+    "after 2 days", "in a week", "in an hour", "in 30 minutes", "two days from now", "day after tomorrow",
+    "friday", "Friday", "next monday", "on wednesday", "this saturday", "next friday at 3pm",
+    "tomorrow at 10am", "tomorrow at 9:30", "monday at noon", "at 5pm", "2025-03-05", "2025-03-05T10:30:00",
+    "2025-03-05T10:30:00Z", "2025-03-05T10:30:00+02:00", "March 5", "march 5th", "5 March 2025",
+    "Dec 31, 2025", "the 3rd of june", "by end of day tomorrow", "finish by friday", "due next week",
+    "03/05/2025", "5 days ago", "a fortnight from now", "end of the month",
+]
+
+
+def measure(parse, corpus, rounds):
+    """Latencies in microseconds of parsing every expression of the corpus, rounds times."""
+    latencies = []
+    for _ in range(rounds):
+        for text in corpus:
+            started = time.perf_counter()
+            parse(text)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def report(name, latencies):
+    latencies.sort()
+    print(f"  {name:<22} mean {statistics.mean(latencies):>9.1f} us  p50 {latencies[len(latencies) // 2]:>9.1f} us  "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:>9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-call date parsing latency")
+    parser.add_argument("--rounds", type=int, default=20, help="Passes over the corpus")
+    args = parser.parse_args()
+
+    try:
+        import dateparser
+    except ImportError:
+        sys.exit("This benchmark needs dateparser")
+
+    engine = DateEngine(cache_size=0)
+    started = time.perf_counter()
+    engine.parse("a fortnight from now")
+    print(f"first dateparser call (import, locale loading): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    fallbacks = metrics.registry.counter("date_parser_fallbacks_total")
+    before = fallbacks.value
+    for text in CORPUS:
+        engine.parse(text)
+    print(f"{len(CORPUS)} expressions, {fallbacks.value - before} of them left to dateparser")
+
+    report("engine, no memo", measure(engine.parse, CORPUS, args.rounds))
+    memoized = DateEngine()
+    report("engine, memoized", measure(memoized.parse, CORPUS, args.rounds))
+    report("dateparser every call", measure(dateparser.parse, CORPUS, max(1, args.rounds // 4)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare the archive's compressed columnar segments with the pretty-printed JSON memory file.
+
+Builds a synthetic history, writes it both ways and reports disk footprint, load time and the
+cost of a search that has to decode archived segments:
+
+    python benchmarks/memory_archive.py --interactions 20000
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.archive import MemoryArchive
+from memory.memory_manager import extract_keywords
+
+TASKS = ["buy groceries", "finish quarterly report", "call the dentist", "review pull request",
+         "book flights to berlin", "renew passport", "prepare slides for monday", "water the plants"]
+
+
+def synthetic_history(count, seed=7):
+    """Interactions shaped like the ones the agents record, oldest first."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 8, 0)
+    interactions = []
+    for i in range(count):
+        task = f"{rng.choice(TASKS)} {rng.randint(1, 500)}"
+        timestamp = (start + timedelta(minutes=7 * i, microseconds=rng.randint(0, 999999))).isoformat()
+        agent_type = rng.choice(["todo", "calendar"])
+        interactions.append({
+            "id": hashlib.md5(f"{task}_{timestamp}".encode()).hexdigest(),
+            "timestamp": timestamp,
+            "user_input": f"add {task}" if agent_type == "todo" else f"schedule {task} tomorrow at 3pm",
+            "agent_response": {
+                "status": "success",
+                "message": "Task added successfully" if agent_type == "todo" else "Event created successfully",
+                "data": {"id": hashlib.md5(task.encode()).hexdigest()[:16], "title": task,
+                         "completed": False, "created_time": timestamp},
+            },
+            "metadata": {"agent_type": agent_type, "duration_ms": rng.randint(200, 3000)},
+        })
+    return interactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the compressed memory archive against memory_<type>.json")
+    parser.add_argument("--interactions", type=int, default=20000)
+    args = parser.parse_args()
+
+    interactions = synthetic_history(args.interactions)
+    workdir = tempfile.mkdtemp()
+    try:
+        json_file = os.path.join(workdir, "memory_bench.json")
+        with open(json_file, 'w') as f:
+            json.dump({"interactions": interactions, "patterns": {}, "preferences": {}}, f, indent=2)
+        json_bytes = os.path.getsize(json_file)
+        started = time.perf_counter()
+        with open(json_file, 'r') as f:
+            json.load(f)
+        json_load_ms = (time.perf_counter() - started) * 1000
+
+        base_path = os.path.join(workdir, "memory_bench")
+        started = time.perf_counter()
+        MemoryArchive(base_path, extract_keywords, max_interactions=0).add(interactions)
+        write_ms = (time.perf_counter() - started) * 1000
+
+        archive = MemoryArchive(base_path, extract_keywords, max_interactions=0)
+        started = time.perf_counter()
+        archived = archive.count()
+        open_ms = (time.perf_counter() - started) * 1000
+        archive_bytes = archive.size()
+
+        query = extract_keywords("finish quarterly report 42")
+        started = time.perf_counter()
+        archive.search(query)
+        cold_search_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        archive.search(query)
+        warm_search_ms = (time.perf_counter() - started) * 1000
+        archive.close()
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"{args.interactions} interactions")
+    print(f"  JSON (indent=2): {json_bytes / 1024:10.1f} KiB, full load {json_load_ms:8.1f} ms")
+    print(f"  archive:         {archive_bytes / 1024:10.1f} KiB, open {open_ms:8.1f} ms "
+          f"({archived} interactions, manifest only), write {write_ms:.1f} ms")
+    print(f"  footprint {json_bytes / archive_bytes:.1f}x smaller, load {json_load_ms / max(open_ms, 1e-3):.0f}x faster")
+    print(f"  search decoding archived segments: {cold_search_ms:.1f} ms cold, {warm_search_ms:.1f} ms cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare keyword (BM25) retrieval of relevant memories with keyword + embedding retrieval.
+
+Builds a synthetic history, then looks each probe interaction up again with its wording changed
+(inflected words, typos, synonyms) and reports recall@k and lookup latency for both:
+
+    python benchmarks/memory_retrieval.py --interactions 5000 --queries 300
+    python benchmarks/memory_retrieval.py --word-vectors glove.6B.100d.txt
+
+Synonyms are only bridged when word vectors are given; histories above 20000 interactions are
+searched through the approximate (IVF) index.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.embeddings import HashingEmbedder, SemanticIndex, WordVectorEmbedder, merge_rankings, np
+from memory.keyword_index import KeywordIndex
+from memory.memory_manager import COMMON_WORDS, extract_keywords
+
+VERBS = ["schedule", "book", "add", "remind me about", "cancel", "move", "plan", "confirm"]
+SUBJECTS = ["dentist appointment", "team meeting", "grocery shopping", "car service", "flight to berlin",
+            "quarterly report review", "doctor visit", "birthday dinner", "gym session", "client call",
+            "budget planning", "school pickup", "haircut", "invoice payment", "project deadline"]
+PEOPLE = ["anna", "the design team", "marco", "my manager", "the landlord", "sarah", "the accountant", "leo"]
+PROJECTS = ["apollo", "atlas", "hermes", "orion", "phoenix", "zephyr", "nova", "titan", "vega", "lyra", "juno", "kepler"]
+TIMES = ["tomorrow", "next monday", "on friday", "at 3pm", "this weekend", "tonight", "next week", "at noon"]
+SYNONYMS = {"appointment": "visit", "meeting": "sync", "grocery": "food", "shopping": "errands",
+            "flight": "plane", "review": "check", "doctor": "physician", "dinner": "meal", "session": "workout",
+            "call": "phone", "planning": "forecast", "payment": "bill", "deadline": "due date", "book": "reserve",
+            "schedule": "arrange", "cancel": "drop"}
+
+
+def synthetic_history(count, seed=11):
+    """Distinct commands shaped like the ones the agents record."""
+    if count > len(VERBS) * len(SUBJECTS) * len(PEOPLE) * len(PROJECTS) * len(TIMES):
+        raise ValueError(f"Can't make {count} distinct commands")
+    rng = random.Random(seed)
+    seen, history = set(), []
+    while len(history) < count:
+        text = (f"{rng.choice(VERBS)} {rng.choice(SUBJECTS)} with {rng.choice(PEOPLE)} "
+                f"for {rng.choice(PROJECTS)} {rng.choice(TIMES)}")
+        if text not in seen:
+            seen.add(text)
+            history.append(text)
+    return history
+
+
+def inflect(word):
+    if word.endswith("ing") and len(word) > 5:
+        return word[:-3]
+    if word.endswith("s"):
+        return word[:-1]
+    return word + "s" if len(word) > 3 else word
+
+
+def typo(word, rng):
+    if len(word) < 5:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    return word[:position] + word[position + 1:]
+
+
+def reword(text, kind, rng):
+    """The same request in other words: inflected, misspelled or with synonyms."""
+    words = text.split()
+    if kind == "inflection":
+        return " ".join(inflect(word) if rng.random() < 0.5 else word for word in words)
+    if kind == "typo":
+        return " ".join(typo(word, rng) if rng.random() < 0.5 else word for word in words)
+    return " ".join(SYNONYMS.get(word, word) for word in words)
+
+
+def measure(search, probes):
+    """Recall (share of probes whose original is among the results) and latencies in ms."""
+    hits, latencies = 0, []
+    for query, target in probes:
+        started = time.perf_counter()
+        results = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += target in [doc_id for doc_id, _ in results]
+    return hits / len(probes), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall and latency of keyword vs semantic memory retrieval")
+    parser.add_argument("--interactions", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300, help="Probes per kind of rewording")
+    parser.add_argument("--limit", type=int, default=5, help="k in recall@k")
+    parser.add_argument("--word-vectors", help="GloVe/word2vec text file or .npy with .vocab, as for MEMORY_WORD_VECTORS")
+    args = parser.parse_args()
+    if np is None:
+        sys.exit("This benchmark needs NumPy")
+
+    history = synthetic_history(args.interactions)
+    embedder = HashingEmbedder(stop_words=COMMON_WORDS)
+    if args.word_vectors:
+        embedder = WordVectorEmbedder(args.word_vectors, embedder)
+
+    keyword_index = KeywordIndex()
+    semantic_index = SemanticIndex(embedder)
+    started = time.perf_counter()
+    for doc_id, text in enumerate(history):
+        keyword_index.add(doc_id, extract_keywords(text))
+    keyword_build_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for doc_id, text in enumerate(history):
+        semantic_index.add(doc_id, text)
+    semantic_build_ms = (time.perf_counter() - started) * 1000
+
+    def keyword_search(query):
+        return keyword_index.bm25(extract_keywords(query), args.limit)
+
+    def hybrid_search(query):
+        # Same combination as MemoryManager.get_relevant_memories with MEMORY_SEMANTIC=1
+        return merge_rankings(keyword_search(query), semantic_index.search(query, args.limit), args.limit)
+
+    rng = random.Random(5)
+    print(f"{args.interactions} interactions, embeddings: {type(embedder).__name__} ({embedder.dimensions} dimensions)")
+    print(f"  index build: keyword {keyword_build_ms:.0f} ms, semantic {semantic_build_ms:.0f} ms")
+    print(f"  {'rewording':<12} {'keyword recall@' + str(args.limit):>18} {'hybrid recall@' + str(args.limit):>18}")
+    all_latencies = {"keyword": [], "hybrid": []}
+    for kind in ("exact", "inflection", "typo", "synonyms"):
+        targets = [rng.randrange(len(history)) for _ in range(args.queries)]
+        probes = [(history[target] if kind == "exact" else reword(history[target], kind, rng), target)
+                  for target in targets]
+        keyword_recall, keyword_latencies = measure(keyword_search, probes)
+        hybrid_recall, hybrid_latencies = measure(hybrid_search, probes)
+        all_latencies["keyword"] += keyword_latencies
+        all_latencies["hybrid"] += hybrid_latencies
+        print(f"  {kind:<12} {keyword_recall:>18.1%} {hybrid_recall:>18.1%}")
+
+    for name, latencies in all_latencies.items():
+        latencies.sort()
+        print(f"  {name} lookup: mean {statistics.mean(latencies):.3f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Stress test for memory shared between processes.
+
+Starts several processes that record interactions and preferences into the same memory type at
+the same time, every tenth one followed by a repeated command that is folded into a single
+interaction, then reloads the memory and checks that nothing was lost or duplicated:
+
+    python benchmarks/memory_stress.py --store jsonl --processes 4 --interactions 500
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+# Command every worker repeats; its repetitions are folded into one interaction with a count
+REPEATED_COMMAND = "show the summary report"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def configure(store):
+    """Settings every process uses: the chosen backend and no retention limits."""
+    os.environ["MEMORY_STORE"] = store
+    os.environ["MEMORY_MAX_INTERACTIONS"] = "0"
+    os.environ["MEMORY_MAX_PATTERNS"] = "0"
+
+
+def worker(store, memory_type, worker_id, interactions, start_event):
+    configure(store)
+    from memory.memory_manager import create_memory_manager
+
+    memory = create_memory_manager(memory_type)
+    start_event.wait()
+    for i in range(interactions):
+        memory.add_interaction(f"stress worker{worker_id} item{i}", {"status": "success"},
+                               {"agent_type": "todo", "worker": worker_id})
+        if i % 10 == 0:
+            memory.update_preference(f"worker{worker_id}", i)
+            memory.add_interaction(REPEATED_COMMAND, {"status": "success"}, {"agent_type": "todo"})
+    memory.update_preference(f"worker{worker_id}", interactions)
+    memory.close()
+
+
+def validate(memory, processes, interactions):
+    """Compare the reloaded memory with what the workers wrote.
+
+    Returns:
+        list: Description of every mismatch
+    """
+    problems = []
+    insights = memory.generate_insights()
+    expected = processes * interactions
+
+    # Processes that start repeating the command at the same moment may each create a record for it
+    repeated = [found for found in memory.get_relevant_memories(REPEATED_COMMAND, limit=processes + 1)
+                if found["user_input"] == REPEATED_COMMAND]
+    repetitions = sum(found.get("count", 1) for found in repeated)
+    expected_repetitions = processes * len(range(0, interactions, 10))
+    if repetitions != expected_repetitions:
+        problems.append(f"'{REPEATED_COMMAND}' counted {repetitions} times, expected {expected_repetitions}")
+
+    if insights["total_interactions"] != expected + expected_repetitions:
+        problems.append(f"{insights['total_interactions']} interactions counted, expected {expected + expected_repetitions}")
+
+    requests = sum(bucket["requests"] for _, bucket in memory.get_usage("day"))
+    if requests != expected + expected_repetitions:
+        problems.append(f"usage rollups counted {requests} requests, expected {expected + expected_repetitions}")
+
+    patterns = dict(memory.get_common_patterns(processes + 10))
+    if patterns.get("stress") != expected:
+        problems.append(f"pattern 'stress' counted {patterns.get('stress')} times, expected {expected}")
+    for worker_id in range(processes):
+        key = f"worker{worker_id}"
+        if patterns.get(key) != interactions:
+            problems.append(f"pattern '{key}' counted {patterns.get(key)} times, expected {interactions}")
+        value = memory.get_preference(key)
+        if value != interactions:
+            problems.append(f"preference '{key}' is {value}, expected {interactions}")
+    return problems
+
+
+def cleanup(memory_type):
+    for path in glob.glob(os.path.join(ROOT, "memory", f"memory_{memory_type}*")):
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write to one memory from several processes at once")
+    parser.add_argument("--store", choices=["json", "jsonl", "sqlite"], default="jsonl")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--interactions", type=int, default=500, help="Interactions recorded by each process")
+    args = parser.parse_args()
+
+    memory_type = f"stress_{os.getpid()}"
+    configure(args.store)
+    context = multiprocessing.get_context("spawn")
+    start_event = context.Event()
+    processes = [context.Process(target=worker, args=(args.store, memory_type, n, args.interactions, start_event))
+                 for n in range(args.processes)]
+
+    try:
+        for process in processes:
+            process.start()
+        started = time.perf_counter()
+        start_event.set()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        failed = [process.exitcode for process in processes if process.exitcode]
+        if failed:
+            print(f"{len(failed)} worker(s) failed")
+            sys.exit(1)
+
+        from memory.memory_manager import create_memory_manager
+        memory = create_memory_manager(memory_type)
+        problems = validate(memory, args.processes, args.interactions)
+        memory.close()
+    finally:
+        cleanup(memory_type)
+
+    total = args.processes * args.interactions
+    print(f"{args.store}: {args.processes} processes wrote {total} interactions in {elapsed:.2f}s "
+          f"({total / elapsed:.0f}/s)")
+    if problems:
+        for problem in problems:
+            print(f"  LOST: {problem}")
+        sys.exit(1)
+    print("  no lost or duplicated updates")
+
+
+if __name__ == "__main__":
+    main()
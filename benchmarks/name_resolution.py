@@ -0,0 +1,108 @@
+"""Resolving a task name the user typed to a todo: linear substring scan vs. the trigram name index.
+
+Builds a synthetic todo list, then times the first-hit substring scan the agents used to run
+against NameIndex.resolve for queries taken from the names (exact, partial and misspelled):
+
+    python benchmarks/name_resolution.py --items 5000 --queries 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.name_index import NameIndex
+
+VERBS = ["write", "review", "send", "call", "book", "finish", "plan", "update", "fix", "pay", "prepare", "submit"]
+OBJECTS = ["report", "invoice", "slides", "dentist", "flights", "budget", "newsletter", "roadmap", "taxes",
+           "contract", "groceries", "laundry", "proposal", "backup", "survey", "offsite", "hiring plan"]
+QUALIFIERS = ["q1", "q2", "q3", "q4", "for mom", "for the team", "draft", "final", "weekly", "monthly", "2025", "v2"]
+
+
+def synthetic_todos(count, seed=7):
+    """Todos with realistic, overlapping names, spread over a year of due dates."""
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    todos = []
+    for number in range(count):
+        name = f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)} #{number}"
+        todos.append({
+            "id": f"todo-{number}",
+            "task_name": name.title(),
+            "due_date": (start + timedelta(days=rng.randrange(365))).isoformat(),
+            "status": rng.choice(["Not started", "In progress", "Completed"]),
+        })
+    return todos
+
+
+def typo(text, rng):
+    """Swap two adjacent letters, the commonest typing slip."""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def queries_for(todos, count, seed=11):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        todo = rng.choice(todos)
+        name = todo["task_name"]
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append((name, todo["id"]))
+        elif kind < 0.7:
+            queries.append((name.lower(), todo["id"]))
+        else:
+            queries.append((typo(name, rng), todo["id"]))
+    return queries
+
+
+def linear_scan(todos, query):
+    """The matching the agents did before the name index: exact, then first substring hit."""
+    query = query.lower()
+    for todo in todos:
+        if todo.get("task_name", "").lower() == query:
+            return todo["id"]
+    for todo in todos:
+        name = todo.get("task_name", "").lower()
+        if query in name or name in query:
+            return todo["id"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare linear name matching with the trigram name index")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    todos = synthetic_todos(args.items)
+    queries = queries_for(todos, args.queries)
+
+    started = time.perf_counter()
+    index = NameIndex("task_name", date_field="due_date")
+    index.sync(todos)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    scanned = [linear_scan(todos, query) for query, _ in queries]
+    scan_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    resolved = [index.resolve(query) for query, _ in queries]
+    index_ms = (time.perf_counter() - started) * 1000
+
+    scan_correct = sum(found == expected for found, (_, expected) in zip(scanned, queries))
+    index_correct = sum(bool(r["item"]) and r["item"]["id"] == expected for r, (_, expected) in zip(resolved, queries))
+    print(f"{args.items} todos, {args.queries} queries (index built in {build_ms:.0f} ms)")
+    print(f"  linear scan: {scan_ms * 1000 / args.queries:8.1f} us/query, {scan_correct / args.queries:.1%} correct")
+    print(f"  name index:  {index_ms * 1000 / args.queries:8.1f} us/query, {index_correct / args.queries:.1%} correct")
+
+
+if __name__ == "__main__":
+    main()
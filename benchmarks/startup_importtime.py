@@ -0,0 +1,76 @@
+"""Startup import time of the application, from `python -X importtime`.
+
+Imports main.py in a fresh interpreter several times and reports the total import time and the
+slowest modules. Exits with status 1 if a module that should only load lazily was imported at
+startup, or if the median total exceeds --budget-ms, so it can guard against regressions:
+
+    python benchmarks/startup_importtime.py --runs 5 --budget-ms 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy modules that must stay out of startup (loaded on first use or by the warm-up thread)
+LAZY_MODULES = ["dateparser", "google.generativeai"]
+
+
+def import_times(module):
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        dict: Cumulative import time in microseconds of every module imported, by name
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            continue  # the header line
+        times[fields[2].strip()] = cumulative
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and check the application's startup import time")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the median total is above this")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [run.get(args.module, 0) / 1000 for run in runs]
+    total = statistics.median(totals)
+    print(f"import {args.module}: median {total:.1f} ms over {args.runs} runs (min {min(totals):.1f}, max {max(totals):.1f})")
+
+    last = runs[-1]
+    # Top-level packages only, so a package and its submodules aren't counted twice
+    packages = sorted(((name, us) for name, us in last.items() if "." not in name and name != args.module),
+                      key=lambda item: -item[1])
+    for name, us in packages[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in last]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"FAIL: {total:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,224 @@
+import functools
 import os
-import google.generativeai as genai
-from datetime import datetime, timedelta
 import re
+import threading
+import time
 import logging
-from utils.utils import get_env_variable, parse_natural_language_date
+from utils.utils import get_env_variable
+from utils.date_parser import normalize_relative_dates, relative_date_hints
+from utils.lazy_imports import lazy_module
+from utils import deadline, metrics, timezones, tracing
+from utils.resilience import CircuitBreaker, CircuitOpenError, hedged_call
+from concurrent.futures import ThreadPoolExecutor
+
+# The SDK takes a while to import; load it on the first call (or in the background, see lazy_imports)
+genai = lazy_module("google.generativeai")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Timeout for a single Gemini call when no request deadline is in effect
+DEFAULT_TIMEOUT = 30.0
+
+# Calls run here so the caller can stop waiting (or hedge) at will; each is also given what is
+# left of its budget as the SDK's own timeout, so an abandoned call frees its worker
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini")
+
+# One breaker per call type, shared by every client since they all talk to the same provider
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Hedge only once a call type has enough latency history for a meaningful p95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_MS = 50
+
+# Keywords used to pick an action locally while Gemini is unavailable
+LOCAL_ACTION_KEYWORDS = [
+    ("delete", ["delete", "remove", "cancel", "archive", "get rid of"]),
+    ("update", ["update", "change", "reschedule", "move", "rename", "edit", "postpone"]),
+    ("read", ["show", "list", "what", "which", "when", "read", "view", "see", "any", "upcoming"]),
+    ("create", ["add", "create", "new", "schedule", "remind", "book", "plan", "set up", "need to"]),
+]
+
+
+def get_breaker(call_type):
+    """Get the circuit breaker protecting a Gemini call type."""
+    with _breakers_lock:
+        if call_type not in _breakers:
+            _breakers[call_type] = CircuitBreaker(
+                f"gemini.{call_type}",
+                failure_rate=float(os.getenv("GEMINI_BREAKER_FAILURE_RATE", "0.5")),
+                slow_call_ms=float(os.getenv("GEMINI_SLOW_CALL_MS", "10000")),
+                open_seconds=float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30")),
+            )
+        return _breakers[call_type]
+
+@functools.lru_cache(maxsize=None)
+def _request_counter(call_type, outcome):
+    """Request counter of a call type and outcome, looked up once rather than on every call."""
+    return metrics.registry.counter("gemini_requests_total", "Gemini API requests", method=call_type, outcome=outcome)
+
+
+@functools.lru_cache(maxsize=None)
+def _latency_histogram(call_type):
+    """Latency histogram of a call type (also the sample the hedge delay is read from)."""
+    return metrics.registry.histogram("gemini_request_duration_ms", "Gemini API latency in milliseconds",
+                                      method=call_type)
+
+
+@functools.lru_cache(maxsize=None)
+def _token_counter(call_type, direction):
+    """Token counter of a call type, for the prompt ("in") or the response ("out")."""
+    return metrics.registry.counter("gemini_tokens_total", "Gemini tokens", method=call_type, direction=direction)
+
+
 class GeminiClient:
     """Client for interacting with the Google Gemini API."""
     
-    def __init__(self, memory_manager=None):
-        """Initialize the Gemini client with API key from environment variables."""
+    def __init__(self, memory_manager=None, hedging=None):
+        """Initialize the Gemini client with API key from environment variables.
+        
+        Args:
+            memory_manager (MemoryManager, optional): Memory used for context and history
+            hedging (bool, optional): Send a second request when the first is slower than the
+                call type's p95 latency (defaults to GEMINI_HEDGING)
+        """
         self.api_key = get_env_variable("GEMINI_API_KEY")
-        genai.configure(api_key=self.api_key)
         
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # The model is created on first use, so the SDK isn't imported until a prompt needs it
+        self._model = None
+        self._model_lock = threading.Lock()
         
         # Add memory manager
         self.memory_manager = memory_manager
+        
+        if hedging is None:
+            hedging = os.getenv("GEMINI_HEDGING", "").lower() in ("1", "true", "yes")
+        self.hedging = hedging
+    
+    @property
+    def model(self):
+        """The Gemini model, created (and the SDK configured) on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel('gemini-1.5-flash')
+        return self._model
+    
+    def generate(self, prompt, call_type="generate"):
+        """Send a prompt to the model and return the response text.
+        
+        Args:
+            prompt (str): The prompt to send
+            call_type (str): Name of the calling operation, used to label the trace span
+            
+        Returns:
+            str: The model's response text
+        """
+        # An already spent budget fails here, before Gemini (and its breaker) is involved
+        timeout = deadline.remaining_timeout(DEFAULT_TIMEOUT)
+        breaker = get_breaker(call_type)
+        if not breaker.allow():
+            metrics.registry.counter("gemini_short_circuits_total", "Gemini calls refused by an open circuit breaker",
+                                     method=call_type).inc()
+            raise CircuitOpenError(f"Circuit breaker for gemini.{call_type} is open")
+        
+        metrics.count_call("gemini")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracing.span(f"gemini.{call_type}", prompt_bytes=len(prompt.encode("utf-8")), retries=0) as span:
+                span.set_attribute("timeout_s", round(timeout, 3))
+                response = self._generate_content(prompt, timeout, call_type, span)
+                text = response.text
+                span.set_attribute("response_bytes", len(text.encode("utf-8")))
+                outcome = "ok"
+        except deadline.DeadlineExceeded:
+            outcome = "timeout"
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            breaker.record(outcome == "ok", duration_ms)
+            _request_counter(call_type, outcome).inc()
+            # A timed-out call only measures the budget it had; keeping it out also keeps the p95
+            # that _hedge_delay reads from creeping up to the timeout while Gemini is slow
+            if outcome != "timeout":
+                _latency_histogram(call_type).observe(duration_ms)
+        
+        tokens_in, tokens_out = self._token_counts(response, prompt, text)
+        _token_counter(call_type, "in").inc(tokens_in)
+        _token_counter(call_type, "out").inc(tokens_out)
+        return text
+    
+    def _generate_content(self, prompt, timeout, call_type, span):
+        """Call the model, giving up after timeout seconds and hedging slow calls if enabled."""
+        hedge_delay = self._hedge_delay(call_type) if self.hedging else None
+        
+        def on_hedge():
+            span.increment("retries")
+            span.set_attribute("hedge_delay_ms", round(hedge_delay * 1000, 1))
+            metrics.registry.counter("gemini_hedged_requests_total", "Gemini calls hedged with a second request",
+                                     method=call_type).inc()
+        
+        started = time.monotonic()
+        
+        def generate_content(prompt):
+            # A hedge, or a call that waited for a free worker, only gets what is left of the budget
+            left = timeout - (time.monotonic() - started)
+            if left <= 0:
+                raise deadline.DeadlineExceeded(f"No time left for Gemini within {timeout:.2f}s")
+            return self.model.generate_content(prompt, request_options={"timeout": left})
+        
+        return hedged_call(_executor, generate_content, (prompt,), timeout,
+                           hedge_delay=hedge_delay, on_hedge=on_hedge)
+    
+    def _hedge_delay(self, call_type):
+        """Seconds after which to hedge a call: the call type's p95 latency, once known."""
+        latencies = _latency_histogram(call_type)
+        if latencies.count < HEDGE_MIN_SAMPLES:
+            return None
+        return max(latencies.percentile(95), HEDGE_MIN_DELAY_MS) / 1000
+    
+    def _token_counts(self, response, prompt, text):
+        """Get (prompt tokens, response tokens), estimating from length if the SDK doesn't report them."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None) is not None:
+            return usage.prompt_token_count, getattr(usage, "candidates_token_count", 0) or 0
+        # Roughly four characters per token for English text
+        return len(prompt) // 4, len(text) // 4
+    
+    def local_agent_type(self, user_input):
+        """Guess whether input is about the calendar or todos without calling Gemini.
+        
+        Args:
+            user_input (str): The user's natural language input
+            
+        Returns:
+            str: Either "calendar", "todo", or "unknown"
+        """
+        input_lower = user_input.lower()
+        if re.search(r"\b(\d{1,2}(:\d{2})?\s*(am|pm)|o'clock|noon|from \d{1,2} to \d{1,2})\b", input_lower):
+            return "calendar"
+        if re.search(r"\b(need to|have to|must|remember to|don't forget|should)\b", input_lower):
+            return "todo"
+        return "unknown"
+    
+    def local_action(self, user_input):
+        """Pick an action from keywords without calling Gemini.
+        
+        Args:
+            user_input (str): The user's natural language input
+            
+        Returns:
+            str: One of "create", "read", "update", "delete" or "unknown"
+        """
+        input_lower = user_input.lower()
+        for action, keywords in LOCAL_ACTION_KEYWORDS:
+            if any(re.search(rf"\b{re.escape(keyword)}\b", input_lower) for keyword in keywords):
+                return action
+        return "unknown"
     
     def normalize_relative_dates(self, user_input):
         """Pre-process user input to normalize relative date expressions.
@@ -30,29 +227,9 @@ class GeminiClient:
             user_input (str): The original user input text
             
         Returns:
-            str: User input with normalized date references
+            str: User input with relative dates replaced by YYYY-MM-DD dates (the same for the whole day)
         """
-        today = datetime.now()
-        
-        # Define patterns for relative date expressions
-        patterns = [
-            (r"after (\d+) days?", lambda m: (today + timedelta(days=int(m.group(1)))).strftime("%Y-%m-%d")),
-            (r"in (\d+) days?", lambda m: (today + timedelta(days=int(m.group(1)))).strftime("%Y-%m-%d")),
-            (r"(\d+) days? from now", lambda m: (today + timedelta(days=int(m.group(1)))).strftime("%Y-%m-%d")),
-            (r"after a day", lambda m: (today + timedelta(days=1)).strftime("%Y-%m-%d")),
-            (r"after a week", lambda m: (today + timedelta(days=7)).strftime("%Y-%m-%d")),
-            (r"in a week", lambda m: (today + timedelta(days=7)).strftime("%Y-%m-%d")),
-            (r"a week from now", lambda m: (today + timedelta(days=7)).strftime("%Y-%m-%d")),
-            (r"a couple of days from now", lambda m: (today + timedelta(days=2)).strftime("%Y-%m-%d")),
-            (r"in a couple of days", lambda m: (today + timedelta(days=2)).strftime("%Y-%m-%d")),
-            (r"in a few days", lambda m: (today + timedelta(days=3)).strftime("%Y-%m-%d")),
-            (r"after a few days", lambda m: (today + timedelta(days=3)).strftime("%Y-%m-%d")),
-        ]
-        
-        # Apply all patterns
-        normalized_input = user_input
-        for pattern, replacement_func in patterns:
-            normalized_input = re.sub(pattern, lambda m: f"on {replacement_func(m)}", normalized_input, flags=re.IGNORECASE)
+        normalized_input = normalize_relative_dates(user_input)
         
         # Log if changes were made
         if normalized_input != user_input:
@@ -60,70 +237,66 @@ class GeminiClient:
             
         return normalized_input
     
-    def process_natural_language(self, user_input):
-        """Process natural language input to extract calendar event or todo information."""
-        # Normalize relative date expressions
-        normalized_input = self.normalize_relative_dates(user_input)
+    def process_natural_language(self, text):
+        """Process natural language text to extract calendar event or todo information.
         
-        today = datetime.now()
-        tomorrow = today + timedelta(days=1)
-        next_week = today + timedelta(days=7)
-        next_month = today + timedelta(days=30)
+        Args:
+            text (str): The user's request
+            
+        Returns:
+            dict: The extracted fields (empty if nothing could be extracted)
+        """
+        # Resolve relative dates up front, so the model only has to copy them. The text itself is
+        # sent as written: a weekday may be part of a name ("Monday report").
+        today = timezones.now()
+        hints = relative_date_hints(text, today)
+        date_hints = ""
+        if hints:
+            date_hints = ("\n        Dates the text may refer to (only where the words are used as a date, not in a name): "
+                          + ", ".join(f"'{expression}' = {meaning}" for expression, meaning in hints) + ".")
         
         # Get relevant memories if memory manager is available
         memory_context = ""
         if self.memory_manager:
-            relevant_memories = self.memory_manager.get_relevant_memories(normalized_input, limit=3)
+            relevant_memories = self.memory_manager.get_relevant_memories(text, limit=3)
             if relevant_memories:
                 memory_context = "\n\nRelevant past interactions:\n"
                 for memory in relevant_memories:
                     memory_context += f"- User asked: '{memory['user_input']}'\n"
         
         prompt = f"""
-        Extract information from the following text. 
-        Return a JSON object with the following fields if present in the text:
-        
-        For calendar events:
-        - event_name: The name or title of the event
-        - start_date: The start date and time of the event
-        - end_date: The end date and time of the event
-        - description: A description of the event
-        - location: The location of the event
-        - participants: A list of participants or a string with participant names
-        
-        For todo items:
-        - task_name: The name of the task
-        - due_date: The due date for the task
-        - priority: The priority level (high, medium, low)
-        - status: The status of the task (not started, in progress, completed)
+        Extract structured information from the following text for a todo item or calendar event.
+        For todo items, extract:
+        - task_name: A concise, clear name for the task (don't include the entire input as the task name)
+        - task_names: If the text refers to several existing tasks at once (e.g. "mark groceries, laundry and the report as done"), a list with the name of each
+        - due_date: When the task is due (if mentioned)
+        - status: The status of the task (e.g., "Not Started", "In Progress", "Completed")
+        - priority: The priority of the task (e.g., "Low", "Medium", "High")
         - notes: Any additional notes about the task
         
-        For date references, understand relative terms like:
-        - "today" = {today.strftime('%Y-%m-%d')}
-        - "tomorrow" = {tomorrow.strftime('%Y-%m-%d')}
-        - "next week" = starting {next_week.strftime('%Y-%m-%d')}
-        - "next month" = starting {next_month.strftime('%Y-%m-%d')}
-        - "in 2 days" or "after 2 days" = {(today + timedelta(days=2)).strftime('%Y-%m-%d')}
-        - "in 3 days" or "after 3 days" = {(today + timedelta(days=3)).strftime('%Y-%m-%d')}
-        - "a couple of days from now" = {(today + timedelta(days=2)).strftime('%Y-%m-%d')}
-        - "in a week" or "after a week" = {(today + timedelta(days=7)).strftime('%Y-%m-%d')}
-        
-        Handle phrases like "after a few days", "in several days", or "within X days" appropriately.
+        For calendar events, extract:
+        - event_name: A concise name for the event
+        - start_date: When the event starts
+        - end_date: When the event ends (if mentioned)
+        - description: Description of the event
+        - location: Where the event takes place (if mentioned)
+        - participants: Who is participating (if mentioned)
         
-        Only include fields that are explicitly mentioned in the text.
+        Today is {today.strftime('%A, %Y-%m-%d')}. Give dates as YYYY-MM-DD, with a time (YYYY-MM-DDTHH:MM) if one is mentioned.{date_hints}
+        Return the information as a JSON object with only the fields that are present in the text.
         {memory_context}
         
-        Text: {normalized_input}
+        Text: {text}
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_response(response.text)
+            response_text = self.generate(prompt, "process_natural_language")
+            result = self._parse_response(response_text)
             
             # Store this interaction if memory manager is available
-            if self.memory_manager:
+            if self.memory_manager and result:
                 self.memory_manager.add_interaction(
-                    user_input=user_input,
+                    user_input=text,
                     agent_response={"type": "process_natural_language", "result": result}
                 )
                 
@@ -162,8 +335,8 @@ class GeminiClient:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_response(response.text)
+            response_text = self.generate(prompt, "suggest_calendar_actions")
+            result = self._parse_response(response_text)
             
             # Ensure we return a dictionary
             if not isinstance(result, dict):
@@ -180,7 +353,7 @@ class GeminiClient:
             return result
         except Exception as e:
             print(f"Error suggesting calendar actions with Gemini API: {str(e)}")
-            return {"action": "unknown", "reason": "Failed to process request"}
+            return {"action": self.local_action(user_input), "reason": "Gemini unavailable; action chosen from keywords"}
     
     def generate_event_summary(self, events):
         """Generate a natural language summary of calendar events."""
@@ -210,11 +383,21 @@ class GeminiClient:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            response_text = self.generate(prompt, "generate_event_summary")
+            return response_text.strip()
         except Exception as e:
             print(f"Error generating event summary with Gemini API: {str(e)}")
-            return "I found some events in your calendar, but couldn't generate a summary."
+            return self._template_event_summary(events)
+    
+    def _template_event_summary(self, events):
+        """Summarize calendar events without calling Gemini."""
+        dated = sorted((e for e in events if e.get("start_date")), key=lambda e: e["start_date"])
+        summary = f"You have {len(events)} event(s) scheduled."
+        if dated:
+            upcoming = ", ".join(f"'{e.get('event_name', 'Untitled')}' on {e['start_date'][:16].replace('T', ' ')}"
+                                 for e in dated[:3])
+            summary += f" Coming up: {upcoming}."
+        return summary
     
     def _parse_response(self, response_text):
         """Parse the response text to extract JSON data."""
@@ -239,56 +422,6 @@ class GeminiClient:
             print(f"Failed to parse JSON from response: {response_text}")
             return {}
     
-    def process_natural_language(self, text):
-        """Process natural language text to extract structured information."""
-        # Get relevant memories if memory manager is available
-        memory_context = ""
-        if self.memory_manager:
-            relevant_memories = self.memory_manager.get_relevant_memories(text, limit=3)
-            if relevant_memories:
-                memory_context = "\n\nRelevant past interactions:\n"
-                for memory in relevant_memories:
-                    memory_context += f"- User asked: '{memory['user_input']}'\n"
-        
-        prompt = f"""
-        Extract structured information from the following text for a todo item or calendar event.
-        For todo items, extract:
-        - task_name: A concise, clear name for the task (don't include the entire input as the task name)
-        - due_date: When the task is due (if mentioned)
-        - status: The status of the task (e.g., "Not Started", "In Progress", "Completed")
-        - priority: The priority of the task (e.g., "Low", "Medium", "High")
-        - notes: Any additional notes about the task
-        
-        For calendar events, extract:
-        - event_name: A concise name for the event
-        - start_date: When the event starts
-        - end_date: When the event ends (if mentioned)
-        - description: Description of the event
-        - location: Where the event takes place (if mentioned)
-        - participants: Who is participating (if mentioned)
-        
-        Return the information as a JSON object with only the fields that are present in the text.
-        {memory_context}
-        
-        Text: {text}
-        """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_response(response.text)
-            
-            # Store this interaction if memory manager is available
-            if self.memory_manager and result:
-                self.memory_manager.add_interaction(
-                    user_input=text,
-                    agent_response={"type": "process_natural_language", "result": result}
-                )
-                
-            return result
-        except Exception as e:
-            print(f"Error processing natural language with Gemini API: {str(e)}")
-            return None
-    
     def suggest_todo_actions(self, user_input, current_todos=None):
         """Suggest actions to take based on user input and current todo items."""
         todos_context = ""
@@ -319,8 +452,8 @@ class GeminiClient:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_response(response.text)
+            response_text = self.generate(prompt, "suggest_todo_actions")
+            result = self._parse_response(response_text)
             
             # Ensure we return a dictionary
             if not isinstance(result, dict):
@@ -337,7 +470,7 @@ class GeminiClient:
             return result
         except Exception as e:
             print(f"Error suggesting todo actions with Gemini API: {str(e)}")
-            return {"action": "unknown", "reason": "Failed to process request"}
+            return {"action": self.local_action(user_input), "reason": "Gemini unavailable; action chosen from keywords"}
     
     def generate_todo_summary(self, todos):
         """Generate a natural language summary of todo items."""
@@ -367,10 +500,22 @@ class GeminiClient:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            response_text = self.generate(prompt, "generate_todo_summary")
+            return response_text.strip()
         except Exception as e:
             print(f"Error generating todo summary with Gemini API: {str(e)}")
-            return "Here are your todo items."
+            return self._template_todo_summary(todos)
+    
+    def _template_todo_summary(self, todos):
+        """Summarize todo items without calling Gemini."""
+        open_todos = [t for t in todos if str(t.get("status", "")).lower() not in ("completed", "done")]
+        dated = sorted((t for t in open_todos if t.get("due_date")), key=lambda t: t["due_date"])
+        summary = f"You have {len(todos)} todo item(s), {len(open_todos)} still open."
+        if dated:
+            summary += f" Next due: '{dated[0].get('task_name', 'Untitled')}' on {dated[0]['due_date'][:10]}."
+        high = [t.get("task_name", "Untitled") for t in open_todos if str(t.get("priority", "")).lower() == "high"]
+        if high:
+            summary += f" High priority: {', '.join(high[:3])}."
+        return summary
 
     
\ No newline at end of file
@@ -1,8 +1,39 @@
+import contextvars
+import functools
 import os
 import json
 import requests
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.utils import get_env_variable, format_date_for_notion, extract_notion_page_id
+from utils import deadline, metrics, timezones, tracing
+from utils.rate_limiter import RateLimiter
+
+# Timeout for a single Notion call when no request deadline is in effect
+DEFAULT_TIMEOUT = 10.0
+# Notion allows an average of three requests per second per integration
+DEFAULT_RATE_LIMIT = 3.0
+# Requests of one bulk operation in flight at the same time
+DEFAULT_BULK_WORKERS = 3
+
+
+def rate_limit_from_env():
+    """Get the requests per second bulk operations may start from NOTION_RATE_LIMIT (0 disables limiting)."""
+    return float(os.getenv("NOTION_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+
+
+def bulk_workers_from_env():
+    """Get how many requests of a bulk operation may be in flight at once from NOTION_BULK_WORKERS."""
+    return max(1, int(os.getenv("NOTION_BULK_WORKERS", DEFAULT_BULK_WORKERS)))
+
+
+@functools.lru_cache(maxsize=None)
+def _request_metrics(method, ok):
+    """(request counter, latency histogram) of a Notion method and outcome, looked up once."""
+    return (metrics.registry.counter("notion_requests_total", "Notion API requests", method=method.lower(),
+                                     outcome="ok" if ok else "error"),
+            metrics.registry.histogram("notion_request_duration_ms", "Notion API latency in milliseconds",
+                                       method=method.lower()))
 
 
 class NotionClient:
@@ -19,32 +50,62 @@ class NotionClient:
             "Content-Type": "application/json",
             "Notion-Version": "2022-06-28"  # Use the latest version available
         }
+        
+        # Paces the concurrent requests of bulk operations
+        self.bulk_workers = bulk_workers_from_env()
+        self.rate_limiter = RateLimiter(rate_limit_from_env(), burst=self.bulk_workers)
     
     def _make_request(self, method, endpoint, data=None):
         """Make a request to the Notion API."""
         url = f"{self.endpoint}/{endpoint}"
         
+        metrics.count_call("notion")
+        start = time.perf_counter()
+        with tracing.span(f"notion.{method.lower()}", endpoint=endpoint, retries=0) as span:
+            if data is not None:
+                span.set_attribute("request_bytes", len(json.dumps(data).encode("utf-8")))
+            result = self._send_request(method, url, data, span)
+        
+        requests_total, latency = _request_metrics(method, result is not None)
+        requests_total.inc()
+        latency.observe((time.perf_counter() - start) * 1000)
+        return result
+    
+    def _send_request(self, method, url, data, span):
+        """Send a request and record the outcome on the given span."""
         try:
+            # Give the call whatever is left of the request's latency budget
+            timeout = deadline.remaining_timeout(DEFAULT_TIMEOUT)
+            span.set_attribute("timeout_s", round(timeout, 3))
+            
             if method.lower() == "get":
-                response = requests.get(url, headers=self.headers)
+                response = requests.get(url, headers=self.headers, timeout=timeout)
             elif method.lower() == "post":
-                response = requests.post(url, headers=self.headers, json=data)
+                response = requests.post(url, headers=self.headers, json=data, timeout=timeout)
             elif method.lower() == "patch":
-                response = requests.patch(url, headers=self.headers, json=data)
+                response = requests.patch(url, headers=self.headers, json=data, timeout=timeout)
             elif method.lower() == "delete":
-                response = requests.delete(url, headers=self.headers)
+                response = requests.delete(url, headers=self.headers, timeout=timeout)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
+            span.set_attribute("status_code", response.status_code)
+            span.set_attribute("response_bytes", len(response.content))
             response.raise_for_status()
             return response.json()
+        except deadline.DeadlineExceeded as e:
+            span.status = "error"
+            print(f"Skipping request to Notion API: {str(e)}")
+            return None
         except requests.exceptions.RequestException as e:
+            span.status = "error"
             print(f"Error making request to Notion API: {str(e)}")
             if hasattr(e, 'response') and e.response is not None:
                 print(f"Response status: {e.response.status_code}")
                 print(f"Response body: {e.response.text}")
             return None
     
+    @tracing.traced("notion.get_database_id")
     def get_database_id(self):
         """Get the database ID for the calendar database."""
         # First, get the page content to find the database
@@ -79,6 +140,7 @@ class NotionClient:
             return response["id"]
         return None
     
+    @tracing.traced("notion.get_calendar_events")
     def get_calendar_events(self, start_date=None, end_date=None):
         """Get calendar events from the database."""
         database_id = self.get_database_id()
@@ -115,6 +177,7 @@ class NotionClient:
         
         return []
     
+    @tracing.traced("notion.create_calendar_event")
     def create_calendar_event(self, event_data):
         """Create a new calendar event."""
         database_id = self.get_database_id()
@@ -124,7 +187,7 @@ class NotionClient:
         # Prepare the properties for the new page
         properties = {
             "Name": {"title": [{"text": {"content": event_data.get("event_name", "Untitled Event")}}]},
-            "Date": {"date": {"start": format_date_for_notion(event_data.get("start_date", datetime.now()))}}
+            "Date": {"date": {"start": format_date_for_notion(event_data.get("start_date") or timezones.now())}}
         }
         
         # Add end date if provided
@@ -159,6 +222,7 @@ class NotionClient:
         
         return None
     
+    @tracing.traced("notion.update_calendar_event")
     def update_calendar_event(self, event_id, event_data):
         """Update an existing calendar event."""
         # Prepare the properties to update
@@ -195,6 +259,7 @@ class NotionClient:
         
         return None
     
+    @tracing.traced("notion.delete_calendar_event")
     def delete_calendar_event(self, event_id):
         """Delete (archive) a calendar event."""
         # In Notion, you can't actually delete pages, only archive them
@@ -254,6 +319,7 @@ class NotionClient:
     
     # Add these methods to your existing NotionClient class
     
+    @tracing.traced("notion.get_todo_database_id")
     def get_todo_database_id(self):
         """Get the database ID for the todo database."""
         # First, get the page content to find the database
@@ -308,6 +374,7 @@ class NotionClient:
             return response["id"]
         return None
     
+    @tracing.traced("notion.get_todo_items")
     def get_todo_items(self, filter_info=None):
         """Get todo items from the database."""
         database_id = self.get_todo_database_id()
@@ -352,6 +419,7 @@ class NotionClient:
         
         return []
     
+    @tracing.traced("notion.create_todo_item")
     def create_todo_item(self, todo_data):
         """Create a new todo item."""
         database_id = self.get_todo_database_id()
@@ -391,6 +459,7 @@ class NotionClient:
         
         return None
     
+    @tracing.traced("notion.update_todo_item")
     def update_todo_item(self, todo_id, todo_data):
         """Update an existing todo item."""
         # Prepare the properties to update
@@ -421,6 +490,34 @@ class NotionClient:
         
         return None
     
+    @tracing.traced("notion.update_todo_items")
+    def update_todo_items(self, updates):
+        """Update several todo items, sending the requests concurrently under the rate limit.
+        
+        Args:
+            updates (list): (todo_id, todo_data) tuples
+            
+        Returns:
+            list: The updated todo for each entry, in order (None where the update failed)
+        """
+        if len(updates) <= 1:
+            return [self.update_todo_item(todo_id, todo_data) for todo_id, todo_data in updates]
+        
+        def update(todo_id, todo_data):
+            self.rate_limiter.acquire()
+            try:
+                return self.update_todo_item(todo_id, todo_data)
+            except Exception as e:
+                print(f"Error updating todo item {todo_id}: {str(e)}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=min(self.bulk_workers, len(updates))) as executor:
+            # Each request runs in a copy of this context, keeping the deadline, trace and time zone
+            futures = [executor.submit(contextvars.copy_context().run, update, todo_id, todo_data)
+                       for todo_id, todo_data in updates]
+            return [future.result() for future in futures]
+    
+    @tracing.traced("notion.delete_todo_item")
     def delete_todo_item(self, todo_id):
         """Delete (archive) a todo item."""
         # In Notion, you can't actually delete pages, only archive them
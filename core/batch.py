@@ -0,0 +1,193 @@
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.rate_limiter import RateLimiter
+
+# Words that describe the action or the kind of item rather than the item itself.
+# Whatever is left after removing them is used to decide which commands touch the same item.
+ITEM_STOPWORDS = {
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "about", "like",
+    "my", "me", "i", "it", "is", "as", "of", "from", "all", "please", "can", "you", "what", "which",
+    "add", "create", "new", "make", "set", "schedule", "book", "put",
+    "show", "list", "read", "get", "view", "display", "see", "find",
+    "update", "change", "edit", "move", "reschedule", "rename",
+    "delete", "remove", "cancel", "archive", "drop",
+    "mark", "done", "complete", "completed", "finish", "finished", "check", "off",
+    "todo", "todos", "to-do", "task", "tasks", "item", "items", "reminder",
+    "event", "events", "calendar", "meeting", "appointment",
+    "today", "tomorrow", "tonight", "next", "this", "week", "month", "day", "days",
+}
+
+
+class BatchRunner:
+    """Runs a batch of natural language commands through the orchestrator concurrently."""
+
+    def __init__(self, orchestrator, jobs=4, rate=2.0, output=None):
+        """Initialize the batch runner.
+
+        Args:
+            orchestrator (Orchestrator): Orchestrator used to process each command
+            jobs (int): Maximum number of commands processed at the same time
+            rate (float): Maximum number of commands started per second (0 disables limiting)
+            output (file, optional): Stream that receives one JSON line per finished command
+        """
+        self.orchestrator = orchestrator
+        self.jobs = max(1, int(jobs))
+        self.rate_limiter = RateLimiter(rate, burst=self.jobs)
+        self.output = output
+        self._output_lock = threading.Lock()
+
+    @staticmethod
+    def read_commands(source):
+        """Read commands from a file path, or from stdin when the path is '-'.
+
+        Blank lines and lines starting with '#' are ignored.
+
+        Args:
+            source (str): Path to the commands file, or '-' for stdin
+
+        Returns:
+            list: List of command strings in file order
+        """
+        if source == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+
+        return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+    @staticmethod
+    def item_keys(command):
+        """Extract the words that identify which item a command touches.
+
+        Args:
+            command (str): A natural language command
+
+        Returns:
+            set: Lower-cased item words (empty if the command names no particular item)
+        """
+        words = re.findall(r"[a-z0-9']+", command.lower())
+        return {word for word in words if word not in ITEM_STOPWORDS and len(word) > 2 and not word.isdigit()}
+
+    def group_commands(self, commands):
+        """Split commands into lanes that can run independently of each other.
+
+        Commands sharing an item word end up in the same lane, in their original order,
+        so that e.g. creating a task and then marking it as done never run out of order.
+
+        Args:
+            commands (list): List of command strings
+
+        Returns:
+            list: List of lanes, each a list of (index, command) tuples
+        """
+        parent = list(range(len(commands)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        first_owner = {}
+        for index, command in enumerate(commands):
+            for key in self.item_keys(command):
+                if key in first_owner:
+                    parent[find(index)] = find(first_owner[key])
+                else:
+                    first_owner[key] = index
+
+        lanes = {}
+        for index, command in enumerate(commands):
+            lanes.setdefault(find(index), []).append((index, command))
+
+        # Lanes are keyed by their lowest index, so sorting keeps the file order for scheduling
+        return [lanes[root] for root in sorted(lanes)]
+
+    def run(self, commands):
+        """Process all commands and write a JSON line for each as it finishes.
+
+        Args:
+            commands (list): List of command strings
+
+        Returns:
+            list: Result records ordered by command index
+        """
+        lanes = self.group_commands(commands)
+        records = [None] * len(commands)
+
+        def run_lane(lane_number, lane):
+            for index, command in lane:
+                record = self._run_command(index, command, lane_number)
+                records[index] = record
+                self._write_record(record)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(run_lane, lane_number, lane) for lane_number, lane in enumerate(lanes)]
+            for future in futures:
+                future.result()
+
+        return records
+
+    def _run_command(self, index, command, lane_number):
+        """Process a single command under the rate limit and time it."""
+        queued_ms = self.rate_limiter.acquire() * 1000
+        started_at = datetime.now()
+        start = time.perf_counter()
+
+        try:
+            result = self.orchestrator.process_request(command)
+        except Exception as e:
+            result = {"status": "error", "message": f"Unhandled error: {str(e)}"}
+
+        return {
+            "index": index,
+            "lane": lane_number,
+            "command": command,
+            "status": result.get("status", "unknown"),
+            "message": result.get("message", ""),
+            "result": result,
+            "started_at": started_at.isoformat(),
+            "queued_ms": round(queued_ms, 1),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def _write_record(self, record):
+        """Write a result record as a single JSON line."""
+        if self.output is None:
+            return
+        with self._output_lock:
+            self.output.write(json.dumps(record, default=str) + "\n")
+            self.output.flush()
+
+    @staticmethod
+    def format_report(records, wall_time):
+        """Format a per-command timing report.
+
+        Args:
+            records (list): Result records returned by run()
+            wall_time (float): Total wall clock time of the batch in seconds
+
+        Returns:
+            str: Human readable report
+        """
+        lines = ["=== Batch Timing Report ==="]
+        for record in records:
+            lines.append(
+                f"[{record['index']:>3}] lane {record['lane']:>3} {record['status']:<7} "
+                f"{record['duration_ms']:>9.1f} ms (queued {record['queued_ms']:.1f} ms)  {record['command']}"
+            )
+
+        total = sum(record["duration_ms"] for record in records) / 1000
+        errors = sum(1 for record in records if record["status"] != "success")
+        lines.append("")
+        lines.append(f"Commands: {len(records)}, errors: {errors}")
+        lines.append(f"Wall time: {wall_time:.2f} s, sum of command latencies: {total:.2f} s")
+        if wall_time > 0:
+            lines.append(f"Throughput: {len(records) / wall_time:.2f} commands/s")
+        return "\n".join(lines)
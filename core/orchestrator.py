@@ -1,8 +1,11 @@
 from agents.calendar_agent import CalendarAgent
 from agents.todo_agent import TodoAgent
 from clients.gemini_client import GeminiClient
-from memory.memory_manager import MemoryManager
+from memory.memory_manager import create_memory_manager
+from utils import deadline, metrics, timezones, tracing
+import contextlib
 import logging
+import time
 
 
 # Configure logging
@@ -12,12 +15,20 @@ logger = logging.getLogger(__name__)
 class Orchestrator:
     """Selects the appropriate agent based on user input."""
     
-    def __init__(self):
-        """Initialize the agent selector."""
+    def __init__(self, request_timeout=None):
+        """Initialize the agent selector.
+        
+        Args:
+            request_timeout (float, optional): Latency budget per request in seconds
+                (defaults to REQUEST_TIMEOUT_SECONDS, 0 disables it)
+        """
+        self.request_timeout = deadline.request_timeout_from_env() if request_timeout is None else request_timeout
+        self.degrade_threshold = deadline.degrade_threshold_from_env()
+        
         # Initialize memory managers
-        self.system_memory = MemoryManager("system")
-        self.calendar_memory = MemoryManager("calendar")
-        self.todo_memory = MemoryManager("todo")
+        self.system_memory = create_memory_manager("system")
+        self.calendar_memory = create_memory_manager("calendar")
+        self.todo_memory = create_memory_manager("todo")
         
         # Initialize Gemini client with system memory
         self.gemini_client = GeminiClient(memory_manager=self.system_memory)
@@ -68,10 +79,12 @@ class Orchestrator:
             # Check if we have a memory of similar requests with high similarity
             relevant_memories = self.system_memory.get_relevant_memories(user_input, limit=3)
             
-            # Only use memory if it's recent or highly relevant
+            # Only use memory if it's highly relevant (similarity_score is normalized BM25)
             for memory in relevant_memories:
-                if "agent_type" in memory.get("metadata", {}) and memory.get("similarity_score", 0) > 0.8:
+                if memory.get("metadata", {}).get("agent_type") in ["calendar", "todo"] and memory.get("similarity_score", 0) > 0.8:
+                    metrics.record_cache("routing_memory", True)
                     return memory["metadata"]["agent_type"]
+            metrics.record_cache("routing_memory", False)
             
             prompt = f"""
             Analyze the following user input and determine if it's related to:
@@ -84,8 +97,7 @@ class Orchestrator:
             User input: {user_input}
             """
             
-            response = self.gemini_client.model.generate_content(prompt)
-            result = response.text.strip().lower()
+            result = self.gemini_client.generate(prompt, "determine_agent_type").strip().lower()
             
             if result in ["calendar", "todo"]:
                 return result
@@ -94,44 +106,63 @@ class Orchestrator:
             
         except Exception as e:
             logger.error(f"Error using Gemini for agent type determination: {str(e)}")
-            # Default to unknown if there's an error
-            return "unknown"
+            # Fall back to local heuristics while Gemini is failing or its circuit breaker is open
+            return self.gemini_client.local_agent_type(user_input)
     
     def process_request(self, user_input):
         """Process a user request and route it to the appropriate agent."""
-        # Use the local method to determine if this is a calendar or todo request
-        agent_type = self.determine_agent_type(user_input)
-        
-        # Store this determination in memory
-        self.system_memory.add_interaction(
-            user_input=user_input,
-            agent_response={"status": "processing", "agent_type": agent_type},
-            metadata={"agent_type": agent_type}
-        )
-        
-        result = None
-        if agent_type == "calendar":
-            result = self.calendar_agent.process_request(user_input)
-        elif agent_type == "todo":
-            # Use a helper method to check if this is a "mark as done" request
-            if self._is_mark_done_request(user_input):
-                result = self.todo_agent.mark_todo_as_done(user_input)
-            else:
-                result = self.todo_agent.process_request(user_input)
-        else:
-            result = {
-                "status": "error",
-                "message": "I'm not sure if you want to manage calendar events or todo items. Please be more specific."
-            }
-        
-        # Store the result in memory
-        self.system_memory.add_interaction(
-            user_input=user_input,
-            agent_response=result,
-            metadata={"agent_type": agent_type, "result_status": result.get("status", "unknown")}
-        )
-        
-        return result
+        start = time.perf_counter()
+        with metrics.request_scope() as scope, self._request_deadline(), \
+                timezones.user_zone(self.system_memory.get_timezone()), \
+                tracing.span(tracing.REQUEST_SPAN, input_chars=len(user_input)) as request_span:
+            # Use the local method to determine if this is a calendar or todo request
+            with tracing.span("orchestrator.determine_agent_type"):
+                agent_type = self.determine_agent_type(user_input)
+            request_span.set_attribute("agent_type", agent_type)
+            
+            # Store this determination in memory
+            with tracing.span("orchestrator.record_routing"):
+                self.system_memory.add_interaction(
+                    user_input=user_input,
+                    agent_response={"status": "processing", "agent_type": agent_type},
+                    metadata={"agent_type": agent_type}
+                )
+            
+            result = None
+            with tracing.span("orchestrator.dispatch", agent_type=agent_type):
+                if agent_type == "calendar":
+                    result = self.calendar_agent.process_request(user_input)
+                elif agent_type == "todo":
+                    # Use a helper method to check if this is a "mark as done" request
+                    if self._is_mark_done_request(user_input):
+                        result = self.todo_agent.mark_todo_as_done(user_input)
+                    else:
+                        result = self.todo_agent.process_request(user_input)
+                else:
+                    result = {
+                        "status": "error",
+                        "message": "I'm not sure if you want to manage calendar events or todo items. Please be more specific."
+                    }
+            request_span.set_attribute("result_status", result.get("status", "unknown"))
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            # Store the result in memory (its latency feeds the usage trends in insights)
+            with tracing.span("orchestrator.record_result"):
+                self.system_memory.add_interaction(
+                    user_input=user_input,
+                    agent_response=result,
+                    metadata={"agent_type": agent_type, "result_status": result.get("status", "unknown"),
+                              "duration_ms": round(duration_ms, 1)}
+                )
+            
+            metrics.record_request(scope, agent_type, duration_ms)
+            return result
+    
+    def _request_deadline(self):
+        """Latency budget shared by every call made while handling one request."""
+        if self.request_timeout and self.request_timeout > 0:
+            return deadline.deadline(self.request_timeout, self.degrade_threshold)
+        return contextlib.nullcontext()
     
     def _is_mark_done_request(self, user_input):
         """Helper method to determine if a request is about marking a todo as done.
@@ -177,13 +208,30 @@ class Orchestrator:
             "todo": todo_insights
         }
     
+    def enforce_memory_retention(self):
+        """Apply the retention policy to every memory manager.
+        
+        Returns:
+            dict: Retention report (interactions/patterns removed, bytes reclaimed) per memory type
+        """
+        return {
+            "system": self.system_memory.enforce_retention(),
+            "calendar": self.calendar_memory.enforce_retention(),
+            "todo": self.todo_memory.enforce_retention()
+        }
+    
     def update_preference(self, preference_key, preference_value):
         """Update a user preference across all memory managers.
         
         Args:
             preference_key (str): The preference identifier
             preference_value: The preference value
+            
+        Raises:
+            ValueError: If the key is "timezone" and the value isn't a known zone
         """
+        if preference_key == timezones.TIMEZONE_PREFERENCE:
+            timezones.get_zone(preference_value)
         self.system_memory.update_preference(preference_key, preference_value)
         self.calendar_memory.update_preference(preference_key, preference_value)
         self.todo_memory.update_preference(preference_key, preference_value)
\ No newline at end of file
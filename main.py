@@ -1,15 +1,71 @@
 from core.orchestrator import Orchestrator
+from core.batch import BatchRunner
+from utils import lazy_imports, metrics, tracing
 from dotenv import load_dotenv
+import argparse
+import contextlib
 import os
 import json
+import sys
+import time
 
-def main():
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Manage Notion calendar events and todo items using natural language.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Run the commands in FILE (one per line, '-' for stdin) non-interactively")
+    parser.add_argument("--jobs", type=int, default=4,
+                        help="Number of batch commands processed concurrently (default: 4)")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="Maximum batch commands started per second, 0 for no limit (default: 2)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write batch results as JSON Lines to FILE instead of stdout")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics at http://localhost:PORT/metrics (default: $METRICS_PORT)")
+    parser.add_argument("--metrics-host", default=None,
+                        help="Interface the metrics server binds, e.g. 0.0.0.0 for all (default: $METRICS_HOST or 127.0.0.1)")
+    return parser.parse_args(argv)
+
+def run_batch(orchestrator, args):
+    """Run a batch of commands and print a timing report to stderr."""
+    commands = BatchRunner.read_commands(args.batch)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    
+    try:
+        runner = BatchRunner(orchestrator, jobs=args.jobs, rate=args.rate, output=output)
+        start = time.perf_counter()
+        # Agents print progress messages; keep them out of the JSON Lines stream
+        with contextlib.redirect_stdout(sys.stderr):
+            records = runner.run(commands)
+        wall_time = time.perf_counter() - start
+    finally:
+        if args.output:
+            output.close()
+    
+    print(BatchRunner.format_report(records, wall_time), file=sys.stderr)
+    return 0 if all(record["status"] == "success" for record in records) else 1
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     # Load environment variables from .env file
     load_dotenv()
+    tracing.configure_from_env()
+    
+    metrics_port = args.metrics_port or int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        metrics.start_metrics_server(metrics_port, args.metrics_host or os.getenv("METRICS_HOST", "127.0.0.1"))
     
     # Initialize the agent selector
     orchestrator = Orchestrator()
     
+    if args.batch:
+        return run_batch(orchestrator, args)
+    
+    # Load dateparser and the Gemini SDK while the user types the first request
+    if lazy_imports.warm_up_from_env():
+        lazy_imports.start_warm_up()
+    
     print("Welcome to Notion Agent!")
     print("You can manage your calendar events or todo items using natural language.")
     print("Type 'exit' to quit, 'help' for commands, or 'insights' to see usage patterns.")
@@ -28,7 +84,11 @@ def main():
             print("\nAvailable commands:")
             print("- exit/quit/bye: Exit the application")
             print("- insights: Show insights about your usage patterns")
+            print("- trace: Show where the time went in the last request")
+            print("- stats: Show call counts, latencies and cache hit ratios")
+            print("- compact: Apply the memory retention limits now and show what was reclaimed")
             print("- preference [key] [value]: Set a preference (e.g., 'preference summary_style brief')")
+            print("- preference timezone [zone]: Set your time zone (e.g., 'preference timezone Africa/Cairo')")
             print("- Any natural language request for calendar or todo management")
             continue
             
@@ -36,24 +96,64 @@ def main():
             insights = orchestrator.get_insights()
             print("\n=== Usage Insights ===")
             print(f"Total interactions: {insights['system']['total_interactions']}")
+            if insights['system'].get('archived_interactions'):
+                print(f"Archived interactions: {insights['system']['archived_interactions']}")
             
             print("\nCommon patterns:")
+            approximate = "" if insights['system'].get('pattern_counts_exact', True) else "~"
             for pattern, freq in insights['system']['common_patterns']:
-                print(f"- '{pattern}': used {freq} times")
+                print(f"- '{pattern}': used {approximate}{freq} times")
+            
+            trends = insights['system'].get('trends')
+            if trends and trends['requests']:
+                print(f"\nLast {trends['days']} days: {trends['requests']} requests, "
+                      f"{trends['error_rate']:.0%} errors"
+                      + (f", {trends['avg_latency_ms']:.0f} ms average" if trends['avg_latency_ms'] is not None else ""))
+                for day in trends['daily']:
+                    agents = ", ".join(f"{agent} {count}" for agent, count in sorted(day['by_agent'].items()))
+                    print(f"- {day['day']}: {day['requests']} requests ({agents}), {day['error_rate']:.0%} errors"
+                          + (f", {day['avg_latency_ms']:.0f} ms" if day['avg_latency_ms'] is not None else ""))
+                if trends['busiest_hours']:
+                    print("Busiest hours: " + ", ".join(f"{hour:02d}:00 ({count})" for hour, count in trends['busiest_hours']))
             
             print("\nPreferences:")
             for key, value in insights['system']['preferences'].items():
                 print(f"- {key}: {value['value']}")
             continue
             
+        elif user_input.lower() == 'trace':
+            last_request = tracing.tracer.last_request()
+            if last_request is None:
+                print("\nNo request has been traced yet.")
+            else:
+                print("\n=== Last Request Trace ===")
+                print(tracing.Tracer.format_trace(last_request))
+            continue
+            
+        elif user_input.lower() == 'stats':
+            print("\n=== Metrics ===")
+            print(metrics.registry.format_summary())
+            continue
+            
+        elif user_input.lower() == 'compact':
+            print("\n=== Memory Retention ===")
+            for memory_type, report in orchestrator.enforce_memory_retention().items():
+                print(f"- {memory_type}: removed {report['interactions_removed']} interactions "
+                      f"({report['interactions_archived']} archived) and {report['patterns_removed']} patterns, "
+                      f"reclaimed {report['bytes_reclaimed']} bytes")
+            continue
+            
         elif user_input.lower().startswith('preference '):
             # Parse preference command: preference [key] [value]
             parts = user_input.split(' ', 2)
             if len(parts) >= 3:
                 key = parts[1]
                 value = parts[2]
-                orchestrator.update_preference(key, value)
-                print(f"✅ Preference '{key}' set to '{value}'")
+                try:
+                    orchestrator.update_preference(key, value)
+                    print(f"✅ Preference '{key}' set to '{value}'")
+                except ValueError as e:
+                    print(f"❌ {str(e)}")
             else:
                 print("❌ Invalid preference format. Use: preference [key] [value]")
             continue
@@ -81,4 +181,4 @@ def main():
             print(f"\n❌ {result.get('message', 'An error occurred.')}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
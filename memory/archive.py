@@ -0,0 +1,383 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from memory.file_lock import FileLock, file_signature
+from memory.keyword_index import KeywordIndex
+from memory.stores import write_atomically
+
+# Interactions per compressed segment
+DEFAULT_SEGMENT_SIZE = 1000
+# Archived interactions kept at most; the oldest segments are dropped beyond this (0 keeps everything)
+DEFAULT_MAX_ARCHIVED = 50000
+# Decoded segments kept in memory, and how many may be decoded to answer one search
+DECODED_SEGMENT_CACHE = 4
+MAX_SEGMENTS_PER_SEARCH = 4
+
+SEGMENT_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_timestamp(timestamp):
+    """Microseconds since the epoch for a naive ISO timestamp, or None if that wouldn't round-trip exactly."""
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None:
+        return None
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    return micros if decode_timestamp(micros) == timestamp else None
+
+
+def decode_timestamp(micros):
+    """ISO timestamp for microseconds since the epoch."""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def encode_column(values):
+    """Dictionary-encode a column of strings with few distinct values; other columns are kept as they are."""
+    if not values or not all(isinstance(value, str) for value in values):
+        return {"values": values}
+    dictionary = list(dict.fromkeys(values))
+    if len(dictionary) * 2 > len(values):
+        return {"values": values}
+    codes = {value: code for code, value in enumerate(dictionary)}
+    return {"dictionary": dictionary, "codes": [codes[value] for value in values]}
+
+
+def decode_column(column):
+    if "dictionary" in column:
+        dictionary = column["dictionary"]
+        return [dictionary[code] for code in column["codes"]]
+    return column["values"]
+
+
+def encode_table(records):
+    """Columnar form of a list of dicts: each key's values stored once as a column.
+
+    Args:
+        records (list): Dicts (anything else is stored as is)
+
+    Returns:
+        dict: {"columns": {key: column}, "other": {row: value}}
+    """
+    columns = {}
+    other = {}
+    for row, record in enumerate(records):
+        if not isinstance(record, dict):
+            other[str(row)] = record
+            continue
+        for key, value in record.items():
+            rows, values = columns.setdefault(key, ([], []))
+            rows.append(row)
+            values.append(value)
+
+    encoded = {}
+    for key, (rows, values) in columns.items():
+        column = encode_column(values)
+        if len(rows) < len(records):
+            column["rows"] = rows
+        encoded[key] = column
+    return {"columns": encoded, "other": other}
+
+
+def decode_table(table, count):
+    records = [{} for _ in range(count)]
+    for row, value in table["other"].items():
+        records[int(row)] = value
+    for key, column in table["columns"].items():
+        for row, value in zip(column.get("rows", range(count)), decode_column(column)):
+            records[row][key] = value
+    return records
+
+
+def encode_segment(interactions):
+    """Encode interactions as a gzip-compressed columnar segment.
+
+    Timestamps become delta-encoded integers, agent responses and metadata become one column per
+    key, and repetitive string columns (statuses, agent types, messages) are dictionary-encoded.
+
+    Args:
+        interactions (list): Interaction records, oldest first
+
+    Returns:
+        bytes: The segment
+    """
+    deltas, timestamp_text, previous = [], {}, 0
+    for row, interaction in enumerate(interactions):
+        micros = encode_timestamp(interaction.get("timestamp"))
+        if micros is None:
+            timestamp_text[str(row)] = interaction.get("timestamp")
+            micros = previous
+        deltas.append(micros - previous)
+        previous = micros
+
+    known = {"id", "timestamp", "user_input", "agent_response", "metadata"}
+    segment = {
+        "version": SEGMENT_VERSION,
+        "count": len(interactions),
+        "ids": [interaction.get("id") for interaction in interactions],
+        "timestamps": deltas,
+        "timestamp_text": timestamp_text,
+        "user_input": [interaction.get("user_input", "") for interaction in interactions],
+        "agent_response": encode_table([interaction.get("agent_response") for interaction in interactions]),
+        "metadata": encode_table([interaction.get("metadata") for interaction in interactions]),
+        "extra": {str(row): {key: value for key, value in interaction.items() if key not in known}
+                  for row, interaction in enumerate(interactions) if not known.issuperset(interaction)},
+    }
+    return gzip.compress(json.dumps(segment, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_segment(data):
+    """Decode a segment written by encode_segment back into interaction records."""
+    segment = json.loads(gzip.decompress(data).decode('utf-8'))
+    count = segment["count"]
+    responses = decode_table(segment["agent_response"], count)
+    metadata = decode_table(segment["metadata"], count)
+
+    interactions, micros = [], 0
+    for row in range(count):
+        micros += segment["timestamps"][row]
+        interaction = {
+            "id": segment["ids"][row],
+            "timestamp": segment["timestamp_text"][str(row)] if str(row) in segment["timestamp_text"]
+            else decode_timestamp(micros),
+            "user_input": segment["user_input"][row],
+            "agent_response": responses[row],
+            "metadata": metadata[row],
+        }
+        interaction.update(segment["extra"].get(str(row), {}))
+        interactions.append(interaction)
+    return interactions
+
+
+class MemoryArchive:
+    """Cold storage for interactions that no longer fit in hot memory.
+
+    Interactions are written in compressed columnar segments (memory_<type>.archive/), described
+    by a small manifest that lists each segment's time range and keywords. Nothing is decoded
+    until a search or a time-range query needs a segment; the last few decoded segments are
+    cached with their keyword index. Several processes may share an archive: changes hold an
+    advisory lock and the manifest is re-read whenever another process replaced it.
+    """
+
+    def __init__(self, base_path, extract_keywords, segment_size=DEFAULT_SEGMENT_SIZE,
+                 max_interactions=DEFAULT_MAX_ARCHIVED):
+        """Initialize the archive.
+
+        Args:
+            base_path (str): Path prefix, e.g. memory/memory_todo
+            extract_keywords (callable): Turns a user input into its keywords
+            segment_size (int): Interactions per segment
+            max_interactions (int): Archived interactions kept at most (0 keeps everything)
+        """
+        self.directory = f"{base_path}.archive"
+        self.extract_keywords = extract_keywords
+        self.manifest_file = os.path.join(self.directory, "manifest.json")
+        self.segment_size = segment_size
+        self.max_interactions = max_interactions
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(f"{base_path}.archive.lock")
+        self._manifest = None
+        self._signature = None
+        self._decoded = OrderedDict()
+
+    def _load_manifest(self):
+        """Read the manifest if it is new to this process (caller holds the lock)."""
+        signature = file_signature(self.manifest_file)
+        if self._manifest is not None and signature == self._signature:
+            return self._manifest
+        manifest = {"next_segment": 1, "segments": []}
+        if signature is not None:
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error loading memory archive manifest: {str(e)}")
+        for entry in manifest["segments"]:
+            entry["keywords"] = set(entry["keywords"])
+        self._manifest, self._signature = manifest, signature
+        return manifest
+
+    def _save_manifest(self, manifest):
+        """Write the manifest (caller holds both locks)."""
+        data = dict(manifest, segments=[dict(entry, keywords=sorted(entry["keywords"]))
+                                        for entry in manifest["segments"]])
+        write_atomically(self.manifest_file, json.dumps(data, separators=(',', ':')))
+        self._signature = file_signature(self.manifest_file)
+
+    def add(self, interactions):
+        """Archive interactions, oldest first.
+
+        Args:
+            interactions (list): Interaction records
+
+        Returns:
+            int: Bytes written
+        """
+        if not interactions:
+            return 0
+        written = 0
+        with self._lock, self._file_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            manifest = self._load_manifest()
+            for start in range(0, len(interactions), self.segment_size):
+                chunk = interactions[start:start + self.segment_size]
+                data = encode_segment(chunk)
+                name = f"segment_{manifest['next_segment']:06d}.json.gz"
+                write_atomically(os.path.join(self.directory, name), data)
+                manifest["next_segment"] += 1
+                manifest["segments"].append({
+                    "file": name,
+                    "count": len(chunk),
+                    "first": min(interaction.get("timestamp", "") for interaction in chunk),
+                    "last": max(interaction.get("last_seen") or interaction.get("timestamp", "") for interaction in chunk),
+                    "keywords": {keyword for interaction in chunk
+                                 for keyword in self.extract_keywords(interaction.get("user_input", ""))},
+                    "bytes": len(data),
+                })
+                written += len(data)
+
+            if self.max_interactions:
+                while len(manifest["segments"]) > 1 and self._count(manifest) > self.max_interactions:
+                    self._remove_segment(manifest, manifest["segments"][0])
+            self._save_manifest(manifest)
+        return written
+
+    def expire(self, cutoff):
+        """Drop segments whose newest interaction is older than cutoff.
+
+        Args:
+            cutoff (datetime): Expiry time
+
+        Returns:
+            int: Interactions dropped
+        """
+        with self._lock, self._file_lock:
+            manifest = self._load_manifest()
+            expired = [entry for entry in manifest["segments"] if entry["last"] < cutoff.isoformat()]
+            for entry in expired:
+                self._remove_segment(manifest, entry)
+            if expired:
+                self._save_manifest(manifest)
+        return sum(entry["count"] for entry in expired)
+
+    def _remove_segment(self, manifest, entry):
+        manifest["segments"].remove(entry)
+        self._decoded.pop(entry["file"], None)
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _count(manifest):
+        return sum(entry["count"] for entry in manifest["segments"])
+
+    def count(self):
+        """Number of archived interactions (read from the manifest, nothing is decoded)."""
+        with self._lock:
+            return self._count(self._load_manifest())
+
+    def size(self):
+        """Bytes the archive occupies on disk."""
+        with self._lock:
+            manifest = self._load_manifest()
+            manifest_bytes = os.path.getsize(self.manifest_file) if self._signature else 0
+            return manifest_bytes + sum(entry["bytes"] for entry in manifest["segments"])
+
+    def _segment(self, entry):
+        """Decoded interactions and keyword index of a segment (caller holds the lock)."""
+        cached = self._decoded.get(entry["file"])
+        if cached is not None:
+            self._decoded.move_to_end(entry["file"])
+            return cached
+        with open(os.path.join(self.directory, entry["file"]), 'rb') as f:
+            interactions = decode_segment(f.read())
+        index = KeywordIndex()
+        for doc_id, interaction in enumerate(interactions):
+            index.add(doc_id, self.extract_keywords(interaction["user_input"]))
+        self._decoded[entry["file"]] = (interactions, index)
+        if len(self._decoded) > DECODED_SEGMENT_CACHE:
+            self._decoded.popitem(last=False)
+        return interactions, index
+
+    def search(self, keywords, limit=5):
+        """Find archived interactions relevant to a set of keywords.
+
+        Only segments containing the most query keywords are decoded (newest first on ties,
+        at most MAX_SEGMENTS_PER_SEARCH); each is ranked with BM25 like hot memory.
+
+        Args:
+            keywords (list): Query keywords
+            limit (int): Maximum number of interactions to return
+
+        Returns:
+            list: Interactions with a "similarity_score" and "archived": True, best first
+        """
+        query = set(keywords)
+        if not query or limit <= 0:
+            return []
+        with self._lock:
+            manifest = self._load_manifest()
+            candidates = [(len(query & entry["keywords"]), position, entry)
+                          for position, entry in enumerate(manifest["segments"]) if query & entry["keywords"]]
+            candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+
+            results = []
+            for _, position, entry in candidates[:MAX_SEGMENTS_PER_SEARCH]:
+                try:
+                    interactions, index = self._segment(entry)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading archived memory segment {entry['file']}: {str(e)}")
+                    continue
+                results.extend((score, position, doc_id, interactions[doc_id])
+                               for doc_id, score in index.bm25(keywords, limit))
+        results.sort(key=lambda result: result[:3], reverse=True)
+        return [dict(interaction, similarity_score=score, archived=True)
+                for score, _, _, interaction in results[:limit]]
+
+    def interactions(self, since=None, until=None):
+        """Archived interactions in a time range, decoding only the segments that overlap it.
+
+        Args:
+            since (datetime, optional): Earliest timestamp
+            until (datetime, optional): Latest timestamp
+
+        Returns:
+            list: Interactions, oldest first
+        """
+        since = since.isoformat() if since else ""
+        until = until.isoformat() if until else None
+        found = []
+        with self._lock:
+            for entry in self._load_manifest()["segments"]:
+                if entry["last"] < since or (until is not None and entry["first"] > until):
+                    continue
+                interactions, _ = self._segment(entry)
+                found.extend(interaction for interaction in interactions
+                             if interaction["timestamp"] >= since and (until is None or interaction["timestamp"] <= until))
+        return found
+
+    def close(self):
+        """Release the lock file."""
+        self._file_lock.close()
+
+
+def archive_from_env(base_path, extract_keywords):
+    """Build the archive for a memory from MEMORY_ARCHIVE and MEMORY_ARCHIVE_MAX_INTERACTIONS.
+
+    Args:
+        base_path (str): Path prefix, e.g. memory/memory_todo
+        extract_keywords (callable): Turns a user input into its keywords
+
+    Returns:
+        MemoryArchive: The archive, or None when MEMORY_ARCHIVE=0 (evicted interactions are deleted)
+    """
+    if os.getenv("MEMORY_ARCHIVE", "1") == "0":
+        return None
+    return MemoryArchive(base_path, extract_keywords,
+                         max_interactions=int(os.getenv("MEMORY_ARCHIVE_MAX_INTERACTIONS", DEFAULT_MAX_ARCHIVED)))
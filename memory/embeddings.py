@@ -0,0 +1,354 @@
+import logging
+import math
+import os
+import re
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Semantic retrieval needs NumPy; without it memory is searched by keyword only
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Size of the hashed feature space; 256 float32 values take 1 KiB per interaction
+DEFAULT_DIMENSIONS = 256
+# Cosine similarity below which an interaction isn't considered related to a query
+DEFAULT_MIN_SCORE = 0.4
+# Share of the similarity that comes from word vectors when a model is configured (the rest is hashed features)
+WORD_VECTOR_SHARE = 0.7
+
+# Histories larger than this are searched through an inverted-file (IVF) index: vectors are grouped
+# around k-means centroids and only the groups closest to the query are scored
+ANN_THRESHOLD = 20000
+ANN_PROBES = 8
+KMEANS_ITERATIONS = 5
+TRAINING_POINTS_PER_LIST = 64
+INITIAL_CAPACITY = 256
+
+_WORD = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def normalize(vector):
+    """Scale a vector to unit length (the zero vector stays zero)."""
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class HashingEmbedder:
+    """Embeds text with the hashing trick over its words and their character trigrams.
+
+    Trigrams make inflections and typos ("meetings", "meetng") land close to the original word;
+    they don't know synonyms, which is what WordVectorEmbedder adds.
+    """
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, stop_words=()):
+        """Initialize the embedder.
+
+        Args:
+            dimensions (int): Length of the vectors
+            stop_words (set): Words to ignore
+        """
+        self.dimensions = dimensions
+        self.stop_words = stop_words
+
+    def words(self, text):
+        """Lowercase words of a text without punctuation and stop words."""
+        return [word for word in _WORD.findall(text.lower()) if word not in self.stop_words]
+
+    def features(self, words):
+        """Hashed features (each word and its character trigrams) of some words as (indices, signs) lists."""
+        indices, signs = [], []
+        for word in words:
+            padded = f"<{word}>"
+            for feature in [f"w:{word}"] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                indices.append(hashed % self.dimensions)
+                # The top bit picks the sign, so colliding features tend to cancel out rather than add up
+                signs.append(1.0 if hashed >> 31 else -1.0)
+        return indices, signs
+
+    def embed(self, text):
+        """Unit float32 vector of a text (zero when it has no words)."""
+        indices, signs = self.features(self.words(text))
+        vector = np.bincount(indices, signs, minlength=self.dimensions).astype(np.float32) \
+            if indices else np.zeros(self.dimensions, dtype=np.float32)
+        return normalize(vector)
+
+
+def load_word_vectors(path):
+    """Open static word vectors as a read-only NumPy memmap.
+
+    Accepts a .npy matrix with a .vocab file next to it (one word per line, in row order), or
+    GloVe/word2vec text vectors, which are converted to that layout next to the text file on first use.
+
+    Args:
+        path (str): The .npy or text file
+
+    Returns:
+        tuple: (vectors memmap, dict of word -> row)
+    """
+    if not path.endswith(".npy"):
+        converted = f"{path}.npy"
+        if not os.path.exists(converted) or os.path.getmtime(converted) < os.path.getmtime(path):
+            convert_text_vectors(path, converted)
+        path = converted
+    vectors = np.load(path, mmap_mode="r")
+    with open(f"{path[:-len('.npy')]}.vocab", 'r', encoding='utf-8') as f:
+        vocabulary = {line.rstrip("\n"): row for row, line in enumerate(f)}
+    if len(vocabulary) != len(vectors):
+        raise ValueError(f"{path} has {len(vectors)} vectors but its vocabulary has {len(vocabulary)} words")
+    return vectors, vocabulary
+
+
+def convert_text_vectors(text_path, npy_path):
+    """Convert GloVe/word2vec text vectors to a .npy matrix and a .vocab file, one line at a time."""
+    def rows():
+        with open(text_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip().split(" ")
+                # Skips the "<count> <dimensions>" header of word2vec files
+                if len(parts) > 2:
+                    yield parts
+
+    dimensions, count = None, 0
+    for parts in rows():
+        dimensions = dimensions or len(parts) - 1
+        count += len(parts) == dimensions + 1
+    if not count:
+        raise ValueError(f"{text_path} contains no word vectors")
+
+    vectors = np.lib.format.open_memmap(f"{npy_path}.tmp", mode="w+", dtype=np.float32, shape=(count, dimensions))
+    vocab_path = f"{npy_path[:-len('.npy')]}.vocab"
+    with open(f"{vocab_path}.tmp", 'w', encoding='utf-8') as f:
+        position = 0
+        for parts in rows():
+            if len(parts) == dimensions + 1:
+                vectors[position] = np.asarray(parts[1:], dtype=np.float32)
+                f.write(f"{parts[0]}\n")
+                position += 1
+    vectors.flush()
+    del vectors
+    os.replace(f"{vocab_path}.tmp", vocab_path)
+    os.replace(f"{npy_path}.tmp", npy_path)
+
+
+class WordVectorEmbedder:
+    """Embeds text as its mean word vector next to its hashed features.
+
+    Word vectors place paraphrases ("dentist" / "teeth cleaning") close together; the hashed
+    features keep exact wording, names and numbers that the vector model doesn't know.
+    """
+
+    def __init__(self, path, hashing):
+        """Initialize the embedder.
+
+        Args:
+            path (str): Word vectors, as accepted by load_word_vectors
+            hashing (HashingEmbedder): Embedder for the hashed half of the vector
+        """
+        self.vectors, self.vocabulary = load_word_vectors(path)
+        self.hashing = hashing
+        self.dimensions = self.vectors.shape[1] + hashing.dimensions
+
+    def embed(self, text):
+        """Unit float32 vector of a text (zero when it has no words)."""
+        words = self.hashing.words(text)
+        rows = sorted({self.vocabulary[word] for word in words if word in self.vocabulary})
+        semantic = normalize(np.asarray(self.vectors[rows], dtype=np.float32).mean(axis=0)) if rows \
+            else np.zeros(self.vectors.shape[1], dtype=np.float32)
+        lexical = self.hashing.embed(text)
+        return normalize(np.concatenate([semantic * math.sqrt(WORD_VECTOR_SHARE),
+                                         lexical * math.sqrt(1 - WORD_VECTOR_SHARE)]).astype(np.float32))
+
+
+class VectorIndex:
+    """Unit vectors kept in one contiguous float32 array and searched by dot product.
+
+    Up to ANN_THRESHOLD vectors every one is scored (a single matrix-vector product); beyond that
+    an IVF index trained with spherical k-means narrows the search to the closest groups.
+    """
+
+    def __init__(self, dimensions):
+        """Initialize the index.
+
+        Args:
+            dimensions (int): Length of the vectors
+        """
+        self.dimensions = dimensions
+        self._vectors = np.zeros((INITIAL_CAPACITY, dimensions), dtype=np.float32)
+        self._doc_ids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        # IVF group of each row, once centroids have been trained
+        self._groups = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._rows = {}
+        self._count = 0
+        self._centroids = None
+        self._trained_count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, doc_id):
+        return doc_id in self._rows
+
+    def add(self, doc_id, vector):
+        """Index (or replace) the vector of a document."""
+        self.remove(doc_id)
+        if self._count == len(self._vectors):
+            capacity = 2 * len(self._vectors)
+            self._vectors = np.resize(self._vectors, (capacity, self.dimensions))
+            self._doc_ids = np.resize(self._doc_ids, capacity)
+            self._groups = np.resize(self._groups, capacity)
+        row = self._count
+        self._vectors[row] = vector
+        self._doc_ids[row] = doc_id
+        if self._centroids is not None:
+            self._groups[row] = int(np.argmax(self._centroids @ vector))
+        self._rows[doc_id] = row
+        self._count += 1
+
+    def remove(self, doc_id):
+        """Drop a document; the last row moves into its place so the array stays contiguous."""
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return
+        last = self._count - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._doc_ids[row] = self._doc_ids[last]
+            self._groups[row] = self._groups[last]
+            self._rows[int(self._doc_ids[row])] = row
+        self._count = last
+
+    def _train(self):
+        """Cluster the vectors into about sqrt(n) groups with a few rounds of spherical k-means."""
+        count = self._count
+        lists = max(1, int(math.sqrt(count)))
+        rng = np.random.default_rng(0)
+        sample = self._vectors[rng.choice(count, min(count, lists * TRAINING_POINTS_PER_LIST), replace=False)]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Groups that lost all their points keep their old centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+        for start in range(0, count, 8192):
+            end = min(count, start + 8192)
+            self._groups[start:end] = np.argmax(self._vectors[start:end] @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._trained_count = count
+
+    def search(self, vector, limit, min_score=DEFAULT_MIN_SCORE):
+        """Find the documents whose vectors are most similar to a query vector.
+
+        Args:
+            vector: Unit query vector
+            limit (int): Maximum number of results
+            min_score (float): Smallest cosine similarity worth returning
+
+        Returns:
+            list: (doc_id, score) tuples, best first, older documents first on ties
+        """
+        count = self._count
+        if not count or limit <= 0 or not vector.any():
+            return []
+        if count >= ANN_THRESHOLD:
+            # Retrain as the history doubles, so groups stay about sqrt(n) in size
+            if self._centroids is None or count >= 2 * self._trained_count:
+                self._train()
+            closeness = self._centroids @ vector
+            probes = np.argsort(-closeness)[:ANN_PROBES]
+            rows = np.flatnonzero(np.isin(self._groups[:count], probes))
+            scores = self._vectors[rows] @ vector
+        else:
+            rows = np.arange(count)
+            scores = self._vectors[:count] @ vector
+
+        keep = np.flatnonzero(scores >= min_score)
+        if len(keep) > limit:
+            # Everything tied with the limit-th best score stays in, so ties go to older documents below
+            kth = np.partition(scores[keep], len(keep) - limit)[len(keep) - limit]
+            keep = keep[scores[keep] >= kth]
+        doc_ids = self._doc_ids[rows[keep]]
+        order = np.lexsort((doc_ids, -scores[keep]))[:limit]
+        return [(int(doc_ids[i]), min(1.0, float(scores[keep][i]))) for i in order]
+
+
+class SemanticIndex:
+    """Embeds interactions' user inputs and finds the ones closest in meaning to a query."""
+
+    def __init__(self, embedder, min_score=DEFAULT_MIN_SCORE):
+        """Initialize the index.
+
+        Args:
+            embedder: HashingEmbedder or WordVectorEmbedder
+            min_score (float): Smallest cosine similarity worth returning
+        """
+        self.embedder = embedder
+        self.min_score = min_score
+        self._vectors = VectorIndex(embedder.dimensions)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._vectors
+
+    def add(self, doc_id, text):
+        """Index a user input under doc_id."""
+        self._vectors.add(doc_id, self.embedder.embed(text))
+
+    def remove(self, doc_id):
+        """Remove a document from the index."""
+        self._vectors.remove(doc_id)
+
+    def search(self, text, limit):
+        """Rank documents by cosine similarity to a query.
+
+        Returns:
+            list: (doc_id, score) tuples, best first, older documents first on ties
+        """
+        return self._vectors.search(self.embedder.embed(text), limit, self.min_score)
+
+
+def merge_rankings(keyword_matches, semantic_matches, limit):
+    """Combine keyword and semantic matches, scoring each document by the better of its two scores.
+
+    Args:
+        keyword_matches (list): (doc_id, score) tuples from BM25
+        semantic_matches (list): (doc_id, score) tuples from SemanticIndex
+        limit (int): Maximum number of results
+
+    Returns:
+        list: (doc_id, score) tuples, best first, older documents first on ties
+    """
+    scores = dict(keyword_matches)
+    for doc_id, score in semantic_matches:
+        scores[doc_id] = max(score, scores.get(doc_id, 0.0))
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def semantic_from_env(stop_words=()):
+    """Build the semantic index selected by MEMORY_SEMANTIC and MEMORY_WORD_VECTORS.
+
+    Args:
+        stop_words (set): Words to ignore
+
+    Returns:
+        SemanticIndex: The index, or None when MEMORY_SEMANTIC isn't 1 or NumPy is missing
+    """
+    if os.getenv("MEMORY_SEMANTIC", "0") != "1":
+        return None
+    if np is None:
+        logger.warning("MEMORY_SEMANTIC=1 needs NumPy; relevant memories are found by keyword only")
+        return None
+    embedder = HashingEmbedder(stop_words=stop_words)
+    path = os.getenv("MEMORY_WORD_VECTORS")
+    if path:
+        try:
+            embedder = WordVectorEmbedder(path, embedder)
+        except (OSError, ValueError) as e:
+            print(f"Error loading word vectors from {path}: {str(e)}")
+    return SemanticIndex(embedder)
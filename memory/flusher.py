@@ -0,0 +1,111 @@
+import atexit
+import os
+import threading
+
+# How long changes may wait before they are written; 0 writes synchronously on the request path
+DEFAULT_FLUSH_INTERVAL_MS = 200
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+class MemoryFlusher:
+    """Persists memory changes on a background thread instead of on the request path.
+
+    Memory managers record their changes in memory and call schedule(). The worker wakes up,
+    waits up to interval_ms for more changes to accumulate, then has every scheduled manager
+    write its pending changes in one go, so bursts of changes cost a single write per manager.
+    """
+
+    def __init__(self, interval_ms=DEFAULT_FLUSH_INTERVAL_MS):
+        """Initialize the flusher.
+
+        Args:
+            interval_ms (float): Debounce window; writes happen at most this often
+        """
+        self.interval = interval_ms / 1000
+        self._dirty = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def schedule(self, manager):
+        """Ask for a manager's pending changes to be written soon.
+
+        Args:
+            manager (MemoryManager): Manager with pending changes
+        """
+        with self._condition:
+            if self._stopped:
+                # Shutting down: nobody will pick this up later
+                flush_now = True
+            else:
+                flush_now = False
+                self._dirty[manager] = None
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="memory-flusher", daemon=True)
+                    self._thread.start()
+                self._condition.notify()
+        if flush_now:
+            manager.flush_pending()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._dirty or self._stopped)
+                if self._stopped:
+                    return
+                # Debounce: let the rest of a burst of changes arrive before writing
+                self._condition.wait_for(lambda: self._stopped, timeout=self.interval)
+            self.flush()
+
+    def flush(self):
+        """Write the pending changes of every scheduled manager now."""
+        with self._condition:
+            managers = list(self._dirty)
+            self._dirty.clear()
+        for manager in managers:
+            try:
+                manager.flush_pending()
+            except Exception as e:
+                print(f"Error saving {manager.memory_type} memory: {str(e)}")
+
+    def stop(self):
+        """Stop the worker and write everything still pending."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._condition:
+            managers = list(self._dirty)
+        self.flush()
+        for manager in managers:
+            manager.store.flush()
+
+
+def flush_interval_from_env():
+    """Get the debounce window from MEMORY_FLUSH_INTERVAL_MS."""
+    return float(os.getenv("MEMORY_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL_MS))
+
+
+def get_flusher():
+    """Get the shared flusher, or None when MEMORY_FLUSH_INTERVAL_MS is 0 (synchronous writes)."""
+    global _flusher
+    interval_ms = flush_interval_from_env()
+    if interval_ms <= 0:
+        return None
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = MemoryFlusher(interval_ms)
+        return _flusher
+
+
+def shutdown():
+    """Write everything still pending; registered to run at exit."""
+    if _flusher is not None:
+        _flusher.stop()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,155 @@
+import heapq
+
+
+class HeavyHitters:
+    """Streaming top-k counter using the Space-Saving algorithm (Metwally et al.).
+
+    At most `capacity` keys are monitored. Counting a key that is not monitored once the table
+    is full evicts a key with the smallest count and gives the newcomer that count plus one, so
+    a count may overestimate by up to error(key) but a key counted more than N / capacity
+    times is never lost. Until the first eviction every count is exact.
+
+    Keys are grouped into buckets by count, so counting is O(1), and the current top
+    `top_size` keys are kept in a small ordered list that is patched as counts change.
+    """
+
+    def __init__(self, capacity=None, top_size=10):
+        """Initialize the counter.
+
+        Args:
+            capacity (int, optional): Keys monitored at most (None counts every key exactly)
+            top_size (int): Length of the cached top list
+        """
+        self.capacity = capacity
+        self.top_size = top_size
+        self.evictions = 0
+        self._counts = {}
+        self._errors = {}
+        self._buckets = {}
+        self._min_count = None
+        self._top = None
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, key):
+        return key in self._counts
+
+    @property
+    def exact(self):
+        """Whether every count is exact (no key has been evicted)."""
+        return not self._errors
+
+    def count(self, key):
+        """Counted occurrences of a key (0 if it isn't monitored)."""
+        return self._counts.get(key, 0)
+
+    def error(self, key):
+        """How much count(key) may overestimate."""
+        return self._errors.get(key, 0)
+
+    def load(self, key, count, error=0):
+        """Set a key's count directly, e.g. when restoring saved state.
+
+        Args:
+            key (str): The key
+            count (int): Its count
+            error (int): How much the count may overestimate
+        """
+        previous = self._counts.get(key)
+        if previous is not None:
+            self._leave_bucket(key, previous)
+        self._counts[key] = count
+        self._buckets.setdefault(count, {})[key] = None
+        if error:
+            self._errors[key] = error
+        self._min_count = None
+        self._top = None
+
+    def add(self, key):
+        """Count one occurrence of a key.
+
+        Args:
+            key (str): The key
+
+        Returns:
+            The key evicted to make room, or None
+        """
+        evicted = None
+        count = self._counts.get(key)
+        if count is None:
+            if self.capacity is not None and len(self._counts) >= self.capacity:
+                count = self._minimum()
+                # Oldest key in the smallest bucket, i.e. the least recently counted of the rarest
+                evicted = next(iter(self._buckets[count]))
+                self._leave_bucket(evicted, count)
+                del self._counts[evicted]
+                self._errors.pop(evicted, None)
+                self._errors[key] = count
+                self.evictions += 1
+            else:
+                count = 0
+        else:
+            self._leave_bucket(key, count)
+
+        count += 1
+        self._counts[key] = count
+        self._buckets.setdefault(count, {})[key] = None
+        # The key moved up from count - 1; if that emptied the smallest bucket, the minimum is now count
+        if count == 1:
+            self._min_count = 1
+        elif self._min_count == count - 1 and count - 1 not in self._buckets:
+            self._min_count = count
+        self._update_top(key, count, evicted)
+        return evicted
+
+    def top(self, limit):
+        """The keys with the highest counts.
+
+        Args:
+            limit (int): Number of keys
+
+        Returns:
+            list: (key, count) tuples, highest first
+        """
+        if limit > self.top_size:
+            return heapq.nlargest(limit, self._counts.items(), key=lambda item: item[1])
+        if self._top is None:
+            self._top = [key for key, _ in heapq.nlargest(self.top_size, self._counts.items(), key=lambda item: item[1])]
+        return [(key, self._counts[key]) for key in self._top[:limit]]
+
+    def _minimum(self):
+        """Smallest monitored count."""
+        if self._min_count is None or self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        return self._min_count
+
+    def _leave_bucket(self, key, count):
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def _update_top(self, key, count, evicted):
+        """Patch the cached top list after key's count rose to count."""
+        top = self._top
+        if top is None:
+            return
+        if evicted is not None and evicted in top:
+            self._top = None
+            return
+
+        if key in top:
+            position = top.index(key)
+        elif len(top) < self.top_size:
+            top.append(key)
+            position = len(top) - 1
+        elif count > self._counts[top[-1]]:
+            top[-1] = key
+            position = len(top) - 1
+        else:
+            return
+        # Counts only grow by one, so the key moves up past the keys it now outnumbers
+        while position > 0 and self._counts[top[position - 1]] < count:
+            top[position - 1], top[position] = top[position], top[position - 1]
+            position -= 1
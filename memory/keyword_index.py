@@ -0,0 +1,195 @@
+import heapq
+import math
+
+try:
+    import numpy as np
+except ImportError:  # Scoring falls back to pure Python
+    np = None
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Queries touching more postings than this are scored with NumPy when it is available
+VECTORIZE_THRESHOLD = 2048
+
+
+def bm25_idf(document_frequency, document_count):
+    """BM25 inverse document frequency (never negative)."""
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def bm25_term_score(idf, tf, length, average_length):
+    """BM25 contribution of one term to one document's score."""
+    return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+
+
+def bm25_query_norm(query_counts, idfs, average_length):
+    """Score the query would get against itself, used to normalize scores into [0, 1].
+
+    Args:
+        query_counts (dict): Query keyword -> occurrences in the query
+        idfs (dict): Query keyword -> idf
+        average_length (float): Average document length
+    """
+    length = sum(query_counts.values())
+    return sum(bm25_term_score(idfs[token], tf, length, average_length) for token, tf in query_counts.items())
+
+
+class KeywordIndex:
+    """Inverted index from keyword to the documents (interactions) containing it.
+
+    Documents are identified by integers that increase in insertion order, so ties in score
+    can be broken in favour of older documents exactly as a stable sort over history would.
+    Term and document frequencies are maintained incrementally for BM25 scoring.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._tokens = {}
+        self._lengths = {}
+        self._total_length = 0
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def add(self, doc_id, keywords):
+        """Index a document.
+
+        Args:
+            doc_id (int): Document number (increasing in insertion order)
+            keywords (list): The document's keywords (repeats count towards term frequency)
+        """
+        counts = {}
+        for token in keywords:
+            counts[token] = counts.get(token, 0) + 1
+
+        self._tokens[doc_id] = frozenset(counts)
+        self._lengths[doc_id] = len(keywords)
+        self._total_length += len(keywords)
+        for token, tf in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = {doc_id: tf}
+            else:
+                postings[doc_id] = tf
+            self._arrays.pop(token, None)
+
+    def remove(self, doc_id):
+        """Drop a document from the index."""
+        self._total_length -= self._lengths.pop(doc_id, 0)
+        for token in self._tokens.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+            self._arrays.pop(token, None)
+
+    def tokens(self, doc_id):
+        """Cached keyword set of a document."""
+        return self._tokens.get(doc_id, frozenset())
+
+    def document_frequency(self, token):
+        """Number of documents containing a keyword."""
+        return len(self._postings.get(token, ()))
+
+    def candidates(self, keywords):
+        """Count how many of the query keywords each matching document contains.
+
+        Only postings of the query keywords are visited, so the cost scales with the
+        number of matches rather than with the size of the index.
+
+        Args:
+            keywords (iterable): Query keywords
+
+        Returns:
+            dict: Mapping of doc_id to overlap count
+        """
+        overlap = {}
+        for token in set(keywords):
+            for doc_id in self._postings.get(token, ()):
+                overlap[doc_id] = overlap.get(doc_id, 0) + 1
+        return overlap
+
+    def search(self, keywords, limit):
+        """Find the documents sharing the most keywords with a query.
+
+        Args:
+            keywords (iterable): Query keywords
+            limit (int): Maximum number of results
+
+        Returns:
+            list: (doc_id, overlap) tuples, best first, older documents first on ties
+        """
+        overlap = self.candidates(keywords)
+        return heapq.nsmallest(limit, overlap.items(), key=lambda item: (-item[1], item[0]))
+
+    def bm25(self, keywords, limit):
+        """Rank documents against a query with BM25, normalized to [0, 1].
+
+        A score of 1.0 means the document matches the query as well as the query matches
+        itself; callers can treat high scores as confident matches.
+
+        Args:
+            keywords (list): Query keywords
+            limit (int): Maximum number of results
+
+        Returns:
+            list: (doc_id, score) tuples, best first, older documents first on ties
+        """
+        document_count = len(self._tokens)
+        query_counts = {}
+        for token in keywords:
+            query_counts[token] = query_counts.get(token, 0) + 1
+        matched = [token for token in query_counts if token in self._postings]
+        if not matched or not document_count:
+            return []
+
+        average_length = self._total_length / document_count or 1.0
+        # Keywords nobody used before still count towards the norm, so they lower the score
+        all_idfs = {token: bm25_idf(self.document_frequency(token), document_count) for token in query_counts}
+        norm = bm25_query_norm(query_counts, all_idfs, average_length)
+        idfs = {token: all_idfs[token] for token in matched}
+
+        postings_size = sum(len(self._postings[token]) for token in matched)
+        if np is not None and postings_size > VECTORIZE_THRESHOLD:
+            return self._bm25_vectorized(idfs, average_length, norm, limit)
+
+        scores = {}
+        for token, idf in idfs.items():
+            for doc_id, tf in self._postings[token].items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + bm25_term_score(idf, tf, self._lengths[doc_id], average_length)
+
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(doc_id, min(1.0, score / norm)) for doc_id, score in best]
+
+    def _posting_arrays(self, token):
+        """(doc ids, term frequencies, lengths) of a keyword's postings as NumPy arrays, cached until it changes."""
+        arrays = self._arrays.get(token)
+        if arrays is None:
+            postings = self._postings[token]
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            lengths = np.fromiter((self._lengths[doc_id] for doc_id in postings), dtype=np.float64, count=len(postings))
+            arrays = (doc_ids, tfs, lengths)
+            self._arrays[token] = arrays
+        return arrays
+
+    def _bm25_vectorized(self, idfs, average_length, norm, limit):
+        """BM25 over large candidate sets using NumPy."""
+        all_ids, all_scores = [], []
+        for token, idf in idfs.items():
+            doc_ids, tfs, lengths = self._posting_arrays(token)
+            all_ids.append(doc_ids)
+            all_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)))
+
+        doc_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.zeros(len(doc_ids))
+        np.add.at(scores, inverse, np.concatenate(all_scores))
+
+        # Sort by score descending, then doc_id ascending so older documents win ties
+        top = np.lexsort((doc_ids, -scores))[:limit]
+        ranked = [(int(doc_ids[i]), float(scores[i])) for i in top]
+        return [(doc_id, min(1.0, score / norm)) for doc_id, score in ranked]
@@ -1,16 +1,68 @@
 import os
-import json
+import logging
 from datetime import datetime
 import hashlib
+import time
+from memory.archive import archive_from_env
+from memory.embeddings import merge_rankings, semantic_from_env
+from memory.flusher import get_flusher
+from memory.heavy_hitters import HeavyHitters
+from memory.keyword_index import KeywordIndex
+from memory.near_duplicates import NearDuplicateIndex, as_fold, fold_replay, interaction_replay, merge_fold, move_to_end, \
+    threshold_from_env
+from memory.retention import RetentionPolicy, parse_timestamp
+from memory.rollups import DEFAULT_TREND_DAYS, UsageRollups, trend_range, usage_of
+from memory.stores import create_store
+from utils import metrics, timezones, tracing
+
+logger = logging.getLogger(__name__)
+
+# Hot memory matches scoring at least this make an archive lookup unnecessary
+ARCHIVE_LOOKUP_SCORE = 0.5
+
+# Words too common to say anything about what the user wants
+COMMON_WORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "about", "like"}
+
+
+def extract_keywords(text):
+    """Extract important keywords from text.
+    
+    Args:
+        text (str): The text to extract keywords from
+        
+    Returns:
+        list: List of extracted keywords
+    """
+    # Simple keyword extraction - split by spaces and filter out common words
+    words = text.lower().split()
+    return [word for word in words if word not in COMMON_WORDS and len(word) > 3]
+
+
+def create_memory_manager(memory_type="system"):
+    """Create the memory manager for the backend selected by MEMORY_STORE.
+    
+    Args:
+        memory_type (str): Type of memory to manage (system, calendar, todo)
+        
+    Returns:
+        MemoryManager: A MemoryManager, or a SQLiteMemoryManager when MEMORY_STORE=sqlite
+    """
+    if os.getenv("MEMORY_STORE", "jsonl").lower() == "sqlite":
+        from memory.sqlite_memory import SQLiteMemoryManager
+        return SQLiteMemoryManager(memory_type)
+    return MemoryManager(memory_type)
+
 
 class MemoryManager:
     """Manages memory for agents, storing interactions and patterns."""
     
-    def __init__(self, memory_type="system"):
+    def __init__(self, memory_type="system", store=None, retention=None):
         """Initialize the memory manager.
         
         Args:
             memory_type (str): Type of memory to manage (system, calendar, todo)
+            store (optional): Storage backend (defaults to the one selected by MEMORY_STORE)
+            retention (RetentionPolicy, optional): What to keep (defaults to the MEMORY_* environment settings)
         """
         # Ensure memory files are stored in the memory directory
         memory_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory")
@@ -18,25 +70,188 @@ class MemoryManager:
         # Create memory directory if it doesn't exist
         os.makedirs(memory_dir, exist_ok=True)
         
+        self.memory_type = memory_type
         self.memory_file = os.path.join(memory_dir, f"memory_{memory_type}.json")
+        self.store = store or create_store(memory_type, memory_dir)
+        self.retention = retention or RetentionPolicy.from_env()
+        # Near-identical commands are folded into one interaction with a count (0 disables folding)
+        self.dedup_threshold = threshold_from_env()
+        # Interactions the retention policy evicts move to a compressed archive instead of being deleted
+        self.archive = archive_from_env(os.path.join(memory_dir, f"memory_{memory_type}"), self._extract_keywords)
+        
+        # Agents may be driven from several threads at once (e.g. batch mode); sharing the store's
+        # lock also keeps background compaction from seeing a half-updated state
+        self._lock = self.store.lock
+        self.store.on_external_changes = self._merge_external
+        self._flusher = get_flusher()
+        self._pending = []
         self.memories = self._load_memories()
+        
+        # Shrink memory that outgrew the retention limits (or expired) while the app was not running
+        if self.retention.is_due(len(self.memories["interactions"]), len(self.memories["patterns"])) \
+                or self.retention.ttl_days or self.retention.pattern_ttl_days:
+            self.enforce_retention()
     
     def _load_memories(self):
-        """Load memories from the memory file."""
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                print(f"Error loading memory file. Creating new memory.")
-                return {"interactions": [], "patterns": {}, "preferences": {}}
-        else:
-            return {"interactions": [], "patterns": {}, "preferences": {}}
+        """Load memories from the store, re-deriving patterns and rollups the store's snapshot doesn't cover yet."""
+        with self._lock:
+            memories, replay = self.store.load()
+            self.memories = memories
+            # Memory saved before usage rollups existed is rolled up from the interactions it still has
+            backfill = "rollups" not in memories
+            self._rollups = UsageRollups(memories.setdefault("rollups", {}))
+            self._build_heavy_hitters()
+            for interaction in replay:
+                self._update_patterns(interaction["user_input"], interaction.get("agent_response") or {},
+                                      timestamp=interaction.get("timestamp"))
+                if not backfill:
+                    self._record_usage(interaction)
+            if backfill:
+                for interaction in memories["interactions"]:
+                    for repetition in interaction_replay(interaction):
+                        self._record_usage(repetition)
+            self._build_index()
+            return memories
+    
+    def _build_heavy_hitters(self):
+        """Track pattern frequencies in a Space-Saving counter bounded by the retention policy's max_patterns."""
+        self._heavy_hitters = HeavyHitters(capacity=self.retention.max_patterns or None)
+        for keyword, pattern in self.memories["patterns"].items():
+            self._heavy_hitters.load(keyword, pattern.get("frequency", 0), pattern.get("error", 0))
+    
+    def _build_index(self):
+        """Index every loaded interaction by keyword, by near-duplicate signature and (optionally) by embedding."""
+        self._index = KeywordIndex()
+        self._near_duplicates = NearDuplicateIndex(self.dedup_threshold, COMMON_WORDS) if self.dedup_threshold else None
+        # Optional embedding index that also finds paraphrases sharing no keyword with the query
+        self._semantic = semantic_from_env(COMMON_WORDS)
+        self._documents = {}
+        self._doc_ids = {}
+        self._next_doc_id = 0
+        for interaction in self.memories["interactions"]:
+            self._index_interaction(interaction)
+    
+    def _index_interaction(self, interaction):
+        """Add one interaction to the indexes (caller holds the lock)."""
+        doc_id = self._next_doc_id
+        self._next_doc_id += 1
+        self._documents[doc_id] = interaction
+        self._doc_ids[interaction.get("id")] = doc_id
+        self._index.add(doc_id, self._extract_keywords(interaction["user_input"]))
+        if self._near_duplicates is not None:
+            self._near_duplicates.add(doc_id, interaction["user_input"])
+        if self._semantic is not None:
+            self._semantic.add(doc_id, interaction["user_input"])
+        return doc_id
+    
+    def _unindex_interaction(self, doc_id):
+        """Remove one interaction from the indexes (caller holds the lock)."""
+        interaction = self._documents.pop(doc_id)
+        self._doc_ids.pop(interaction.get("id"), None)
+        self._index.remove(doc_id)
+        if self._near_duplicates is not None:
+            self._near_duplicates.remove(doc_id)
+        if self._semantic is not None:
+            self._semantic.remove(doc_id)
+    
+    def _fold(self, canonical, fold):
+        """Merge repetitions into an interaction and mark it as the most recently used (caller holds the lock)."""
+        merge_fold(canonical, fold)
+        move_to_end(self.memories["interactions"], canonical)
+        for repetition in fold_replay(fold):
+            self._update_patterns(repetition["user_input"], repetition["agent_response"],
+                                  timestamp=repetition["timestamp"])
+            self._record_usage(repetition)
+    
+    def _merge_external(self, interactions, preferences, folds=()):
+        """Take in interactions, repetitions and preference changes another process saved (caller holds the lock).
+        
+        Args:
+            interactions (list): Interactions this process hasn't seen
+            preferences (dict): Preference records newer than this process's
+            folds (list): (interaction id, fold) pairs of near-duplicates folded into known interactions
+        """
+        for interaction in interactions:
+            self.memories["interactions"].append(interaction)
+            self._index_interaction(interaction)
+            # It may already have been repeated in the other process
+            for repetition in interaction_replay(interaction):
+                self._update_patterns(repetition["user_input"], repetition.get("agent_response") or {},
+                                      timestamp=repetition.get("timestamp"))
+                self._record_usage(repetition)
+        for interaction_id, fold in folds:
+            doc_id = self._doc_ids.get(interaction_id)
+            if doc_id is not None:
+                self._fold(self._documents[doc_id], fold)
+        self.memories["preferences"].update(preferences)
+    
+    def refresh(self):
+        """Pick up changes other processes saved since this one last read or wrote the store."""
+        self.store.poll(self.memories)
+    
+    def _persist(self, operation, write, *args):
+        """Persist a change that has already been applied to self.memories (caller holds the lock).
+        
+        With a background flusher the write is only queued; otherwise it happens right away.
+        
+        Args:
+            operation (str): Name of the write, used in traces and metrics
+            write (callable): Store method to call
+            *args: Arguments for the store method
+        """
+        if self._flusher is None:
+            self._write(operation, write, args)
+            self.store.maybe_compact()
+            return
+        self._pending.append((operation, write, args))
+        self._flusher.schedule(self)
+    
+    def _write(self, operation, write, args):
+        """Run a store write, recording its size and duration."""
+        with tracing.span(f"memory.{operation}", memory_type=self.memory_type) as span:
+            start = time.perf_counter()
+            written = write(*args)
+            span.set_attribute("bytes", written)
+            metrics.registry.histogram("memory_save_duration_ms", "Memory write latency in milliseconds",
+                                       memory_type=self.memory_type, operation=operation).observe((time.perf_counter() - start) * 1000)
+            metrics.registry.gauge("memory_file_bytes", "Size of the memory files on disk",
+                                   memory_type=self.memory_type).set(self.store.size())
+    
+    def flush_pending(self):
+        """Write the changes queued for the background flusher."""
+        if self.store.coalesce_writes:
+            # One full save covers every queued change; the store only holds the lock while serializing
+            with self._lock:
+                if not self._pending:
+                    return
+                self._pending = []
+            self._write("save", self.store.save, (self.memories,))
+            return
+        
+        with self._lock:
+            pending, self._pending = self._pending, []
+            for operation, write, args in pending:
+                self._write(operation, write, args)
+            # Memories and the log agree again, so a compaction may capture them now
+            self.store.maybe_compact()
     
     def _save_memories(self):
-        """Save memories to the memory file."""
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.memories, f, indent=2)
+        """Save all memories to the store, superseding any queued changes."""
+        with self._lock:
+            self._pending = []
+            self._write("save", self.store.save, (self.memories,))
+    
+    def flush(self):
+        """Make sure everything recorded so far is on disk."""
+        self.flush_pending()
+        self.store.flush()
+    
+    def close(self):
+        """Flush and release the store."""
+        self.flush_pending()
+        self.store.close()
+        if self.archive is not None:
+            self.archive.close()
     
     def add_interaction(self, user_input, agent_response, metadata=None):
         """Add a new interaction to memory.
@@ -58,44 +273,130 @@ class MemoryManager:
             "metadata": metadata or {}
         }
         
-        # Add to interactions list
-        self.memories["interactions"].append(interaction)
-        
-        # Update patterns based on this interaction
-        self._update_patterns(user_input, agent_response)
-        
-        # Save the updated memories
-        self._save_memories()
+        with self._lock:
+            # A near-duplicate of an earlier command is folded into that interaction instead
+            duplicate = self._near_duplicates.find(user_input) if self._near_duplicates is not None else None
+            if duplicate is not None:
+                canonical = self._documents[duplicate]
+                fold = as_fold(interaction)
+                self._fold(canonical, fold)
+                self._persist("fold", self.store.fold_interaction, canonical["id"], fold, self.memories)
+                return
+            
+            # Add to interactions list
+            self.memories["interactions"].append(interaction)
+            self._index_interaction(interaction)
+            
+            # Update patterns and usage rollups based on this interaction
+            self._update_patterns(user_input, agent_response)
+            self._record_usage(interaction)
+            
+            # Persist the new interaction (a copy: later repetitions are logged as folds of their own)
+            self._persist("append", self.store.append_interaction, dict(interaction), self.memories)
+            
+            if self.retention.is_due(len(self.memories["interactions"]), len(self.memories["patterns"])):
+                self.enforce_retention()
     
-    def _update_patterns(self, user_input, agent_response):
+    def _update_patterns(self, user_input, agent_response, timestamp=None):
         """Update recognized patterns based on user interactions.
         
         Args:
             user_input (str): The user's input
             agent_response (dict): The agent's response
+            timestamp (str, optional): When the interaction happened (defaults to now)
         """
+        timestamp = timestamp or datetime.now().isoformat()
         # Extract keywords from user input
         keywords = self._extract_keywords(user_input)
         
-        # Update frequency of patterns
+        # Update frequency of patterns; once max_patterns keywords are tracked, a new keyword
+        # takes over the pattern of the least frequent one (Space-Saving)
         for keyword in keywords:
-            if keyword in self.memories["patterns"]:
-                self.memories["patterns"][keyword]["frequency"] += 1
-            else:
+            evicted = self._heavy_hitters.add(keyword)
+            if evicted is not None:
+                self.memories["patterns"].pop(evicted, None)
+            
+            if keyword not in self.memories["patterns"]:
                 self.memories["patterns"][keyword] = {
-                    "frequency": 1,
-                    "last_seen": datetime.now().isoformat(),
+                    "frequency": 0,
+                    "last_seen": timestamp,
                     "examples": []
                 }
+            pattern = self.memories["patterns"][keyword]
+            pattern["frequency"] = self._heavy_hitters.count(keyword)
+            pattern["last_seen"] = timestamp
+            if self._heavy_hitters.error(keyword):
+                pattern["error"] = self._heavy_hitters.error(keyword)
             
             # Add this as an example if we don't have too many
-            if len(self.memories["patterns"][keyword]["examples"]) < 5:
+            if len(pattern["examples"]) < 5:
                 example = {
                     "input": user_input,
                     "response_status": agent_response.get("status", "unknown"),
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": timestamp
                 }
-                self.memories["patterns"][keyword]["examples"].append(example)
+                pattern["examples"].append(example)
+    
+    def _record_usage(self, interaction):
+        """Count an interaction in the hourly and daily usage rollups (caller holds the lock)."""
+        usage = usage_of(interaction, self.memory_type)
+        if usage is not None:
+            self._rollups.record(*usage)
+    
+    def enforce_retention(self):
+        """Drop interactions and patterns the retention policy doesn't keep and rewrite the store.
+        
+        Evicted interactions that haven't expired are moved to the archive.
+        
+        Returns:
+            dict: How many interactions and patterns were removed, how many of those interactions
+                were archived and how many bytes were reclaimed
+        """
+        with self._lock:
+            size_before = self.store.size()
+            interactions = self.memories["interactions"]
+            kept = self.retention.select_interactions(interactions)
+            kept_patterns = self.retention.select_patterns(self.memories["patterns"])
+            report = {
+                "interactions_removed": len(interactions) - len(kept),
+                "interactions_archived": 0,
+                "patterns_removed": len(self.memories["patterns"]) - len(kept_patterns),
+                "bytes_reclaimed": 0,
+            }
+            cutoff = self.retention.interaction_cutoff()
+            if self.archive is not None and cutoff is not None:
+                self.archive.expire(cutoff)
+            if not report["interactions_removed"] and not report["patterns_removed"]:
+                return report
+            
+            if report["interactions_removed"]:
+                kept_ids = {id(interaction) for interaction in kept}
+                if self.archive is not None:
+                    archived = [interaction for interaction in interactions if id(interaction) not in kept_ids and (
+                        cutoff is None
+                        or (parse_timestamp(interaction.get("last_seen") or interaction.get("timestamp")) or cutoff) >= cutoff)]
+                    self.archive.add(archived)
+                    report["interactions_archived"] = len(archived)
+                for doc_id, interaction in list(self._documents.items()):
+                    if id(interaction) not in kept_ids:
+                        self._unindex_interaction(doc_id)
+                self.memories["interactions"] = kept
+            if report["patterns_removed"]:
+                self.memories["patterns"] = {key: pattern for key, pattern in self.memories["patterns"].items()
+                                             if key in kept_patterns}
+                self._build_heavy_hitters()
+            
+            self._save_memories()
+            report["bytes_reclaimed"] = max(0, size_before - self.store.size())
+        
+        for kind in ("interactions", "patterns"):
+            metrics.registry.counter("memory_evictions_total", "Memory entries removed by the retention policy",
+                                     memory_type=self.memory_type, kind=kind).inc(report[f"{kind}_removed"])
+        logger.info(
+            f"Retention removed {report['interactions_removed']} interactions ({report['interactions_archived']} "
+            f"archived) and {report['patterns_removed']} patterns from {self.memory_type} memory, "
+            f"reclaiming {report['bytes_reclaimed']} bytes")
+        return report
     
     def _extract_keywords(self, text):
         """Extract important keywords from text.
@@ -106,12 +407,9 @@ class MemoryManager:
         Returns:
             list: List of extracted keywords
         """
-        # Simple keyword extraction - split by spaces and filter out common words
-        common_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "about", "like"}
-        words = text.lower().split()
-        keywords = [word for word in words if word not in common_words and len(word) > 3]
-        return keywords
+        return extract_keywords(text)
     
+    @tracing.traced("memory.get_relevant_memories")
     def get_relevant_memories(self, user_input, limit=5):
         """Get memories relevant to the current user input.
         
@@ -120,24 +418,38 @@ class MemoryManager:
             limit (int): Maximum number of memories to return
             
         Returns:
-            list: List of relevant past interactions
+            list: List of relevant past interactions, each with a "similarity_score" between 0 and 1
         """
         keywords = self._extract_keywords(user_input)
+        self.refresh()
         
-        # Score each past interaction based on keyword overlap
-        scored_interactions = []
-        for interaction in self.memories["interactions"]:
-            past_input = interaction["user_input"]
-            past_keywords = self._extract_keywords(past_input)
-            
-            # Calculate overlap score
-            overlap = len(set(keywords).intersection(set(past_keywords)))
-            if overlap > 0:
-                scored_interactions.append((overlap, interaction))
+        # BM25 over the interactions sharing a keyword, normalized so 1.0 means as good as an exact repeat;
+        # with MEMORY_SEMANTIC=1 an interaction scores the better of that and its embedding's cosine similarity
+        with self._lock:
+            matches = self._index.bm25(keywords, limit)
+            if self._semantic is not None:
+                matches = merge_rankings(matches, self._semantic.search(user_input, limit), limit)
+            memories = [dict(self._documents[doc_id], similarity_score=score) for doc_id, score in matches]
+        return self._with_archived(memories, keywords, limit)
+    
+    def _with_archived(self, memories, keywords, limit):
+        """Merge in archived matches unless hot memory already has limit good ones.
         
-        # Sort by score (highest first) and return top matches
-        scored_interactions.sort(key=lambda x: x[0], reverse=True)
-        return [interaction for _, interaction in scored_interactions[:limit]]
+        Args:
+            memories (list): Relevant memories found in hot memory, best first
+            keywords (list): Query keywords
+            limit (int): Maximum number of memories to return
+            
+        Returns:
+            list: The best limit memories from both, best first
+        """
+        good = [memory for memory in memories if memory["similarity_score"] >= ARCHIVE_LOOKUP_SCORE]
+        if self.archive is None or len(good) >= limit:
+            return memories
+        seen = {memory["id"] for memory in memories}
+        archived = [memory for memory in self.archive.search(keywords, limit) if memory["id"] not in seen]
+        # Stable sort: on equal scores hot memories stay ahead of archived ones
+        return sorted(memories + archived, key=lambda memory: memory["similarity_score"], reverse=True)[:limit]
     
     def update_preference(self, preference_key, preference_value):
         """Update a user preference.
@@ -146,11 +458,13 @@ class MemoryManager:
             preference_key (str): The preference identifier
             preference_value: The preference value
         """
-        self.memories["preferences"][preference_key] = {
+        record = {
             "value": preference_value,
             "updated_at": datetime.now().isoformat()
         }
-        self._save_memories()
+        with self._lock:
+            self.memories["preferences"][preference_key] = record
+            self._persist("set_preference", self.store.set_preference, preference_key, record, self.memories)
     
     def get_preference(self, preference_key, default=None):
         """Get a user preference.
@@ -162,9 +476,36 @@ class MemoryManager:
         Returns:
             The preference value or default
         """
+        self.refresh()
         if preference_key in self.memories["preferences"]:
             return self.memories["preferences"][preference_key]["value"]
         return default
+    
+    def set_timezone(self, zone_name):
+        """Set the user's time zone, used to parse and format their dates.
+        
+        Args:
+            zone_name (str): IANA zone name, e.g. "Africa/Cairo"
+            
+        Raises:
+            ValueError: If the name isn't a known zone
+        """
+        timezones.get_zone(zone_name)
+        self.update_preference(timezones.TIMEZONE_PREFERENCE, zone_name)
+    
+    def get_timezone(self):
+        """Get the user's time zone.
+        
+        Returns:
+            tzinfo: The zone from the timezone preference, or timezones.default_zone() if unset or unknown
+        """
+        zone_name = self.get_preference(timezones.TIMEZONE_PREFERENCE)
+        if zone_name:
+            try:
+                return timezones.get_zone(zone_name)
+            except ValueError as e:
+                logger.warning(f"Ignoring timezone preference: {str(e)}")
+        return timezones.default_zone()
      
     def get_common_patterns(self, limit=10):
         """Get the most common usage patterns.
@@ -175,9 +516,27 @@ class MemoryManager:
         Returns:
             list: List of (pattern, frequency) tuples
         """
-        patterns = [(k, v["frequency"]) for k, v in self.memories["patterns"].items()]
-        patterns.sort(key=lambda x: x[1], reverse=True)
-        return patterns[:limit]
+        # Served from the heavy-hitter counter's cached top list instead of sorting every pattern
+        with self._lock:
+            return self._heavy_hitters.top(limit)
+    
+    def get_usage(self, granularity="day", since=None, until=None):
+        """Get usage rollups over a time range.
+        
+        Args:
+            granularity (str): "hour" or "day"
+            since (datetime, optional): Start of the range (defaults to the start of the day a week ago)
+            until (datetime, optional): End of the range (defaults to now)
+            
+        Returns:
+            list: (bucket key, bucket) tuples, oldest first; a bucket counts "requests", "errors",
+                "latency_ms" (summed over the "timed" requests) and requests per agent type ("agents")
+        """
+        default_since, default_until = trend_range(DEFAULT_TREND_DAYS)
+        self.refresh()
+        with self._lock:
+            return [(key, dict(bucket, agents=dict(bucket["agents"])))
+                    for key, bucket in self._rollups.buckets(granularity, since or default_since, until or default_until)]
     
     def generate_insights(self):
         """Generate insights about user behavior based on stored memories.
@@ -185,19 +544,28 @@ class MemoryManager:
         Returns:
             dict: Dictionary of insights
         """
+        self.refresh()
+        
         # Get common patterns
         common_patterns = self.get_common_patterns(5)
         
-        # Count total interactions
-        total_interactions = len(self.memories["interactions"])
+        # Count total interactions, repeats of a command included
+        total_interactions = sum(interaction.get("count", 1) for interaction in self.memories["interactions"])
         
         # Get preferences
         preferences = self.memories["preferences"]
         
+        # Usage over the last week, read from the rollups rather than the interactions
+        with self._lock:
+            trends = self._rollups.trends()
+        
         insights = {
             "total_interactions": total_interactions,
             "common_patterns": common_patterns,
+            "pattern_counts_exact": self._heavy_hitters.exact,
+            "archived_interactions": self.archive.count() if self.archive is not None else 0,
             "preferences": preferences,
+            "trends": trends,
         }
         
         return insights
\ No newline at end of file
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import string
+import struct
+
+# MinHash signature length and LSH banding: 8 bands of 4 rows make pairs with a Jaccard
+# similarity around (1/8) ** (1/4) ~ 0.6 or more likely to share a band (0.8: 98.5%)
+NUM_PERMUTATIONS = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# High enough that commands differing in one detail out of a handful of words stay apart
+DEFAULT_THRESHOLD = 0.8
+# Distinct phrasings remembered per folded interaction
+MAX_VARIANTS = 5
+
+# One 32-bit hash per permutation, all cut from a single SHAKE digest of the shingle
+_SIGNATURE_FORMAT = struct.Struct(f">{NUM_PERMUTATIONS}I")
+# Words that don't change what a command asks for
+FILLER_WORDS = {"my", "me", "i", "please", "can", "could", "you"}
+_PUNCTUATION = str.maketrans("", "", string.punctuation.replace("-", ""))
+
+
+def threshold_from_env():
+    """Get the similarity above which interactions are folded from MEMORY_DEDUP_THRESHOLD (0 disables folding)."""
+    return float(os.getenv("MEMORY_DEDUP_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+def shingles(text, stop_words=()):
+    """Normalized word shingles of a command: lowercase, no punctuation, stop words dropped, plurals singular.
+
+    Args:
+        text (str): The command
+        stop_words (set): Words to ignore
+
+    Returns:
+        frozenset: The shingles
+    """
+    tokens = set()
+    for word in text.lower().translate(_PUNCTUATION).split():
+        if word in stop_words or word in FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens)
+
+
+def _shingle_hashes(shingle):
+    digest = hashlib.shake_128(shingle.encode('utf-8')).digest(_SIGNATURE_FORMAT.size)
+    return _SIGNATURE_FORMAT.unpack(digest)
+
+
+def minhash(shingle_set):
+    """MinHash signature of a shingle set (NUM_PERMUTATIONS values).
+
+    Hashes are stable across processes and runs, as the SQLite backend stores the band keys.
+    """
+    if not shingle_set:
+        return (0,) * NUM_PERMUTATIONS
+    return tuple(map(min, zip(*map(_shingle_hashes, shingle_set))))
+
+
+def numbered(shingle_set):
+    """The shingles containing digits (times, dates, amounts), sorted."""
+    return tuple(sorted(token for token in shingle_set if any(c.isdigit() for c in token)))
+
+
+def band_keys(shingle_set):
+    """LSH bucket keys of a shingle set, one per band, as signed 64-bit integers.
+
+    Each key also covers the numbered shingles, which near-duplicates must share, so that
+    "item 1" .. "item 5000" don't all land in the same buckets.
+    """
+    signature = _SIGNATURE_FORMAT.pack(*minhash(shingle_set))
+    numbers = " ".join(numbered(shingle_set)).encode('utf-8')
+    band_size = len(signature) // BANDS
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * band_size:(band + 1) * band_size] + numbers,
+                                 digest_size=8, person=bytes([band])).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def is_near_duplicate(first, second, threshold):
+    """Whether two shingle sets are near-duplicates.
+
+    Their Jaccard similarity must reach threshold, and shingles containing digits (times, dates,
+    amounts) must be identical: "meeting at 3pm" and "meeting at 4pm" are different commands.
+    """
+    if numbered(first) != numbered(second):
+        return False
+    union = len(first | second)
+    return union > 0 and len(first & second) / union >= threshold
+
+
+def as_fold(interaction):
+    """Describe one interaction as a fold to merge into its canonical near-duplicate."""
+    return {
+        "count": 1,
+        "user_input": interaction["user_input"],
+        "last_seen": interaction["timestamp"],
+        "agent_response": interaction.get("agent_response"),
+        "metadata": interaction.get("metadata"),
+        "variants": [{"user_input": interaction["user_input"], "count": 1, "last_seen": interaction["timestamp"]}],
+    }
+
+
+def merge_fold(canonical, fold):
+    """Fold repetitions into a canonical interaction.
+
+    The canonical record keeps its id, first timestamp and phrasing; it gains a count, the
+    last_seen time and the latest response and metadata, and remembers up to MAX_VARIANTS
+    distinct phrasings with their own counts.
+
+    Args:
+        canonical (dict): Interaction record, updated in place
+        fold (dict): Repetitions, as built by as_fold or fold_difference
+    """
+    last_seen = canonical.get("last_seen", canonical["timestamp"])
+    if "variants" not in canonical:
+        canonical["variants"] = [{"user_input": canonical["user_input"], "count": canonical.get("count", 1),
+                                  "last_seen": last_seen}]
+    canonical["count"] = canonical.get("count", 1) + fold["count"]
+    if fold["last_seen"] >= last_seen:
+        canonical["last_seen"] = fold["last_seen"]
+        canonical["agent_response"] = fold["agent_response"]
+        canonical["metadata"] = fold["metadata"]
+
+    variants = {variant["user_input"]: variant for variant in canonical["variants"]}
+    for variant in fold["variants"]:
+        known = variants.get(variant["user_input"])
+        if known is not None:
+            known["count"] += variant["count"]
+            known["last_seen"] = max(known["last_seen"], variant["last_seen"])
+        elif len(canonical["variants"]) < MAX_VARIANTS:
+            canonical["variants"].append(dict(variant))
+
+
+def copy_interaction(interaction):
+    """Copy of an interaction that later folds into the original won't change."""
+    copy = dict(interaction)
+    if "variants" in copy:
+        copy["variants"] = [dict(variant) for variant in copy["variants"]]
+    return copy
+
+
+def interaction_replay(interaction):
+    """Every repetition folded into an interaction as an interaction, for re-deriving usage patterns."""
+    if "variants" not in interaction:
+        return [interaction]
+    replay = []
+    for variant in interaction["variants"]:
+        replay += [dict(interaction, user_input=variant["user_input"], timestamp=variant["last_seen"])] * variant["count"]
+    # Phrasings beyond MAX_VARIANTS are only counted; attribute them to the canonical phrasing
+    replay += [interaction] * (interaction.get("count", 1) - len(replay))
+    return replay
+
+
+def fold_replay(fold):
+    """The repetitions in a fold as interactions, for re-deriving usage patterns."""
+    interaction = {"user_input": fold["user_input"], "agent_response": fold.get("agent_response") or {},
+                   "timestamp": fold["last_seen"], "metadata": fold.get("metadata") or {}}
+    return [interaction] * fold["count"]
+
+
+def move_to_end(interactions, interaction):
+    """Move a just-repeated interaction to the end of the list, which is kept in order of last use."""
+    for position in range(len(interactions) - 1, -1, -1):
+        if interactions[position] is interaction:
+            interactions.append(interactions.pop(position))
+            return
+
+
+def fold_difference(local, disk, baseline_count):
+    """The repetitions another process folded into a record, as a fold.
+
+    Args:
+        local (dict): This process's copy of the record
+        disk (dict): The copy another process saved
+        baseline_count (int): The record's count when this process last synchronized with that copy
+
+    Returns:
+        dict: Fold to merge into local, or None if the other copy has nothing new
+    """
+    count = disk.get("count", 1) - baseline_count
+    if count <= 0:
+        return None
+    known = {variant["user_input"] for variant in local.get("variants", [{"user_input": local["user_input"]}])}
+    return {
+        "count": count,
+        "user_input": disk["user_input"],
+        "last_seen": disk.get("last_seen", disk["timestamp"]),
+        "agent_response": disk.get("agent_response"),
+        "metadata": disk.get("metadata"),
+        "variants": [variant for variant in disk.get("variants", []) if variant["user_input"] not in known],
+    }
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index for finding an earlier near-duplicate of a command in roughly constant time."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, stop_words=()):
+        """Initialize the index.
+
+        Args:
+            threshold (float): Jaccard similarity from which two commands are near-duplicates
+            stop_words (set): Words ignored when shingling
+        """
+        self.threshold = threshold
+        self.stop_words = stop_words
+        self._buckets = {}
+        self._documents = {}
+        # find() then add() of the same new command shingles and hashes it once
+        self._last = (None, None)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, doc_id, text):
+        """Index a command under doc_id."""
+        shingle_set, keys = self._signature(text)
+        self._documents[doc_id] = (shingle_set, keys)
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def _signature(self, text):
+        if self._last[0] != text:
+            shingle_set = shingles(text, self.stop_words)
+            self._last = (text, (shingle_set, band_keys(shingle_set)))
+        return self._last[1]
+
+    def remove(self, doc_id):
+        """Remove a command from the index."""
+        entry = self._documents.pop(doc_id, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, text):
+        """The indexed near-duplicate most similar to a command.
+
+        Args:
+            text (str): The command
+
+        Returns:
+            The doc_id of the closest near-duplicate (the newest on ties), or None
+        """
+        shingle_set, keys = self._signature(text)
+        candidates = set()
+        for key in keys:
+            candidates |= self._buckets.get(key, set())
+
+        best, best_similarity = None, 0.0
+        for doc_id in candidates:
+            other = self._documents[doc_id][0]
+            if not is_near_duplicate(shingle_set, other, self.threshold):
+                continue
+            similarity = len(shingle_set & other) / len(shingle_set | other)
+            if similarity > best_similarity or similarity == best_similarity and doc_id > best:
+                best, best_similarity = doc_id, similarity
+        return best
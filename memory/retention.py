@@ -0,0 +1,158 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+# Defaults keep a few thousand interactions and patterns per memory type
+DEFAULT_MAX_INTERACTIONS = 5000
+DEFAULT_RESERVOIR_SIZE = 1000
+DEFAULT_MAX_PATTERNS = 2000
+
+# Limits may be overshot by this share before eviction runs, so its cost is spread over many writes
+ENFORCEMENT_SLACK = 0.1
+
+
+def reservoir_sample(items, k, rng=random):
+    """Pick a uniform random sample of k items in one pass (Algorithm R), keeping their original order.
+
+    Args:
+        items (iterable): Items to sample from
+        k (int): Sample size
+        rng (random.Random): Random number generator
+
+    Returns:
+        list: The sampled items
+    """
+    reservoir = []
+    for position, item in enumerate(items):
+        if position < k:
+            reservoir.append((position, item))
+        else:
+            slot = rng.randint(0, position)
+            if slot < k:
+                reservoir[slot] = (position, item)
+    reservoir.sort(key=lambda entry: entry[0])
+    return [item for _, item in reservoir]
+
+
+def parse_timestamp(timestamp):
+    """Parse a stored ISO timestamp, or None if it is missing or malformed."""
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetentionPolicy:
+    """Decides which interactions and patterns a memory keeps.
+
+    Interactions older than ttl_days are dropped. Beyond max_interactions, the newest
+    max_interactions - reservoir_size interactions are kept as they are and the older ones are
+    thinned to a uniform random sample of reservoir_size, so old history stays represented
+    without growing. Patterns not seen for pattern_ttl_days are dropped, and beyond
+    max_patterns the least frequent ones go first (least recently seen on ties).
+    A limit of 0 disables that rule.
+    """
+
+    def __init__(self, max_interactions=DEFAULT_MAX_INTERACTIONS, reservoir_size=DEFAULT_RESERVOIR_SIZE,
+                 ttl_days=0, max_patterns=DEFAULT_MAX_PATTERNS, pattern_ttl_days=0, seed=None):
+        """Initialize the policy.
+
+        Args:
+            max_interactions (int): Interactions kept at most
+            reservoir_size (int): How many of those are a random sample of older history
+            ttl_days (float): Age after which interactions are dropped
+            max_patterns (int): Pattern keys kept at most
+            pattern_ttl_days (float): Days without use after which a pattern is dropped
+            seed (int, optional): Seed for the downsampling, for reproducible runs
+        """
+        self.max_interactions = max_interactions
+        self.reservoir_size = min(reservoir_size, max_interactions) if max_interactions else 0
+        self.ttl_days = ttl_days
+        self.max_patterns = max_patterns
+        self.pattern_ttl_days = pattern_ttl_days
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_env(cls):
+        """Build the policy from MEMORY_MAX_INTERACTIONS, MEMORY_RESERVOIR_SIZE, MEMORY_TTL_DAYS,
+        MEMORY_MAX_PATTERNS and MEMORY_PATTERN_TTL_DAYS."""
+        return cls(
+            max_interactions=int(os.getenv("MEMORY_MAX_INTERACTIONS", DEFAULT_MAX_INTERACTIONS)),
+            reservoir_size=int(os.getenv("MEMORY_RESERVOIR_SIZE", DEFAULT_RESERVOIR_SIZE)),
+            ttl_days=float(os.getenv("MEMORY_TTL_DAYS", 0)),
+            max_patterns=int(os.getenv("MEMORY_MAX_PATTERNS", DEFAULT_MAX_PATTERNS)),
+            pattern_ttl_days=float(os.getenv("MEMORY_PATTERN_TTL_DAYS", 0)),
+        )
+
+    def is_due(self, interaction_count, pattern_count):
+        """Whether the memory has outgrown its limits by more than the slack."""
+        return (bool(self.max_interactions) and interaction_count > self.max_interactions * (1 + ENFORCEMENT_SLACK)
+                or bool(self.max_patterns) and pattern_count > self.max_patterns * (1 + ENFORCEMENT_SLACK))
+
+    def interaction_cutoff(self, now=None):
+        """Timestamp before which interactions expire, or None without a TTL."""
+        if not self.ttl_days:
+            return None
+        return (now or datetime.now()) - timedelta(days=self.ttl_days)
+
+    def pattern_cutoff(self, now=None):
+        """Timestamp before which unused patterns expire, or None without a pattern TTL."""
+        if not self.pattern_ttl_days:
+            return None
+        return (now or datetime.now()) - timedelta(days=self.pattern_ttl_days)
+
+    def select_interactions(self, interactions, now=None):
+        """Choose the interactions to keep.
+
+        Args:
+            interactions (list): Interactions, oldest first
+            now (datetime, optional): Current time
+
+        Returns:
+            list: The interactions to keep, oldest first
+        """
+        cutoff = self.interaction_cutoff(now)
+        if cutoff is not None:
+            # Folded near-duplicates count from their last repetition
+            interactions = [interaction for interaction in interactions
+                            if (parse_timestamp(interaction.get("last_seen") or interaction.get("timestamp"))
+                                or cutoff) >= cutoff]
+
+        if not self.max_interactions or len(interactions) <= self.max_interactions:
+            return interactions
+        old_count = len(interactions) - (self.max_interactions - self.reservoir_size)
+        return self.downsample(interactions[:old_count]) + interactions[old_count:]
+
+    def downsample(self, old_items):
+        """Thin the part of history outside the recent window to reservoir_size items.
+
+        Args:
+            old_items (list): Items older than the newest max_interactions - reservoir_size
+
+        Returns:
+            list: The items kept, in their original order
+        """
+        return reservoir_sample(old_items, self.reservoir_size, self._rng)
+
+    def select_patterns(self, patterns, now=None):
+        """Choose the pattern keys to keep.
+
+        Args:
+            patterns (dict): Pattern key -> {"frequency", "last_seen", "examples"}
+            now (datetime, optional): Current time
+
+        Returns:
+            set: The keys to keep
+        """
+        cutoff = self.pattern_cutoff(now)
+        if cutoff is not None:
+            keys = [key for key, pattern in patterns.items()
+                    if (parse_timestamp(pattern.get("last_seen")) or cutoff) >= cutoff]
+        else:
+            keys = list(patterns)
+
+        if self.max_patterns and len(keys) > self.max_patterns:
+            keys.sort(key=lambda key: (patterns[key].get("frequency", 0), patterns[key].get("last_seen", "")),
+                      reverse=True)
+            keys = keys[:self.max_patterns]
+        return set(keys)
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+
+# Hourly buckets feed "busiest hours" and are kept for two weeks; daily buckets for about a year
+HOURLY_RETENTION_DAYS = 14
+DAILY_RETENTION_DAYS = 400
+# Days covered by the trends in generate_insights
+DEFAULT_TREND_DAYS = 7
+
+# Bucket keys are prefixes of the ISO timestamps interactions are stored with
+KEY_LENGTH = {"hour": len("2025-01-01T00"), "day": len("2025-01-01")}
+STEP = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+KEY_FORMAT = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d"}
+
+# Orchestrator routing notes precede the real result of the same request; they aren't requests
+ROUTING_STATUS = "processing"
+
+
+def empty_bucket():
+    return {"requests": 0, "errors": 0, "latency_ms": 0.0, "timed": 0, "agents": {}}
+
+
+def usage_of(interaction, default_agent_type):
+    """What an interaction adds to the rollups.
+
+    Args:
+        interaction (dict): Interaction record (or repetition of one)
+        default_agent_type (str): Agent type when the metadata doesn't name one
+
+    Returns:
+        tuple: (timestamp, agent type, status, duration in ms or None), or None for routing notes
+    """
+    response = interaction.get("agent_response") or {}
+    status = response.get("status", "unknown") if isinstance(response, dict) else "unknown"
+    if status == ROUTING_STATUS:
+        return None
+    metadata = interaction.get("metadata") or {}
+    return (interaction.get("timestamp"), metadata.get("agent_type") or default_agent_type, status,
+            metadata.get("duration_ms"))
+
+
+class UsageRollups:
+    """Per-hour and per-day usage counters, updated as interactions are recorded.
+
+    Each bucket holds the number of requests, how many failed, their summed latency and a count
+    per agent type, so trends over a time range cost one lookup per bucket however many
+    interactions the range saw. Buckets live in a plain dict (memories["rollups"]) that the
+    stores persist along with the rest of memory.
+    """
+
+    def __init__(self, data=None):
+        """Initialize the rollups.
+
+        Args:
+            data (dict, optional): {"hour": {key: bucket}, "day": {key: bucket}}, updated in place
+        """
+        self.data = data if data is not None else {}
+        for granularity in KEY_LENGTH:
+            self.data.setdefault(granularity, {})
+
+    def record(self, timestamp, agent_type, status, duration_ms=None, count=1):
+        """Count requests in the hour and day of timestamp.
+
+        Args:
+            timestamp (str): ISO timestamp of the request
+            agent_type (str): Agent the request was routed to
+            status (str): Result status ("error" counts as failed)
+            duration_ms (float, optional): Request latency
+            count (int): Number of identical requests
+        """
+        if not timestamp:
+            return
+        for granularity, length in KEY_LENGTH.items():
+            buckets = self.data[granularity]
+            key = timestamp[:length]
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = empty_bucket()
+                if granularity == "day":
+                    self.prune(datetime.fromisoformat(key))
+            bucket["requests"] += count
+            if status == "error":
+                bucket["errors"] += count
+            if duration_ms is not None:
+                bucket["latency_ms"] += duration_ms * count
+                bucket["timed"] += count
+            bucket["agents"][agent_type] = bucket["agents"].get(agent_type, 0) + count
+
+    def prune(self, now):
+        """Drop buckets older than their retention (runs once a day, when a new day starts)."""
+        for granularity, days in (("hour", HOURLY_RETENTION_DAYS), ("day", DAILY_RETENTION_DAYS)):
+            cutoff = (now - timedelta(days=days)).strftime(KEY_FORMAT[granularity])
+            buckets = self.data[granularity]
+            for key in [key for key in buckets if key < cutoff]:
+                del buckets[key]
+
+    def buckets(self, granularity, since, until):
+        """The non-empty buckets of a time range, oldest first.
+
+        Args:
+            granularity (str): "hour" or "day"
+            since (datetime): Start of the range
+            until (datetime): End of the range (inclusive)
+
+        Returns:
+            list: (key, bucket) tuples
+        """
+        found = []
+        buckets = self.data[granularity]
+        moment = bucket_start(granularity, since)
+        while moment <= until:
+            key = moment.strftime(KEY_FORMAT[granularity])
+            if key in buckets:
+                found.append((key, buckets[key]))
+            moment += STEP[granularity]
+        return found
+
+    def trends(self, days=DEFAULT_TREND_DAYS, now=None):
+        """Usage over the last few days (see usage_trends)."""
+        return usage_trends(self.buckets, days, now)
+
+
+def bucket_start(granularity, moment):
+    """Start of the hour or day a moment falls in."""
+    return datetime.strptime(moment.strftime(KEY_FORMAT[granularity]), KEY_FORMAT[granularity])
+
+
+def trend_range(days, now=None):
+    """(since, until) covering the last days days, today included."""
+    now = now or datetime.now()
+    since = (now - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return since, now
+
+
+def usage_trends(buckets, days=DEFAULT_TREND_DAYS, now=None):
+    """Usage over the last few days.
+
+    Args:
+        buckets (callable): Called as buckets(granularity, since, until) for the rollup buckets of a range
+        days (int): Days to cover, today included
+        now (datetime, optional): End of the range (defaults to now)
+
+    Returns:
+        dict: "days", "daily" (per active day: requests, requests by agent type, error rate, average
+            latency), "requests", "error_rate" and "avg_latency_ms" over the range, and
+            "busiest_hours" ((hour of day, requests) tuples, busiest first)
+    """
+    return dict(summarize(buckets("day", *trend_range(days, now)),
+                          buckets("hour", *trend_range(min(days, HOURLY_RETENTION_DAYS), now))), days=days)
+
+
+def summarize(daily, hourly):
+    """Turn day and hour buckets into trends (see usage_trends)."""
+    def rates(bucket):
+        return {
+            "error_rate": bucket["errors"] / bucket["requests"] if bucket["requests"] else 0.0,
+            "avg_latency_ms": bucket["latency_ms"] / bucket["timed"] if bucket["timed"] else None,
+        }
+
+    total = empty_bucket()
+    days = []
+    for key, bucket in daily:
+        for field in ("requests", "errors", "latency_ms", "timed"):
+            total[field] += bucket[field]
+        days.append(dict(day=key, requests=bucket["requests"], by_agent=dict(bucket["agents"]), **rates(bucket)))
+
+    by_hour = {}
+    for key, bucket in hourly:
+        hour = int(key[KEY_LENGTH["day"] + 1:])
+        by_hour[hour] = by_hour.get(hour, 0) + bucket["requests"]
+    busiest = sorted(by_hour.items(), key=lambda item: (-item[1], item[0]))[:3]
+    return dict(daily=days, requests=total["requests"], busiest_hours=busiest, **rates(total))
@@ -0,0 +1,775 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import hashlib
+from datetime import datetime, timedelta
+from memory.archive import archive_from_env
+from memory.embeddings import merge_rankings, semantic_from_env
+from memory.file_lock import FileLock
+from memory.keyword_index import BM25_B, BM25_K1, bm25_idf, bm25_query_norm
+from memory.memory_manager import COMMON_WORDS, MemoryManager, extract_keywords, logger
+from memory.near_duplicates import as_fold, band_keys, is_near_duplicate, merge_fold, shingles, \
+    threshold_from_env
+from memory.retention import RetentionPolicy
+from memory.rollups import DAILY_RETENTION_DAYS, DEFAULT_TREND_DAYS, HOURLY_RETENTION_DAYS, KEY_FORMAT, KEY_LENGTH, \
+    empty_bucket, trend_range, usage_of, usage_trends
+from memory.stores import JsonMemoryStore, JsonlMemoryStore
+from utils import metrics, tracing
+
+# How long a write waits for another process's transaction before giving up
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_input TEXT NOT NULL,
+    agent_response TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    agent_type TEXT,
+    result_status TEXT,
+    keyword_count INTEGER NOT NULL DEFAULT 0,
+    repeat_count INTEGER NOT NULL DEFAULT 1,
+    last_seen TEXT,
+    variants TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_agent_type ON interactions (agent_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_status ON interactions (result_status, timestamp);
+
+CREATE TABLE IF NOT EXISTS keyword_postings (
+    keyword TEXT NOT NULL,
+    interaction_rowid INTEGER NOT NULL,
+    tf INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (keyword, interaction_rowid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS interaction_bands (
+    band INTEGER NOT NULL,
+    interaction_rowid INTEGER NOT NULL,
+    PRIMARY KEY (band, interaction_rowid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS patterns (
+    keyword TEXT PRIMARY KEY,
+    frequency INTEGER NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_patterns_frequency ON patterns (frequency DESC);
+
+CREATE TABLE IF NOT EXISTS pattern_examples (
+    keyword TEXT NOT NULL,
+    input TEXT NOT NULL,
+    response_status TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pattern_examples_keyword ON pattern_examples (keyword);
+
+CREATE TABLE IF NOT EXISTS preferences (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    agent_type TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL NOT NULL DEFAULT 0,
+    timed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, agent_type)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Examples kept per pattern, as in MemoryManager
+MAX_PATTERN_EXAMPLES = 5
+
+
+class SQLiteMemoryManager(MemoryManager):
+    """MemoryManager backed by a SQLite database instead of an in-memory copy of every interaction.
+
+    Interactions, keyword postings, patterns and preferences live in indexed tables, so memory
+    use stays flat as history grows and interactions can be queried by time, agent type and status.
+    """
+
+    def __init__(self, memory_type="system", db_path=None, retention=None):
+        """Initialize the memory manager.
+
+        Args:
+            memory_type (str): Type of memory to manage (system, calendar, todo)
+            db_path (str, optional): Database file (defaults to memory/memory_<type>.sqlite3)
+            retention (RetentionPolicy, optional): What to keep (defaults to the MEMORY_* environment settings)
+        """
+        memory_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory")
+        os.makedirs(memory_dir, exist_ok=True)
+
+        self.memory_type = memory_type
+        self.memory_dir = memory_dir
+        self.memory_file = db_path or os.path.join(memory_dir, f"memory_{memory_type}.sqlite3")
+        self.retention = retention or RetentionPolicy.from_env()
+        self.dedup_threshold = threshold_from_env()
+        self.archive = archive_from_env(os.path.join(memory_dir, f"memory_{memory_type}"), self._extract_keywords)
+        # Embeddings of user inputs are kept in RAM (MEMORY_SEMANTIC=1) and caught up by rowid before each lookup
+        self._semantic = semantic_from_env(COMMON_WORDS)
+        self._semantic_rowid = 0
+        self._lock = threading.RLock()
+
+        # Several processes may share the database: wait for each other's writes instead of failing,
+        # and take the write lock when a transaction starts so read-then-write updates can't deadlock
+        self._conn = sqlite3.connect(self.memory_file, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False,
+                                     isolation_level="IMMEDIATE")
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        # One process at a time upgrades the schema and imports older memory files
+        setup_lock = FileLock(f"{self.memory_file}.lock")
+        with setup_lock:
+            upgrade_schema(self._conn)
+            if self._get_meta("migrated_from") is None:
+                self._migrate_existing_memory()
+            if self._get_meta("rollups_built") is None:
+                self._build_rollups()
+        setup_lock.close()
+        with self._conn:
+            prune_rollups(self._conn, datetime.now())
+
+        self._load_statistics()
+
+        if self.retention.is_due(self._statistics()[0], self._count_patterns()) \
+                or self.retention.ttl_days or self.retention.pattern_ttl_days:
+            self.enforce_retention()
+
+    def _load_statistics(self):
+        """Recompute the collection statistics BM25 needs into the meta table.
+
+        add_interaction keeps them up to date in the same transaction as the insert, so every
+        process sharing the database sees the same numbers.
+        """
+        with self._conn:
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(keyword_count), 0) FROM interactions").fetchone()
+            self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                   [("document_count", row[0]), ("total_length", row[1])])
+
+    def _statistics(self):
+        """(number of interactions, total keywords over all interactions)."""
+        rows = dict(self._conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('document_count', 'total_length')").fetchall())
+        return int(rows.get("document_count", 0)), int(rows.get("total_length", 0))
+
+    def _count_patterns(self):
+        return self._conn.execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _migrate_existing_memory(self):
+        """One-time import of this memory type's JSONL log or JSON file, if either exists."""
+        base_path = os.path.join(self.memory_dir, f"memory_{self.memory_type}")
+        legacy_file = f"{base_path}.json"
+
+        if os.path.exists(f"{base_path}.jsonl"):
+            source = JsonlMemoryStore(base_path)
+        elif os.path.exists(legacy_file):
+            source = JsonMemoryStore(legacy_file)
+        else:
+            source = None
+
+        if source is None:
+            migrated_from = "none"
+        else:
+            memories, _ = source.load()
+            source.close()
+            migrated_from = getattr(source, "log_file", legacy_file)
+            import_memories(self._conn, memories)
+
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (migrated_from,))
+
+    def _build_rollups(self):
+        """Roll up the interactions stored before usage rollups existed (or just imported)."""
+        with self._conn:
+            for row in self._conn.execute("SELECT * FROM interactions").fetchall():
+                usage = usage_of(row_to_interaction(row), self.memory_type)
+                if usage is not None:
+                    record_usage(self._conn, usage, row["repeat_count"])
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollups_built', ?)",
+                               (datetime.now().isoformat(),))
+
+    def _record_write(self, operation, start):
+        """Record the duration of a write and the database size."""
+        metrics.registry.histogram("memory_save_duration_ms", "Memory write latency in milliseconds",
+                                   memory_type=self.memory_type, operation=operation).observe((time.perf_counter() - start) * 1000)
+        metrics.registry.gauge("memory_file_bytes", "Size of the memory files on disk",
+                               memory_type=self.memory_type).set(self.size())
+
+    def size(self):
+        """Bytes the database (including its WAL) occupies on disk."""
+        return sum(os.path.getsize(path) for path in (self.memory_file, f"{self.memory_file}-wal")
+                   if os.path.exists(path))
+
+    def add_interaction(self, user_input, agent_response, metadata=None):
+        """Add a new interaction to memory.
+
+        Args:
+            user_input (str): The user's input
+            agent_response (dict): The agent's response
+            metadata (dict, optional): Additional metadata about the interaction
+        """
+        now = datetime.now().isoformat()
+        interaction = {
+            "id": hashlib.md5(f"{user_input}_{now}".encode()).hexdigest(),
+            "timestamp": now,
+            "user_input": user_input,
+            "agent_response": agent_response,
+            "metadata": metadata or {}
+        }
+
+        with self._lock, tracing.span("memory.append", memory_type=self.memory_type) as span:
+            start = time.perf_counter()
+            with self._conn:
+                # Looked up inside the write transaction, so two processes can't both miss the same duplicate
+                # or fold into the same record at once (a plain SELECT wouldn't start the transaction)
+                self._conn.execute("BEGIN IMMEDIATE")
+                duplicate = self._find_near_duplicate(user_input) if self.dedup_threshold else None
+                span.set_attribute("folded", duplicate is not None)
+                if duplicate is not None:
+                    canonical = row_to_interaction(duplicate)
+                    merge_fold(canonical, as_fold(interaction))
+                    self._conn.execute(
+                        "UPDATE interactions SET repeat_count = ?, last_seen = ?, variants = ?, agent_response = ?, "
+                        "metadata = ?, agent_type = ?, result_status = ? WHERE rowid = ?",
+                        (canonical["count"], canonical["last_seen"], json.dumps(canonical["variants"]),
+                         *interaction_columns(canonical), duplicate["rowid"]))
+                else:
+                    keyword_count = insert_interaction(self._conn, interaction)
+                    self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'document_count'")
+                    self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_length'", (keyword_count,))
+                self._update_patterns(user_input, agent_response, timestamp=now)
+                usage = usage_of(interaction, self.memory_type)
+                if usage is not None:
+                    record_usage(self._conn, usage)
+            self._record_write("fold" if duplicate is not None else "append", start)
+
+            if self.retention.is_due(self._statistics()[0], self._count_patterns()):
+                self.enforce_retention()
+
+    def _find_near_duplicate(self, user_input):
+        """The stored interaction a command is a near-duplicate of, found through its LSH bands.
+
+        Returns:
+            sqlite3.Row: The most similar interaction (the newest on ties), or None
+        """
+        shingle_set = shingles(user_input, COMMON_WORDS)
+        keys = band_keys(shingle_set)
+        rows = self._conn.execute(
+            f"SELECT DISTINCT i.* FROM interaction_bands b JOIN interactions i ON i.rowid = b.interaction_rowid "
+            f"WHERE b.band IN ({','.join('?' * len(keys))})", keys).fetchall()
+
+        best, best_similarity = None, 0.0
+        for row in rows:
+            other = shingles(row["user_input"], COMMON_WORDS)
+            if not is_near_duplicate(shingle_set, other, self.dedup_threshold):
+                continue
+            similarity = len(shingle_set & other) / len(shingle_set | other)
+            if similarity > best_similarity or similarity == best_similarity and row["rowid"] > best["rowid"]:
+                best, best_similarity = row, similarity
+        return best
+
+    def enforce_retention(self):
+        """Delete interactions and patterns the retention policy doesn't keep and vacuum the database.
+
+        Thinned-out interactions are moved to the archive; expired ones are dropped.
+
+        Returns:
+            dict: How many interactions and patterns were removed, how many of those interactions
+                were archived and how many bytes were reclaimed
+        """
+        with self._lock:
+            size_before = self.size()
+            removed = []
+            archived = []
+            with self._conn:
+                cutoff = self.retention.interaction_cutoff()
+                if cutoff is not None:
+                    removed += self._conn.execute("SELECT * FROM interactions WHERE COALESCE(last_seen, timestamp) < ?",
+                                                  (cutoff.isoformat(),)).fetchall()
+                    self._delete_interactions(removed)
+                    if self.archive is not None:
+                        self.archive.expire(cutoff)
+
+                count = self._conn.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+                if self.retention.max_interactions and count > self.retention.max_interactions:
+                    old_count = count - (self.retention.max_interactions - self.retention.reservoir_size)
+                    old = self._conn.execute(
+                        "SELECT * FROM interactions ORDER BY COALESCE(last_seen, timestamp), rowid LIMIT ?",
+                        (old_count,)).fetchall()
+                    kept = {row["rowid"] for row in self.retention.downsample(old)}
+                    thinned = [row for row in old if row["rowid"] not in kept]
+                    if self.archive is not None:
+                        # Archived before the delete commits, so a failure keeps them in the database
+                        archived = [row_to_interaction(row) for row in thinned]
+                        self.archive.add(archived)
+                    self._delete_interactions(thinned)
+                    removed += thinned
+
+                patterns_before = self._count_patterns()
+                pattern_cutoff = self.retention.pattern_cutoff()
+                if pattern_cutoff is not None:
+                    self._conn.execute("DELETE FROM patterns WHERE last_seen < ?", (pattern_cutoff.isoformat(),))
+                if self.retention.max_patterns:
+                    self._conn.execute(
+                        "DELETE FROM patterns WHERE keyword NOT IN "
+                        "(SELECT keyword FROM patterns ORDER BY frequency DESC, last_seen DESC LIMIT ?)",
+                        (self.retention.max_patterns,))
+                patterns_removed = patterns_before - self._count_patterns()
+                prune_rollups(self._conn, datetime.now())
+                if patterns_removed:
+                    self._conn.execute("DELETE FROM pattern_examples WHERE keyword NOT IN (SELECT keyword FROM patterns)")
+
+            report = {"interactions_removed": len(removed), "interactions_archived": len(archived),
+                      "patterns_removed": patterns_removed, "bytes_reclaimed": 0}
+            if not removed and not patterns_removed:
+                return report
+
+            self._load_statistics()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+            report["bytes_reclaimed"] = max(0, size_before - self.size())
+
+        for kind in ("interactions", "patterns"):
+            metrics.registry.counter("memory_evictions_total", "Memory entries removed by the retention policy",
+                                     memory_type=self.memory_type, kind=kind).inc(report[f"{kind}_removed"])
+        logger.info(
+            f"Retention removed {report['interactions_removed']} interactions ({report['interactions_archived']} "
+            f"archived) and {report['patterns_removed']} patterns from {self.memory_type} memory, "
+            f"reclaiming {report['bytes_reclaimed']} bytes")
+        return report
+
+    def _delete_interactions(self, rows):
+        """Delete interactions and their keyword postings (caller commits).
+
+        Args:
+            rows (list): Rows of the interactions to delete
+        """
+        self._conn.executemany("DELETE FROM keyword_postings WHERE keyword = ? AND interaction_rowid = ?",
+                               [(keyword, row["rowid"]) for row in rows
+                                for keyword in set(extract_keywords(row["user_input"]))])
+        self._conn.executemany("DELETE FROM interaction_bands WHERE band = ? AND interaction_rowid = ?",
+                               [(band, row["rowid"]) for row in rows
+                                for band in band_keys(shingles(row["user_input"], COMMON_WORDS))])
+        self._conn.executemany("DELETE FROM interactions WHERE rowid = ?", [(row["rowid"],) for row in rows])
+        if self._semantic is not None:
+            for row in rows:
+                self._semantic.remove(row["rowid"])
+            # SQLite reuses the rowids of deleted trailing rows
+            self._semantic_rowid = min(self._semantic_rowid, self._conn.execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM interactions").fetchone()[0])
+
+    def _update_patterns(self, user_input, agent_response, timestamp=None):
+        """Update pattern frequencies and examples (caller commits)."""
+        timestamp = timestamp or datetime.now().isoformat()
+        status = agent_response.get("status", "unknown") if isinstance(agent_response, dict) else "unknown"
+        for keyword in self._extract_keywords(user_input):
+            self._conn.execute(
+                "INSERT INTO patterns (keyword, frequency, last_seen) VALUES (?, 1, ?) "
+                "ON CONFLICT (keyword) DO UPDATE SET frequency = frequency + 1, last_seen = excluded.last_seen",
+                (keyword, timestamp))
+            self._conn.execute(
+                "INSERT INTO pattern_examples (keyword, input, response_status, timestamp) "
+                "SELECT ?, ?, ?, ? WHERE (SELECT COUNT(*) FROM pattern_examples WHERE keyword = ?) < ?",
+                (keyword, user_input, status, timestamp, keyword, MAX_PATTERN_EXAMPLES))
+
+    @tracing.traced("memory.get_relevant_memories")
+    def get_relevant_memories(self, user_input, limit=5):
+        """Get memories relevant to the current user input.
+
+        Args:
+            user_input (str): The user's current input
+            limit (int): Maximum number of memories to return
+
+        Returns:
+            list: List of relevant past interactions
+        """
+        keywords = self._extract_keywords(user_input)
+        query_counts = {}
+        for keyword in keywords:
+            query_counts[keyword] = query_counts.get(keyword, 0) + 1
+
+        with self._lock:
+            rows = {row["rowid"]: row for row in self._bm25_rows(query_counts, limit)}
+            matches = [(rowid, row["score"]) for rowid, row in rows.items()]
+            if self._semantic is not None:
+                self._sync_semantic()
+                matches = merge_rankings(matches, self._semantic.search(user_input, limit), limit)
+                missing = [rowid for rowid, _ in matches if rowid not in rows]
+                if missing:
+                    rows.update((row["rowid"], row) for row in self._conn.execute(
+                        f"SELECT * FROM interactions WHERE rowid IN ({','.join('?' * len(missing))})", missing))
+                for rowid in missing:
+                    # Deleted by another process since it was embedded
+                    if rowid not in rows:
+                        self._semantic.remove(rowid)
+        memories = [dict(row_to_interaction(rows[rowid]), similarity_score=score)
+                    for rowid, score in matches if rowid in rows]
+        return self._with_archived(memories, keywords, limit)
+
+    def _bm25_rows(self, query_counts, limit):
+        """Interaction rows ranked by BM25 against the query keywords (caller holds the lock).
+
+        Args:
+            query_counts (dict): Query keyword -> occurrences in the query
+            limit (int): Maximum number of rows
+
+        Returns:
+            list: Dicts of the rows' columns, best first, with "score" normalized to [0, 1]
+        """
+        if not query_counts:
+            return []
+        document_count, total_length = self._statistics()
+        if not document_count:
+            return []
+        placeholders = ",".join("?" * len(query_counts))
+        frequencies = dict(self._conn.execute(
+            f"SELECT keyword, COUNT(*) FROM keyword_postings WHERE keyword IN ({placeholders}) GROUP BY keyword",
+            tuple(query_counts)).fetchall())
+        idfs = {keyword: bm25_idf(frequencies.get(keyword, 0), document_count) for keyword in query_counts}
+        average_length = total_length / document_count or 1.0
+        norm = bm25_query_norm(query_counts, idfs, average_length)
+
+        # Score in the database: the query's idf values are joined in as a VALUES table
+        rows = self._conn.execute(
+            f"WITH query (keyword, idf) AS (VALUES {', '.join(['(?, ?)'] * len(idfs))}) "
+            f"SELECT i.*, SUM(q.idf * p.tf * {BM25_K1 + 1} / "
+            f"(p.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * i.keyword_count / ?))) AS score "
+            f"FROM query q JOIN keyword_postings p ON p.keyword = q.keyword "
+            f"JOIN interactions i ON i.rowid = p.interaction_rowid "
+            f"GROUP BY p.interaction_rowid ORDER BY score DESC, p.interaction_rowid ASC LIMIT ?",
+            (*[value for item in idfs.items() for value in item], average_length, limit)).fetchall()
+        return [dict(row, score=min(1.0, row["score"] / norm)) for row in rows]
+
+    def _sync_semantic(self):
+        """Embed the interactions added since the last lookup, by this process or another (caller holds the lock)."""
+        rows = self._conn.execute("SELECT rowid, user_input FROM interactions WHERE rowid > ? ORDER BY rowid",
+                                  (self._semantic_rowid,)).fetchall()
+        for row in rows:
+            self._semantic.add(row["rowid"], row["user_input"])
+        if rows:
+            self._semantic_rowid = rows[-1]["rowid"]
+
+    def query_interactions(self, agent_type=None, result_status=None, since=None, until=None, limit=100):
+        """Find interactions by agent type, result status and time range, newest first.
+
+        Args:
+            agent_type (str, optional): Only interactions routed to this agent type
+            result_status (str, optional): Only interactions with this result status
+            since (datetime or str, optional): Only interactions at or after this time
+            until (datetime or str, optional): Only interactions before this time
+            limit (int): Maximum number of interactions to return
+
+        Returns:
+            list: List of interactions
+        """
+        clauses, params = [], []
+        if agent_type is not None:
+            clauses.append("agent_type = ?")
+            params.append(agent_type)
+        if result_status is not None:
+            clauses.append("result_status = ?")
+            params.append(result_status)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since.isoformat() if isinstance(since, datetime) else since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until.isoformat() if isinstance(until, datetime) else until)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM interactions {where}ORDER BY timestamp DESC LIMIT ?",
+                                      (*params, limit)).fetchall()
+        return [row_to_interaction(row) for row in rows]
+
+    def update_preference(self, preference_key, preference_value):
+        """Update a user preference.
+
+        Args:
+            preference_key (str): The preference identifier
+            preference_value: The preference value
+        """
+        with self._lock, tracing.span("memory.set_preference", memory_type=self.memory_type):
+            start = time.perf_counter()
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO preferences (key, value, updated_at) VALUES (?, ?, ?)",
+                                   (preference_key, json.dumps(preference_value), datetime.now().isoformat()))
+            self._record_write("set_preference", start)
+
+    def get_preference(self, preference_key, default=None):
+        """Get a user preference.
+
+        Args:
+            preference_key (str): The preference identifier
+            default: Default value if preference doesn't exist
+
+        Returns:
+            The preference value or default
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM preferences WHERE key = ?", (preference_key,)).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    def get_preferences(self):
+        """Get all preferences in the {key: {"value", "updated_at"}} form MemoryManager uses."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM preferences ORDER BY key").fetchall()
+        return {row["key"]: {"value": json.loads(row["value"]), "updated_at": row["updated_at"]} for row in rows}
+
+    def get_common_patterns(self, limit=10):
+        """Get the most common usage patterns.
+
+        Args:
+            limit (int): Maximum number of patterns to return
+
+        Returns:
+            list: List of (pattern, frequency) tuples
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT keyword, frequency FROM patterns ORDER BY frequency DESC LIMIT ?",
+                                      (limit,)).fetchall()
+        return [(row["keyword"], row["frequency"]) for row in rows]
+
+    def count_interactions(self):
+        """Number of interactions, repeats of a command included."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(repeat_count), 0) FROM interactions").fetchone()[0]
+
+    def get_usage(self, granularity="day", since=None, until=None):
+        """Get usage rollups over a time range.
+
+        Args:
+            granularity (str): "hour" or "day"
+            since (datetime, optional): Start of the range (defaults to the start of the day a week ago)
+            until (datetime, optional): End of the range (defaults to now)
+
+        Returns:
+            list: (bucket key, bucket) tuples, oldest first, as in MemoryManager.get_usage
+        """
+        default_since, default_until = trend_range(DEFAULT_TREND_DAYS)
+        since, until = since or default_since, until or default_until
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket, agent_type, requests, errors, latency_ms, timed FROM usage_rollups "
+                "WHERE granularity = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (granularity, since.strftime(KEY_FORMAT[granularity]), until.strftime(KEY_FORMAT[granularity]))).fetchall()
+        buckets = {}
+        for row in rows:
+            bucket = buckets.setdefault(row["bucket"], empty_bucket())
+            for field in ("requests", "errors", "latency_ms", "timed"):
+                bucket[field] += row[field]
+            bucket["agents"][row["agent_type"]] = row["requests"]
+        return list(buckets.items())
+
+    def generate_insights(self):
+        """Generate insights about user behavior based on stored memories.
+
+        Returns:
+            dict: Dictionary of insights
+        """
+        return {
+            "total_interactions": self.count_interactions(),
+            "common_patterns": self.get_common_patterns(5),
+            "pattern_counts_exact": True,
+            "archived_interactions": self.archive.count() if self.archive is not None else 0,
+            "preferences": self.get_preferences(),
+            "trends": usage_trends(self.get_usage),
+        }
+
+    def _save_memories(self):
+        """Every write is committed as it happens; checkpoint the WAL into the database file."""
+        self.flush()
+
+    def flush(self):
+        """Checkpoint the write-ahead log."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+def insert_interaction(conn, interaction):
+    """Insert an interaction and its keyword postings (caller commits).
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        interaction (dict): Interaction record as stored by MemoryManager
+
+    Returns:
+        int: Number of keywords in the interaction's input
+    """
+    keywords = extract_keywords(interaction["user_input"])
+    variants = interaction.get("variants")
+    cursor = conn.execute(
+        "INSERT INTO interactions (id, timestamp, user_input, agent_response, metadata, agent_type, result_status, "
+        "keyword_count, repeat_count, last_seen, variants) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (interaction["id"], interaction["timestamp"], interaction["user_input"], *interaction_columns(interaction),
+         len(keywords), interaction.get("count", 1), interaction.get("last_seen"),
+         json.dumps(variants) if variants else None))
+    conn.executemany("INSERT OR IGNORE INTO keyword_postings (keyword, interaction_rowid, tf) VALUES (?, ?, ?)",
+                     [(keyword, cursor.lastrowid, keywords.count(keyword)) for keyword in set(keywords)])
+    insert_bands(conn, cursor.lastrowid, interaction["user_input"])
+    return len(keywords)
+
+
+def interaction_columns(interaction):
+    """(agent_response JSON, metadata JSON, agent_type, result_status) columns of an interaction."""
+    metadata = interaction.get("metadata") or {}
+    agent_response = interaction.get("agent_response") or {}
+    result_status = metadata.get("result_status")
+    if result_status is None and isinstance(agent_response, dict):
+        result_status = agent_response.get("status")
+    return json.dumps(agent_response), json.dumps(metadata), metadata.get("agent_type"), result_status
+
+
+def insert_bands(conn, rowid, user_input):
+    """Index an interaction's MinHash LSH bands for near-duplicate lookups (caller commits)."""
+    conn.executemany("INSERT OR IGNORE INTO interaction_bands (band, interaction_rowid) VALUES (?, ?)",
+                     [(band, rowid) for band in band_keys(shingles(user_input, COMMON_WORDS))])
+
+
+def record_usage(conn, usage, count=1):
+    """Count requests in the hourly and daily usage rollups (caller commits).
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        usage (tuple): (timestamp, agent type, status, duration in ms or None), as returned by usage_of
+        count (int): Number of identical requests
+    """
+    timestamp, agent_type, status, duration_ms = usage
+    if not timestamp:
+        return
+    conn.executemany(
+        "INSERT INTO usage_rollups (granularity, bucket, agent_type, requests, errors, latency_ms, timed) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (granularity, bucket, agent_type) DO UPDATE SET "
+        "requests = requests + excluded.requests, errors = errors + excluded.errors, "
+        "latency_ms = latency_ms + excluded.latency_ms, timed = timed + excluded.timed",
+        [(granularity, timestamp[:length], agent_type, count, count if status == "error" else 0,
+          (duration_ms or 0.0) * count, count if duration_ms is not None else 0)
+         for granularity, length in KEY_LENGTH.items()])
+
+
+def prune_rollups(conn, now):
+    """Delete rollup buckets older than their retention (caller commits)."""
+    for granularity, days in (("hour", HOURLY_RETENTION_DAYS), ("day", DAILY_RETENTION_DAYS)):
+        conn.execute("DELETE FROM usage_rollups WHERE granularity = ? AND bucket < ?",
+                     (granularity, (now - timedelta(days=days)).strftime(KEY_FORMAT[granularity])))
+
+
+def upgrade_schema(conn):
+    """Add the BM25 and near-duplicate columns to databases created before they existed and backfill them.
+
+    Args:
+        conn (sqlite3.Connection): Database connection with the schema created
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(interactions)")}
+    if "keyword_count" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE interactions ADD COLUMN keyword_count INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE keyword_postings ADD COLUMN tf INTEGER NOT NULL DEFAULT 1")
+            for rowid, user_input in conn.execute("SELECT rowid, user_input FROM interactions").fetchall():
+                keywords = extract_keywords(user_input)
+                conn.execute("UPDATE interactions SET keyword_count = ? WHERE rowid = ?", (len(keywords), rowid))
+                conn.executemany("UPDATE keyword_postings SET tf = ? WHERE keyword = ? AND interaction_rowid = ?",
+                                 [(keywords.count(keyword), keyword, rowid) for keyword in set(keywords)])
+
+    if "repeat_count" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE interactions ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 1")
+            conn.execute("ALTER TABLE interactions ADD COLUMN last_seen TEXT")
+            conn.execute("ALTER TABLE interactions ADD COLUMN variants TEXT")
+            for rowid, user_input in conn.execute("SELECT rowid, user_input FROM interactions").fetchall():
+                insert_bands(conn, rowid, user_input)
+
+
+def import_memories(conn, memories):
+    """Copy a MemoryManager memories dict (interactions, patterns, preferences) into the database.
+
+    Args:
+        conn (sqlite3.Connection): Database connection with the schema created
+        memories (dict): Memories as loaded by a JSON or JSONL store
+    """
+    with conn:
+        for interaction in memories.get("interactions", []):
+            insert_interaction(conn, interaction)
+        for keyword, pattern in memories.get("patterns", {}).items():
+            conn.execute("INSERT OR REPLACE INTO patterns (keyword, frequency, last_seen) VALUES (?, ?, ?)",
+                         (keyword, pattern.get("frequency", 0), pattern.get("last_seen", "")))
+            conn.executemany("INSERT INTO pattern_examples (keyword, input, response_status, timestamp) VALUES (?, ?, ?, ?)",
+                             [(keyword, example.get("input", ""), example.get("response_status"), example.get("timestamp", ""))
+                              for example in pattern.get("examples", [])[:MAX_PATTERN_EXAMPLES]])
+        for key, record in memories.get("preferences", {}).items():
+            conn.execute("INSERT OR REPLACE INTO preferences (key, value, updated_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(record.get("value")), record.get("updated_at", "")))
+
+
+def row_to_interaction(row):
+    """Convert an interactions row back into MemoryManager's interaction dict."""
+    interaction = {
+        "id": row["id"],
+        "timestamp": row["timestamp"],
+        "user_input": row["user_input"],
+        "agent_response": json.loads(row["agent_response"]),
+        "metadata": json.loads(row["metadata"]),
+    }
+    if row["repeat_count"] > 1:
+        interaction["count"] = row["repeat_count"]
+        interaction["last_seen"] = row["last_seen"]
+        interaction["variants"] = json.loads(row["variants"])
+    return interaction
+
+
+def migrate_json_to_sqlite(json_file, db_path):
+    """Migrate a memory_<type>.json file into a new SQLite database.
+
+    Args:
+        json_file (str): Path of the JSON memory file
+        db_path (str): Path of the database to create
+
+    Returns:
+        int: Number of interactions migrated
+    """
+    memories, _ = JsonMemoryStore(json_file).load()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        import_memories(conn, memories)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (json_file,))
+    finally:
+        conn.close()
+    return len(memories.get("interactions", []))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m memory.sqlite_memory <memory_type.json> <memory_type.sqlite3>")
+        sys.exit(1)
+    print(f"Migrated {migrate_json_to_sqlite(sys.argv[1], sys.argv[2])} interactions.")
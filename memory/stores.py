@@ -0,0 +1,677 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from memory.file_lock import FileLock, file_signature
+from memory.near_duplicates import copy_interaction, fold_difference, fold_replay, interaction_replay, merge_fold, \
+    move_to_end
+
+
+def empty_memories():
+    """The structure every store loads into."""
+    return {"interactions": [], "patterns": {}, "preferences": {}, "rollups": {}}
+
+
+def derived_json(memories):
+    """The snapshot members for memories' derived state: its patterns and, once built, its rollups."""
+    derived = '"patterns": %s' % json.dumps(memories["patterns"])
+    if "rollups" in memories:
+        derived += ', "rollups": %s' % json.dumps(memories["rollups"])
+    return derived
+
+
+def apply_external_changes(interactions, preferences, memories, apply=None, folds=()):
+    """Merge interactions, repetitions and preference changes another process wrote into memories.
+
+    Preference records only win if they are newer than the one in memories.
+
+    Args:
+        interactions (list): Interactions memories doesn't have yet
+        preferences (dict): Preference records found on disk
+        memories (dict): Memories to merge into
+        apply (callable, optional): Called as apply(interactions, preferences, folds) to do the merge
+            (MemoryManager uses this to keep its index and patterns up to date)
+        folds (list): (interaction id, fold) pairs of near-duplicates folded into existing interactions
+    """
+    preferences = {key: record for key, record in preferences.items()
+                   if record.get("updated_at", "") > memories["preferences"].get(key, {}).get("updated_at", "")}
+    if not interactions and not preferences and not folds:
+        return
+    if apply is not None:
+        apply(interactions, preferences, folds)
+        return
+    memories["interactions"].extend(interactions)
+    memories["preferences"].update(preferences)
+    by_id = {interaction.get("id"): interaction for interaction in memories["interactions"]}
+    for interaction_id, fold in folds:
+        if interaction_id in by_id:
+            merge_fold(by_id[interaction_id], fold)
+            move_to_end(memories["interactions"], by_id[interaction_id])
+
+
+def read_records(path, start=0):
+    """Read JSON Lines records from a byte offset, skipping corrupt lines.
+
+    A last line without a newline is a record still being written (or torn by a crash)
+    and is not consumed.
+
+    Args:
+        path (str): Log file
+        start (int): Byte offset to start at
+
+    Returns:
+        tuple: (records, byte offset just past the last complete line)
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:end].splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:  # JSONDecodeError, or UnicodeDecodeError for garbage bytes
+            print(f"Skipping corrupt record in {path}")
+    return records, start + end
+
+
+def temp_path(path):
+    """Temp file to write path's new contents to; unique per process so processes never share one."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def write_atomically(path, data):
+    """Replace a file's contents so that readers and crashes see either the old or the new version.
+
+    Args:
+        path (str): File to write
+        data (str or bytes): New contents
+    """
+    tmp_path = temp_path(path)
+    with (open(tmp_path, 'wb') if isinstance(data, bytes) else open(tmp_path, 'w', encoding='utf-8')) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonMemoryStore:
+    """Original layout: the whole memory rewritten as one pretty-printed JSON file on every change.
+
+    Several processes may share the file: saves hold an advisory lock on memory_<type>.json.lock
+    and first merge whatever other processes saved since this one last read the file, so
+    concurrent writers add up instead of overwriting each other.
+    """
+    
+    # Any number of pending changes can be persisted with a single save()
+    coalesce_writes = True
+
+    def __init__(self, memory_file):
+        """Initialize the store.
+
+        Args:
+            memory_file (str): Path of the memory_<type>.json file
+        """
+        self.memory_file = memory_file
+        self.lock = threading.RLock()
+        self.on_external_changes = None
+        self._file_lock = FileLock(f"{memory_file}.lock")
+        self._signature = None
+        self._disk_ids = set()
+        self._disk_counts = {}
+
+    def load(self):
+        """Load memories.
+
+        Returns:
+            tuple: (memories dict, list of interactions whose patterns still need to be applied)
+        """
+        with self.lock, self._file_lock:
+            memories = self._read()
+            self._signature = file_signature(self.memory_file)
+            self._remember_disk_state(memories["interactions"])
+            return memories, []
+
+    def _remember_disk_state(self, interactions):
+        """Note which interactions the file holds, and how often each was repeated."""
+        self._disk_ids = {interaction.get("id") for interaction in interactions}
+        self._disk_counts = {interaction.get("id"): interaction.get("count", 1) for interaction in interactions
+                             if interaction.get("count", 1) > 1}
+
+    def _read(self):
+        """Read the memory file."""
+        if os.path.exists(self.memory_file):
+            try:
+                with open(self.memory_file, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                print(f"Error loading memory file. Creating new memory.")
+        return empty_memories()
+
+    def _merge_from_disk(self, memories):
+        """Merge what other processes saved since this one last read or wrote the file (caller holds both locks)."""
+        signature = file_signature(self.memory_file)
+        if signature is None or signature == self._signature:
+            return
+        disk = self._read()
+        self._signature = signature
+        # Only interactions that appeared on disk since then are new; ones this process dropped stay dropped
+        interactions = [interaction for interaction in disk["interactions"] if interaction.get("id") not in self._disk_ids]
+        # Known interactions whose count grew on disk were repeated in another process
+        local = {interaction.get("id"): interaction for interaction in memories["interactions"]}
+        folds = []
+        for interaction in disk["interactions"]:
+            interaction_id = interaction.get("id")
+            if interaction_id in self._disk_ids and interaction_id in local:
+                fold = fold_difference(local[interaction_id], interaction, self._disk_counts.get(interaction_id, 1))
+                if fold is not None:
+                    folds.append((interaction_id, fold))
+        self._remember_disk_state(disk["interactions"])
+        apply_external_changes(interactions, disk.get("preferences", {}), memories, self.on_external_changes, folds)
+
+    def poll(self, memories):
+        """Merge changes other processes saved, if the file changed since this one last looked."""
+        with self.lock:
+            if file_signature(self.memory_file) == self._signature:
+                return
+            with self._file_lock:
+                self._merge_from_disk(memories)
+
+    def append_interaction(self, interaction, memories):
+        """Persist a newly added interaction (already appended to memories)."""
+        return self.save(memories)
+
+    def fold_interaction(self, interaction_id, fold, memories):
+        """Persist a near-duplicate folded into an existing interaction (already applied to memories)."""
+        return self.save(memories)
+
+    def set_preference(self, key, record, memories):
+        """Persist a preference change (already applied to memories)."""
+        return self.save(memories)
+
+    def save(self, memories):
+        """Merge other processes' changes, then write all memories to a temp file and rename it over the memory file.
+
+        The file lock is held until the new file is in place; the thread lock only while merging
+        and serializing, so memory stays usable while the file is written.
+
+        Returns:
+            int: Bytes written
+        """
+        with self.lock:
+            self._file_lock.acquire()
+            try:
+                self._merge_from_disk(memories)
+                data = json.dumps(memories, indent=2)
+                self._remember_disk_state(memories["interactions"])
+            except BaseException:
+                self._file_lock.release()
+                raise
+        try:
+            write_atomically(self.memory_file, data)
+            self._signature = file_signature(self.memory_file)
+        finally:
+            self._file_lock.release()
+        return len(data)
+
+    def maybe_compact(self):
+        """Nothing to compact in this layout."""
+
+    def size(self):
+        """Bytes the store currently occupies on disk."""
+        return os.path.getsize(self.memory_file) if os.path.exists(self.memory_file) else 0
+
+    def flush(self):
+        """Make sure everything written so far is on disk."""
+
+    def close(self):
+        """Flush and release resources."""
+        self._file_lock.close()
+
+
+class JsonlMemoryStore:
+    """Log-structured layout: interactions and preference changes appended to a JSON Lines log.
+
+    memory_<type>.jsonl is the source of truth. Its first line is a header carrying a generation
+    number, followed by "pref", "add" and "fold" records (a near-duplicate folded into an earlier
+    interaction). memory_<type>.snapshot.json caches the derived
+    patterns table and usage rollups for a generation together with how many logged interactions it already covers,
+    so loading replays the snapshot plus only the tail of the log. Compaction rewrites the log
+    without superseded preference records and refreshes the snapshot; it runs in the background
+    once compact_every records have been appended.
+
+    Several processes may share the log. Appends and compactions hold an advisory lock on
+    memory_<type>.lock and first read whatever other processes appended since (or their
+    compacted log, if they replaced it), so every process sees every record.
+    """
+
+    # Each change is its own log record
+    coalesce_writes = False
+
+    def __init__(self, base_path, legacy_file=None, fsync_interval=1.0, compact_every=500):
+        """Initialize the store.
+
+        Args:
+            base_path (str): Path prefix, e.g. memory/memory_todo
+            legacy_file (str, optional): memory_<type>.json file to migrate from if no log exists
+            fsync_interval (float): Seconds between fsyncs of the log (0 syncs every record)
+            compact_every (int): Appended records after which a background compaction starts
+        """
+        self.log_file = f"{base_path}.jsonl"
+        self.snapshot_file = f"{base_path}.snapshot.json"
+        self.legacy_file = legacy_file
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.on_external_changes = None
+
+        self.generation = 0
+        self._file_lock = FileLock(f"{base_path}.lock")
+        self._log = None
+        self._identity = None
+        self._offset = 0
+        self._log_ids = set()
+        self._last_fsync = 0.0
+        self._appended = 0
+        self._compaction_due = False
+        self._compacting = False
+        self._compaction_thread = None
+        self._memories = None
+
+        atexit.register(self.close)
+
+    def load(self):
+        """Load memories from the snapshot and the log.
+
+        Returns:
+            tuple: (memories dict, list of interactions whose patterns still need to be applied)
+        """
+        with self.lock, self._file_lock:
+            if not os.path.exists(self.log_file):
+                memories = self._migrate_legacy()
+                self._memories = memories
+                self._log_ids = {interaction.get("id") for interaction in memories["interactions"]}
+                self._mark_read(os.path.getsize(self.log_file))
+                return memories, []
+
+            memories = empty_memories()
+            records, offset = read_records(self.log_file)
+            if offset < os.path.getsize(self.log_file):
+                # A crash left half a record at the end; drop it so new records start on a fresh line
+                with open(self.log_file, 'r+b') as f:
+                    f.truncate(offset)
+            header = records[0] if records and records[0].get("op") == "header" else {"generation": 0}
+            self.generation = header.get("generation", 0)
+
+            snapshot = self._read_snapshot()
+            applied = 0
+            if snapshot and snapshot.get("generation") == self.generation:
+                memories["patterns"] = snapshot.get("patterns", {})
+                if "rollups" in snapshot:
+                    memories["rollups"] = snapshot["rollups"]
+                else:
+                    # Written before rollups existed: MemoryManager rebuilds them from the interactions
+                    del memories["rollups"]
+                applied = snapshot.get("interactions_applied", 0)
+
+            replay = []
+            by_id = {}
+            fold_ids = set()
+            seen = 0
+            for record in records:
+                if record.get("op") == "add":
+                    interaction = record["interaction"]
+                    memories["interactions"].append(interaction)
+                    by_id[interaction.get("id")] = interaction
+                    seen += 1
+                    if seen > applied:
+                        # As logged: later fold records change the interaction in place
+                        replay.extend(interaction_replay(copy_interaction(interaction)))
+                elif record.get("op") == "fold":
+                    canonical = by_id.get(record["id"])
+                    if canonical is None:
+                        continue
+                    merge_fold(canonical, record["fold"])
+                    move_to_end(memories["interactions"], canonical)
+                    fold_ids.add(record["fold_id"])
+                    seen += 1
+                    if seen > applied:
+                        replay.extend(fold_replay(record["fold"]))
+                elif record.get("op") == "pref":
+                    memories["preferences"][record["key"]] = record["value"]
+
+            self._log_ids = set(by_id) | fold_ids
+            self._mark_read(offset)
+            self._open_log()
+            self._memories = memories
+            return memories, replay
+
+    def _mark_read(self, offset):
+        """Remember which log file this process has read, and up to where."""
+        self._identity = file_signature(self.log_file)[0]
+        self._offset = offset
+
+    def _catch_up(self):
+        """Merge records other processes appended, or their compacted log (caller holds both locks)."""
+        signature = file_signature(self.log_file)
+        if signature is None:
+            return
+        identity, size, _ = signature
+        if identity == self._identity:
+            if size == self._offset:
+                return
+            records, offset = read_records(self.log_file, self._offset)
+            interactions = [record["interaction"] for record in records if record.get("op") == "add"]
+            folds = [(record["id"], record["fold"]) for record in records if record.get("op") == "fold"]
+            self._log_ids.update(record["fold_id"] for record in records if record.get("op") == "fold")
+        else:
+            # Another process compacted and replaced the log; new interactions are the ones not seen before
+            records, offset = read_records(self.log_file)
+            header = records[0] if records and records[0].get("op") == "header" else {"generation": 0}
+            self.generation = header.get("generation", 0)
+            added = [record["interaction"] for record in records if record.get("op") == "add"]
+            interactions = [interaction for interaction in added if interaction.get("id") not in self._log_ids]
+            # Repetitions folded into known interactions show up as higher counts, or as fold records
+            # carried over after the compacted state
+            local = {interaction.get("id"): interaction for interaction in (self._memories or {}).get("interactions", [])}
+            folds = []
+            for interaction in added:
+                known = local.get(interaction.get("id"))
+                if known is not None and interaction.get("id") in self._log_ids:
+                    fold = fold_difference(known, interaction, known.get("count", 1))
+                    if fold is not None:
+                        folds.append((interaction.get("id"), fold))
+            new_folds = [record for record in records if record.get("op") == "fold" and record["fold_id"] not in self._log_ids]
+            folds += [(record["id"], record["fold"]) for record in new_folds]
+            self._log_ids = {interaction.get("id") for interaction in added}
+            self._log_ids.update(record["fold_id"] for record in records if record.get("op") == "fold")
+            self._close_log()
+        self._log_ids.update(interaction.get("id") for interaction in interactions)
+        self._mark_read(offset)
+
+        preferences = {record["key"]: record["value"] for record in records if record.get("op") == "pref"}
+        if self._memories is not None:
+            apply_external_changes(interactions, preferences, self._memories, self.on_external_changes, folds)
+
+    def poll(self, memories):
+        """Merge records other processes wrote, if the log changed since this process last looked."""
+        with self.lock:
+            self._memories = memories
+            signature = file_signature(self.log_file)
+            if signature is None or signature[:2] == (self._identity, self._offset):
+                return
+            with self._file_lock:
+                self._catch_up()
+
+    def _read_snapshot(self):
+        """Read the snapshot, or None if it is missing or unreadable."""
+        if not os.path.exists(self.snapshot_file):
+            return None
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def _migrate_legacy(self):
+        """Build the log from an existing memory_<type>.json file, if there is one."""
+        memories = empty_memories()
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, 'r') as f:
+                    memories = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                print(f"Error loading memory file. Creating new memory.")
+
+        self._write_generation(memories["interactions"], memories["preferences"],
+                               derived_json(memories), 1, install=True)
+        self._open_log()
+        return memories
+
+    def _open_log(self):
+        """Open the log for appending."""
+        if self._log is None:
+            self._log = open(self.log_file, 'a', encoding='utf-8')
+
+    def _append(self, record):
+        """Append one record to the log (caller holds the lock)."""
+        with self._file_lock:
+            self._catch_up()
+            self._open_log()
+            line = json.dumps(record) + "\n"
+            self._log.write(line)
+            self._log.flush()
+            self._offset = os.fstat(self._log.fileno()).st_size
+            if record.get("op") == "add":
+                self._log_ids.add(record["interaction"].get("id"))
+            elif record.get("op") == "fold":
+                self._log_ids.add(record["fold_id"])
+
+        now = time.monotonic()
+        if now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._log.fileno())
+            self._last_fsync = now
+
+        self._appended += 1
+        if self.compact_every and self._appended >= self.compact_every:
+            self._compaction_due = True
+        return len(line)
+
+    def append_interaction(self, interaction, memories):
+        """Append a newly added interaction to the log.
+
+        Returns:
+            int: Bytes written
+        """
+        with self.lock:
+            self._memories = memories
+            return self._append({"op": "add", "interaction": interaction})
+
+    def fold_interaction(self, interaction_id, fold, memories):
+        """Append a near-duplicate folded into an existing interaction to the log.
+
+        Returns:
+            int: Bytes written
+        """
+        with self.lock:
+            self._memories = memories
+            return self._append({"op": "fold", "id": interaction_id, "fold_id": uuid.uuid4().hex, "fold": fold})
+
+    def set_preference(self, key, record, memories):
+        """Append a preference change to the log.
+
+        Returns:
+            int: Bytes written
+        """
+        with self.lock:
+            self._memories = memories
+            return self._append({"op": "pref", "key": key, "value": record})
+
+    def save(self, memories):
+        """Write all memories by compacting synchronously.
+
+        Returns:
+            int: Bytes the store occupies afterwards
+        """
+        self._memories = memories
+        self.compact()
+        return self.size()
+
+    def maybe_compact(self):
+        """Start a background compaction if enough records were appended since the last one.
+
+        Called once the caller's memories and the log agree (no changes waiting to be logged),
+        since compaction captures the caller's memories as the new generation.
+        """
+        with self.lock:
+            if self._compaction_due:
+                self.compact_in_background()
+
+    def compact_in_background(self):
+        """Capture the current state and write it as a new generation on a background thread."""
+        with self.lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            state = self._capture_state()
+            if state is None:
+                return
+            self._appended = 0
+            self._compaction_due = False
+            self._compaction_thread = threading.Thread(target=self._write_compaction, args=(state,),
+                                                       name="memory-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    def compact(self):
+        """Rewrite the log and snapshot for the current state.
+
+        Only taking the copy and swapping files happen under the locks; writing the new
+        generation happens outside them, with records appended meanwhile carried over.
+        """
+        with self.lock:
+            state = self._capture_state()
+        if state is not None:
+            self._write_compaction(state)
+
+    def _capture_state(self):
+        """Copy the state to compact (caller holds the lock).
+
+        Returns:
+            tuple: (interactions, preferences, derived state JSON, generation, log identity, log offset),
+                or None if there is nothing to compact or a compaction is already running
+        """
+        if self._memories is None or self._compacting:
+            return None
+        with self._file_lock:
+            self._catch_up()
+            memories = self._memories
+            self._compacting = True
+            # Copies: folds change interactions in place, and repetitions logged after the capture
+            # are carried over as fold records, so they mustn't also show up in the captured counts
+            return ([copy_interaction(interaction) for interaction in memories["interactions"]],
+                    dict(memories["preferences"]),
+                    derived_json(memories), self.generation + 1, self._identity, self._offset)
+
+    def _write_compaction(self, state):
+        """Write a captured state as the next generation and swap it in."""
+        interactions, preferences, derived, generation, identity, offset = state
+        try:
+            log_tmp, snapshot_tmp = self._write_generation(interactions, preferences, derived,
+                                                           generation, install=False)
+            with self.lock, self._file_lock:
+                if file_signature(self.log_file)[0] != identity:
+                    # Another process compacted meanwhile, carrying this process's records over
+                    os.remove(log_tmp)
+                    os.remove(snapshot_tmp)
+                    return
+                # Carry over everything appended since the capture, by this process or others
+                self._catch_up()
+                with open(self.log_file, 'rb') as f:
+                    f.seek(offset)
+                    tail = f.read(self._offset - offset)
+                with open(log_tmp, 'ab') as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._close_log()
+                os.replace(log_tmp, self.log_file)
+                os.replace(snapshot_tmp, self.snapshot_file)
+                self.generation = generation
+                self._mark_read(os.path.getsize(self.log_file))
+                self._log_ids = {interaction.get("id") for interaction in self._memories["interactions"]}
+                self._open_log()
+        except OSError as e:
+            print(f"Error compacting memory log: {str(e)}")
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def _write_generation(self, interactions, preferences, derived, generation, install):
+        """Write a complete log and snapshot for a generation.
+
+        Args:
+            derived (str): Patterns and rollups, as built by derived_json
+            install (bool): Move the files into place right away instead of leaving them
+                as temp files for the caller to swap in
+
+        Returns:
+            tuple: (log path, snapshot path)
+        """
+        log_tmp = temp_path(self.log_file)
+        snapshot_tmp = temp_path(self.snapshot_file)
+
+        with open(log_tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"op": "header", "generation": generation}) + "\n")
+            for key, record in preferences.items():
+                f.write(json.dumps({"op": "pref", "key": key, "value": record}) + "\n")
+            for interaction in interactions:
+                f.write(json.dumps({"op": "add", "interaction": interaction}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(snapshot_tmp, 'w', encoding='utf-8') as f:
+            f.write('{"generation": %d, "interactions_applied": %d, %s}'
+                    % (generation, len(interactions), derived))
+            f.flush()
+            os.fsync(f.fileno())
+
+        if not install:
+            return log_tmp, snapshot_tmp
+
+        os.replace(log_tmp, self.log_file)
+        os.replace(snapshot_tmp, self.snapshot_file)
+        self.generation = generation
+        return self.log_file, self.snapshot_file
+
+    def size(self):
+        """Bytes the store currently occupies on disk."""
+        return sum(os.path.getsize(path) for path in (self.log_file, self.snapshot_file) if os.path.exists(path))
+
+    def flush(self):
+        """fsync the log."""
+        with self.lock:
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._last_fsync = time.monotonic()
+
+    def _close_log(self):
+        """Close the append handle (caller holds the lock)."""
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+            self._log = None
+
+    def close(self):
+        """Flush and close the log."""
+        thread = self._compaction_thread
+        if thread is not None and thread.is_alive():
+            thread.join()
+        with self.lock:
+            self._close_log()
+            self._file_lock.close()
+
+
+def create_store(memory_type, memory_dir, kind=None):
+    """Create the store selected by MEMORY_STORE ("jsonl", the default, or "json").
+
+    Args:
+        memory_type (str): Type of memory (system, calendar, todo)
+        memory_dir (str): Directory holding the memory files
+        kind (str, optional): Override for MEMORY_STORE
+
+    Returns:
+        A store instance
+    """
+    kind = (kind or os.getenv("MEMORY_STORE", "jsonl")).lower()
+    legacy_file = os.path.join(memory_dir, f"memory_{memory_type}.json")
+    if kind == "json":
+        return JsonMemoryStore(legacy_file)
+    if kind == "jsonl":
+        return JsonlMemoryStore(os.path.join(memory_dir, f"memory_{memory_type}"), legacy_file=legacy_file)
+    raise ValueError(f"Unknown memory store: {kind}")
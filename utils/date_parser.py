@@ -1,84 +1,534 @@
-from datetime import datetime, timedelta
+import calendar
+import functools
 import re
-import dateparser
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from utils import metrics, timezones
+from utils.lazy_imports import lazy_module
 
-def parse_date_string(date_string):
+try:
+    import numpy as np
+except ImportError:  # parse_dates then parses ISO strings one at a time
+    np = None
+
+# Parsed dates remembered, least recently used dropped first
+CACHE_SIZE = 4096
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = {name: number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name[:3]: number for name, number in list(MONTHS.items())})
+MONTHS["sept"] = 9
+MONTHS = {name.lower(): number for name, number in MONTHS.items()}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+                "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+                "a couple of": 2, "a few": 3}
+
+_NUMBER = r"(\d+|" + "|".join(word.replace(" ", r"\s+") for word in sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+_UNIT = r"(minute|hour|day|week|month|year)s?"
+_MONTH = r"(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+_ORDINAL = r"(\d{1,2})(?:st|nd|rd|th)?"
+
+# The fast grammar, compiled once. Day expressions are tried in order; the first match wins.
+_ISO = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?(?:Z|[+-]\d{2}:?\d{2})?", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_DAY_PATTERNS = [
+    ("iso", re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")),
+    ("offset", re.compile(r"\b(?:in|after)\s+" + _NUMBER + r"\s+" + _UNIT + r"\b")),
+    ("offset", re.compile(r"\b" + _NUMBER + r"\s+" + _UNIT + r"\s+(?:from now|later)\b")),
+    ("ago", re.compile(r"\b" + _NUMBER + r"\s+" + _UNIT + r"\s+ago\b")),
+    ("relative", re.compile(r"\b(day after tomorrow|today|tonight|(?<!from )now|tomorrow|yesterday)\b")),
+    ("weekday", re.compile(r"\b(?:(next|this|coming|on)\s+)?(" + "|".join(WEEKDAYS) + r")\b")),
+    ("next", re.compile(r"\bnext\s+(week|month|year)\b")),
+    ("month_day", re.compile(r"\b" + _MONTH + r"\s+" + _ORDINAL + r"(?:,?\s+(\d{4}))?\b")),
+    ("day_month", re.compile(r"\b" + _ORDINAL + r"\s+(?:of\s+)?" + _MONTH + r"(?:,?\s+(\d{4}))?\b")),
+]
+_TIME = re.compile(r"\b(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b|\b(?:at\s+)?(\d{1,2}):(\d{2})\b|\b(noon|midnight)\b")
+# Shapes of ISO 8601 strings parse_dates parses in bulk: date, wall time, and UTC offset or Z
+_ISO_PARTS = re.compile(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?))?(Z|[+-]\d{2}:?\d{2})?")
+# Date-like fragments of a longer text, each handed to dateparser on its own
+_FRAGMENTS = re.compile(r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2} [A-Za-z]+ \d{2,4}|[A-Za-z]+ \d{1,2}(?:st|nd|rd|th)? \d{2,4})\b")
+
+_RELATIVE_DAYS = {"day after tomorrow": 2, "today": 0, "tonight": 0, "now": 0, "tomorrow": 1, "yesterday": -1}
+_MISSING = object()
+
+# Every relative expression the normalizer rewrites, as one alternation; the branch that matched
+# picks its rewrite from _REWRITES. Whole days only, so the output depends on the date alone.
+_NUMBER_WORDS = _NUMBER[1:-1]
+_DAY_UNIT = r"(?:day|week|month|year)"
+_RELATIVE_EXPRESSIONS = re.compile(
+    r"\b(?:"
+    r"(?P<offset>(?:in|after|within)\s+(?P<offset_amount>" + _NUMBER_WORDS + r")\s+(?P<offset_unit>" + _DAY_UNIT + r")s?)"
+    r"|(?P<from_now>(?P<from_now_amount>" + _NUMBER_WORDS + r")\s+(?P<from_now_unit>" + _DAY_UNIT + r")s?\s+from\s+now)"
+    r"|(?P<day_after_tomorrow>(?:the\s+)?day\s+after\s+tomorrow)"
+    r"|(?P<relative_day>today|tomorrow)"
+    r"|(?P<weekday>(?:(?P<weekday_qualifier>next|this|coming|on)\s+)?(?P<weekday_name>" + "|".join(WEEKDAYS) + r"))"
+    r"|(?P<next>next\s+(?P<next_unit>week|month|year))"
+    r")\b", re.IGNORECASE)
+
+
+def _rewrite_offset(match, start, prefix):
+    day = shift(start, _amount(match.group(prefix + "_amount").lower()), match.group(prefix + "_unit").lower())
+    return f"{'by' if match.group(0)[:6].lower() == 'within' else 'on'} {day:%Y-%m-%d}"
+
+
+def _rewrite_weekday(match, start):
+    qualifier = (match.group("weekday_qualifier") or "").lower()
+    day = upcoming_weekday(start, match.group("weekday_name").lower(), qualifier)
+    return f"on {day:%Y-%m-%d}" if qualifier == "on" else f"{day:%Y-%m-%d}"
+
+
+def _rewrite_next(match, start):
+    unit = match.group("next_unit").lower()
+    day = next_period(start, unit)
+    return f"the week of {day:%Y-%m-%d}" if unit == "week" else f"{day:%Y-%m-%d}"
+
+
+_REWRITES = {
+    "offset": lambda match, start: _rewrite_offset(match, start, "offset"),
+    "from_now": lambda match, start: _rewrite_offset(match, start, "from_now"),
+    "day_after_tomorrow": lambda match, start: f"{start + timedelta(days=2):%Y-%m-%d}",
+    "relative_day": lambda match, start: f"{start + timedelta(days=_RELATIVE_DAYS[match.group(0).lower()]):%Y-%m-%d}",
+    "weekday": _rewrite_weekday,
+    "next": _rewrite_next,
+}
+
+# Imported on the first fallback (or by the warm-up thread), which also loads its language data
+# and the parsers for today's settings in the current zone
+dateparser = lazy_module("dateparser", warm_up=lambda module: _dateparser_parse(
+    "in 2 days", timezones.now(), timezones.current_zone()))
+
+
+def add_months(day, months):
+    """Move a date by whole calendar months, clamping the day to the length of the target month."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def shift(start, amount, unit):
+    """Move a date by a number of days, weeks, months or years."""
+    if unit == "month":
+        return add_months(start, amount)
+    if unit == "year":
+        return add_months(start, 12 * amount)
+    return start + timedelta(**{unit + "s": amount})
+
+
+def upcoming_weekday(start, name, qualifier=None):
+    """The date a weekday refers to: "friday" is the coming friday (today included), "next friday" the first one after today."""
+    ahead = (WEEKDAYS.index(name) - start.weekday()) % 7
+    if qualifier == "next" and ahead == 0:
+        ahead = 7
+    return start + timedelta(days=ahead)
+
+
+def next_period(start, unit):
+    """The date "next week", "next month" or "next year" refers to."""
+    return shift(start, 1, unit)
+
+
+def _amount(token):
+    return int(token) if token.isdigit() else NUMBER_WORDS[" ".join(token.split())]
+
+
+class DateEngine:
+    """Turns date expressions into datetimes, the common ones without dateparser.
+
+    A precompiled grammar covers ISO dates, today/tomorrow, weekday names, "in/after N units",
+    "next week/month/year", month names and times of day. Anything else goes to dateparser,
+    which is only imported when needed and costs tens of milliseconds per call. Results are
+    memoized per (text, reference date, time zone); only expressions that depend on the time of
+    day ("now", "in 2 hours") are recomputed on every call. Results are aware datetimes in the
+    given zone (the user's zone of the current request by default), DST offsets included.
     """
-    Parse a date string in various formats and return a datetime object.
-    
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        """Initialize the engine.
+
+        Args:
+            cache_size (int): Parsed expressions to remember (0 disables memoization)
+        """
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, text, reference=None, tz=None):
+        """Parse a date expression.
+
+        Args:
+            text (str): The expression, e.g. "next friday at 3pm" or "2025-03-05"
+            reference (datetime, optional): What relative expressions are relative to (defaults to now)
+            tz (tzinfo, optional): Time zone of the reference and of the result (defaults to timezones.current_zone())
+
+        Returns:
+            datetime: The parsed date, or None if the text doesn't contain one
+        """
+        if not text or not isinstance(text, str):
+            return None
+        if tz is None:
+            tz = reference.tzinfo if reference is not None and reference.tzinfo else timezones.current_zone()
+        if reference is None:
+            reference = datetime.now(tz)
+        elif reference.tzinfo is None:
+            reference = timezones.localize(reference, tz)
+        key = (text, reference.date(), timezones.zone_name(tz) or str(tz))
+
+        with self._lock:
+            cached = self._cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                self._cache.move_to_end(key)
+        metrics.record_cache("date_parsing", cached is not _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        parsed, cacheable = self._parse(text, reference, tz)
+        if cacheable and self.cache_size:
+            with self._lock:
+                self._cache[key] = parsed
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return parsed
+
+    def clear(self):
+        """Forget every memoized result."""
+        with self._lock:
+            self._cache.clear()
+
+    def _parse(self, text, reference, tz):
+        """Parse without the memo; returns (datetime or None, whether the result may be memoized)."""
+        stripped = text.strip()
+        if _ISO.fullmatch(stripped):
+            parsed, cacheable = parse_iso(stripped), True
+        else:
+            parsed, cacheable = (self._grammar(_SPACES.sub(" ", stripped.lower()), reference)
+                                 or self._fallback(stripped, reference, tz))
+        # Wall times without an offset are in the user's zone
+        if parsed is not None and parsed.tzinfo is None:
+            parsed = timezones.localize(parsed, tz)
+        return parsed, cacheable
+
+    def _grammar(self, text, reference):
+        """The fast grammar; returns (datetime, memoizable) or None when it doesn't apply.
+
+        Dates are worked out on naive wall times, which _parse then puts in the zone, so adding
+        days across a DST change keeps the time of day.
+        """
+        start = reference.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        day, exact = None, False
+        for kind, pattern in _DAY_PATTERNS:
+            match = pattern.search(text)
+            if match is None:
+                continue
+            if kind == "iso":
+                try:
+                    day = start.replace(year=int(match.group(1)), month=int(match.group(2)), day=int(match.group(3)))
+                except ValueError:
+                    continue
+            elif kind in ("offset", "ago"):
+                amount, unit = _amount(match.group(1)), match.group(2)
+                if kind == "ago":
+                    amount = -amount
+                if unit in ("minute", "hour"):
+                    # Relative to the current time of day, so not memoized
+                    return timezones.normalize(reference + timedelta(**{unit + "s": amount})), False
+                day = shift(start, amount, unit)
+            elif kind == "relative":
+                if match.group(1) == "now":
+                    exact = True
+                day = start + timedelta(days=_RELATIVE_DAYS[match.group(1)])
+            elif kind == "weekday":
+                day = upcoming_weekday(start, match.group(2), match.group(1))
+            elif kind == "next":
+                day = next_period(start, match.group(1))
+            else:
+                month_name, day_number, year = ((match.group(1), match.group(2), match.group(3)) if kind == "month_day"
+                                                else (match.group(2), match.group(1), match.group(3)))
+                try:
+                    day = start.replace(year=int(year) if year else start.year, month=MONTHS[month_name],
+                                        day=int(day_number))
+                except ValueError:
+                    continue
+            break
+
+        clock = _TIME.search(text)
+        if clock is not None:
+            day = day or start
+            if clock.group(6):
+                return day.replace(hour=12 if clock.group(6) == "noon" else 0), True
+            hour, minute, meridiem = ((clock.group(1), clock.group(2), clock.group(3)) if clock.group(1)
+                                      else (clock.group(4), clock.group(5), None))
+            hour, minute = int(hour), int(minute or 0)
+            if meridiem:
+                # "13pm" and "0am" aren't times
+                if not 1 <= hour <= 12:
+                    return None
+                hour = hour % 12 + (12 if meridiem == "pm" else 0)
+            if hour > 23 or minute > 59:
+                return None
+            return day.replace(hour=hour, minute=minute), True
+        if day is None:
+            return None
+        if exact:
+            return reference, False
+        return day, True
+
+    def _fallback(self, text, reference, tz):
+        """Parse with dateparser: the whole text first, then each date-like fragment of it.
+
+        Returns:
+            tuple: (datetime or None, whether the result may be memoized)
+        """
+        metrics.registry.counter("date_parser_fallbacks_total", "Date expressions handed to dateparser").inc()
+        for candidate in [text] + _FRAGMENTS.findall(text):
+            parsed = _dateparser_parse(candidate, reference, tz)
+            if parsed[0] is not None:
+                return parsed
+        return None, True
+
+
+def _dateparser_settings(base, tz):
+    """dateparser settings for expressions relative to a naive wall time in tz.
+
+    dateparser caches its parsers per settings, so base should only ever be a midnight or a noon:
+    a new RELATIVE_BASE each call costs a fresh parser (hundreds of milliseconds).
+    """
+    settings = {"RELATIVE_BASE": base}
+    if timezones.zone_name(tz):
+        settings.update(TIMEZONE=timezones.zone_name(tz), RETURN_AS_TIMEZONE_AWARE=True)
+    return settings
+
+
+def _dateparser_parse(text, reference, tz):
+    """Parse with dateparser relative to reference; returns (datetime or None, whether it may be memoized).
+
+    The text is parsed relative to midnight and to noon of the reference date. Results twelve
+    hours apart depend on the time of day ("in 3 hours", "tomorrow"), so they get the reference's
+    time of day added back and aren't memoized.
+    """
+    midnight = reference.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    parsed = dateparser.parse(text, settings=_dateparser_settings(midnight, tz))
+    if parsed is None:
+        return None, True
+    at_noon = dateparser.parse(text, settings=_dateparser_settings(midnight + timedelta(hours=12), tz))
+    if at_noon is None or at_noon - parsed != timedelta(hours=12):
+        return parsed, True
+    parsed = parsed + (reference.replace(tzinfo=None) - midnight)
+    return (timezones.normalize(parsed) if parsed.tzinfo else parsed), False
+
+
+def parse_iso(text):
+    """Parse an ISO 8601 date or datetime ("Z" suffix allowed).
+
+    Returns:
+        datetime: The parsed datetime, or None if text isn't ISO 8601
+    """
+    try:
+        return datetime.fromisoformat(text.strip().replace("Z", "+00:00").replace("z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _datetime64_column(strings):
+    """Parse ISO dates or datetimes without offsets into a datetime64[us] array (NaT where invalid)."""
+    try:
+        return np.array(strings, dtype="datetime64[us]")
+    except ValueError:
+        # An impossible date somewhere (e.g. February 30th); parse one by one
+        parsed = [parse_iso(text) for text in strings]
+        return np.array([value if value is not None else "NaT" for value in parsed], dtype="datetime64[us]")
+
+
+@functools.lru_cache(maxsize=64)
+def _transition_table(tz):
+    """A zone's offsets over time, for converting many instants at once.
+
+    Returns:
+        tuple: (UTC transition times, UTC offset from each, tzinfo from each) as arrays/list,
+            or None for zones that don't expose their transitions (converted one by one)
+    """
+    transitions = getattr(tz, "_utc_transition_times", None)
+    if transitions is not None:  # pytz zones with DST
+        return (np.array(transitions, dtype="datetime64[us]"),
+                np.array([info[0] // timedelta(microseconds=1) for info in tz._transition_info], dtype="timedelta64[us]"),
+                [tz._tzinfos[info] for info in tz._transition_info])
+    offset = tz.utcoffset(None)
+    if offset is None:
+        return None
+    return (np.array(["0001-01-01"], dtype="datetime64[us]"),
+            np.array([offset // timedelta(microseconds=1)], dtype="timedelta64[us]"), [tz])
+
+
+def _in_zone(utc, table):
+    """Transition index in effect at each UTC instant."""
+    return np.maximum(np.searchsorted(table[0], utc, side="right") - 1, 0)
+
+
+def parse_dates(values, tz=None, reference=None):
+    """Parse a column of date strings at once, e.g. when importing many events or todos.
+
+    One pass sorts the strings by shape. ISO dates and datetimes (with or without a UTC offset)
+    are parsed as NumPy datetime64 arrays and moved into the zone with a binary search over its
+    DST transitions; only the rest goes through the date engine one by one. Without NumPy
+    (or for zones without a transition table) ISO strings are parsed one at a time.
+
+    Args:
+        values (list): Strings (anything else is treated as unparseable)
+        tz (tzinfo, optional): Zone of strings without an offset, and of the results
+            (defaults to timezones.current_zone())
+        reference (datetime, optional): What relative expressions are relative to (defaults to now)
+
+    Returns:
+        list: Aware datetimes in tz, in the order of values (None where a value isn't a date)
+    """
+    tz = tz or timezones.current_zone()
+    results = [None] * len(values)
+    iso, walls, offsets, other = [], [], [], []
+    for position, value in enumerate(values):
+        if not isinstance(value, str):
+            continue
+        match = _ISO_PARTS.fullmatch(value.strip())
+        if match is None:
+            other.append(position)
+            continue
+        iso.append(position)
+        walls.append(match.group(1) + "T" + match.group(2) if match.group(2) else match.group(1))
+        suffix = match.group(3)
+        offsets.append(None if suffix is None else 0 if suffix == "Z" else
+                       (1 if suffix[0] == "+" else -1) * (int(suffix[1:3]) * 60 + int(suffix[-2:])))
+
+    table = _transition_table(tz) if np is not None and iso else None
+    if table is None:
+        for position, wall, offset in zip(iso, walls, offsets):
+            parsed = parse_iso(wall)
+            if parsed is not None:
+                results[position] = (timezones.localize(parsed, tz) if offset is None else
+                                     (parsed - timedelta(minutes=offset)).replace(tzinfo=timezone.utc).astimezone(tz))
+    else:
+        wall = _datetime64_column(walls)
+        has_offset = np.array([offset is not None for offset in offsets])
+        given = np.array([offset or 0 for offset in offsets], dtype="timedelta64[m]")
+        # Wall times without an offset: take the zone's offset at (wall - offset at wall), then
+        # check it; times in a DST gap or overlap fail the check and are localized one by one
+        guess = table[1][_in_zone(wall - table[1][_in_zone(wall, table)], table)]
+        utc = np.where(has_offset, wall - given, wall - guess)
+        index = _in_zone(utc, table)
+        local = (utc + table[1][index]).tolist()
+        unsure = (~has_offset & (table[1][index] != guess)).tolist()
+        for position, moment, transition, recheck in zip(iso, local, index.tolist(), unsure):
+            if moment is None:
+                continue
+            if recheck:
+                results[position] = timezones.localize(moment, tz)
+            else:
+                results[position] = moment.replace(tzinfo=table[2][transition])
+
+    for position in other:
+        results[position] = engine.parse(values[position], reference, tz)
+    return results
+
+
+# Shared by the agents and clients, so they all benefit from the same memo
+engine = DateEngine()
+
+
+def parse_date(text, reference=None, tz=None):
+    """Parse a date expression with the shared engine (see DateEngine.parse).
+
+    Returns:
+        datetime: The parsed date, or None
+    """
+    return engine.parse(text, reference, tz)
+
+
+def parse_date_string(date_string, tz=None):
+    """
+    Parse a date string in various formats.
+
     Args:
         date_string (str): A string representing a date
-        
+        tz (tzinfo, optional): The user's zone (defaults to the current request's)
+
     Returns:
-        datetime or str: A datetime object representing the parsed date or ISO format string
+        str: ISO format string for the Notion API, or None if the string isn't a date
     """
-    if not date_string:
-        return None
-        
-    # Try to parse with dateparser which handles many formats
-    parsed_date = dateparser.parse(date_string)
-    
-    if parsed_date:
-        # Return ISO format string for Notion API
-        return parsed_date.isoformat()
-    
-    # Handle relative dates
-    if isinstance(date_string, str):
-        if "tomorrow" in date_string.lower():
-            return (datetime.now() + timedelta(days=1)).isoformat()
-        elif "today" in date_string.lower():
-            return datetime.now().isoformat()
-        elif "next week" in date_string.lower():
-            return (datetime.now() + timedelta(days=7)).isoformat()
-        elif "two days" in date_string.lower() or "2 days" in date_string.lower():
-            return (datetime.now() + timedelta(days=2)).isoformat()
-        elif "three days" in date_string.lower() or "3 days" in date_string.lower():
-            return (datetime.now() + timedelta(days=3)).isoformat()
-    
-    # If all parsing fails, return None
-    return None
-
-def parse_natural_language_date(text):
+    parsed_date = parse_date(date_string, tz=tz)
+    return parsed_date.isoformat() if parsed_date else None
+
+def parse_natural_language_date(text, tz=None):
     """
     Extract and parse dates from natural language text.
-    
+
     Args:
         text (str): Natural language text containing date references
-        
+        tz (tzinfo, optional): The user's zone (defaults to the current request's)
+
     Returns:
-        str: ISO formatted date string for Notion API
+        str: ISO formatted date string for Notion API (tomorrow if the text has no date)
     """
     if not text:
         return None
-        
-    # Try direct parsing first
-    parsed_date = parse_date_string(text)
+    parsed_date = parse_date(text, tz=tz)
     if parsed_date:
-        return parsed_date
-    
-    # Check for common date patterns
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Handle "today", "tomorrow", "next week", etc.
-    if re.search(r'\btoday\b', text, re.IGNORECASE):
-        return today.isoformat()
-    elif re.search(r'\btomorrow\b', text, re.IGNORECASE):
-        return (today + timedelta(days=1)).isoformat()
-    elif re.search(r'\bnext week\b', text, re.IGNORECASE):
-        return (today + timedelta(days=7)).isoformat()
-    elif re.search(r'\btwo days?\b|in 2 days?\b', text, re.IGNORECASE):
-        return (today + timedelta(days=2)).isoformat()
-    elif re.search(r'\bthree days?\b|in 3 days?\b', text, re.IGNORECASE):
-        return (today + timedelta(days=3)).isoformat()
-    
-    # Try to extract specific dates using dateparser
-    date_matches = re.findall(r'\b(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2} [A-Za-z]+ \d{2,4}|[A-Za-z]+ \d{1,2}(?:st|nd|rd|th)? \d{2,4})\b', text)
-    
-    if date_matches:
-        for date_str in date_matches:
-            parsed_date = parse_date_string(date_str)
-            if parsed_date:
-                return parsed_date
-    
+        return parsed_date.isoformat()
     # Default to tomorrow if we can't parse a specific date
-    return (today + timedelta(days=1)).isoformat()
\ No newline at end of file
+    return tomorrow(tz).isoformat()
+
+
+def tomorrow(tz=None):
+    """Midnight at the start of tomorrow in a zone (the current request's by default)."""
+    tz = tz or timezones.current_zone()
+    today = datetime.now(tz).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return timezones.localize(today + timedelta(days=1), tz)
+
+
+def _day_start(reference, tz):
+    if reference is None:
+        reference = timezones.now(tz)
+    return reference.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+def normalize_relative_dates(text, reference=None, tz=None):
+    """Replace relative date expressions in a text with the dates they refer to, in one pass.
+
+    "in 3 days", "two weeks from now", "tomorrow", "next friday", "next month" and the like become
+    YYYY-MM-DD dates, so the output is the same for every call on the same reference date. Every
+    weekday word is rewritten, names included ("Monday report"); see relative_date_hints for
+    resolving dates while leaving the text alone.
+
+    Args:
+        text (str): Text to normalize
+        reference (datetime, optional): Date the expressions are relative to (defaults to today)
+        tz (tzinfo, optional): Zone whose today it is (defaults to timezones.current_zone())
+
+    Returns:
+        str: The text with relative dates replaced
+    """
+    if not text:
+        return text
+    start = _day_start(reference, tz)
+    return _RELATIVE_EXPRESSIONS.sub(lambda match: _REWRITES[match.lastgroup](match, start), text)
+
+
+def relative_date_hints(text, reference=None, tz=None):
+    """Find the relative date expressions in a text and the dates they refer to.
+
+    Same expressions as normalize_relative_dates, but the text isn't changed, so words that are
+    part of a name ("review Monday report") survive; the caller decides what is a date.
+
+    Args:
+        text (str): Text to scan
+        reference (datetime, optional): Date the expressions are relative to (defaults to today)
+        tz (tzinfo, optional): Zone whose today it is (defaults to timezones.current_zone())
+
+    Returns:
+        list: (expression as written, what it refers to) tuples in order of appearance, without
+            repeats, e.g. [("next friday", "2026-10-23"), ("in 3 days", "on 2026-10-22")]
+    """
+    if not text:
+        return []
+    start = _day_start(reference, tz)
+    hints = {}
+    for match in _RELATIVE_EXPRESSIONS.finditer(text):
+        hints.setdefault(match.group(0), _REWRITES[match.lastgroup](match, start))
+    return list(hints.items())
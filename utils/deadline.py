@@ -0,0 +1,105 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+# Budget for a whole user request, and how much of it must be left for optional work (LLM summaries)
+DEFAULT_REQUEST_TIMEOUT = 8.0
+DEFAULT_DEGRADE_THRESHOLD = 2.0
+
+# Calls shorter than this are not worth starting
+MINIMUM_CALL_TIMEOUT = 0.05
+
+_current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's latency budget has been spent."""
+
+
+class Deadline:
+    """A point in time by which a request has to be answered."""
+
+    __slots__ = ("expires_at", "degrade_threshold")
+
+    def __init__(self, seconds, degrade_threshold=DEFAULT_DEGRADE_THRESHOLD):
+        """Initialize the deadline.
+
+        Args:
+            seconds (float): Budget from now
+            degrade_threshold (float): Remaining seconds below which optional work is skipped
+        """
+        self.expires_at = time.monotonic() + seconds
+        self.degrade_threshold = degrade_threshold
+
+    def remaining(self):
+        """Seconds left in the budget (negative once expired)."""
+        return self.expires_at - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds, degrade_threshold=DEFAULT_DEGRADE_THRESHOLD):
+    """Run the enclosed block under a latency budget.
+
+    A nested deadline never extends the budget of an enclosing one.
+
+    Args:
+        seconds (float): Budget for the block
+        degrade_threshold (float): Remaining seconds below which optional work is skipped
+
+    Yields:
+        Deadline: The deadline in effect
+    """
+    new_deadline = Deadline(seconds, degrade_threshold)
+    enclosing = _current_deadline.get()
+    if enclosing is not None and enclosing.expires_at < new_deadline.expires_at:
+        new_deadline.expires_at = enclosing.expires_at
+
+    token = _current_deadline.set(new_deadline)
+    try:
+        yield new_deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    """Get the deadline in effect, or None outside of any request."""
+    return _current_deadline.get()
+
+
+def remaining_timeout(default):
+    """Get the timeout to use for an outgoing call.
+
+    Args:
+        default (float): Timeout used when no deadline is in effect
+
+    Returns:
+        float: Seconds the call may take
+
+    Raises:
+        DeadlineExceeded: If there is no useful budget left
+    """
+    current = _current_deadline.get()
+    if current is None:
+        return default
+
+    remaining = current.remaining()
+    if remaining < MINIMUM_CALL_TIMEOUT:
+        raise DeadlineExceeded(f"Request deadline exceeded ({-remaining:.2f}s over budget)")
+    return min(default, remaining)
+
+
+def should_degrade():
+    """Whether the current request is short enough on time to skip optional work."""
+    current = _current_deadline.get()
+    return current is not None and current.remaining() < current.degrade_threshold
+
+
+def request_timeout_from_env():
+    """Get the per-request budget from REQUEST_TIMEOUT_SECONDS (0 disables it)."""
+    return float(os.getenv("REQUEST_TIMEOUT_SECONDS", DEFAULT_REQUEST_TIMEOUT))
+
+
+def degrade_threshold_from_env():
+    """Get the degrade threshold from REQUEST_DEGRADE_SECONDS."""
+    return float(os.getenv("REQUEST_DEGRADE_SECONDS", DEFAULT_DEGRADE_THRESHOLD))
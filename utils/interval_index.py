@@ -0,0 +1,182 @@
+import bisect
+import heapq
+import time
+from datetime import date, datetime, timedelta
+from utils import timezones
+
+# How long an event with a start time but no end is taken to last
+DEFAULT_DURATION = timedelta(hours=1)
+
+
+def _is_date(value):
+    return len(value) == len("2025-03-05")
+
+
+def _midnight_after(value, tz):
+    """Midnight at the end of a "2025-03-05" day in tz, or None if value isn't a date."""
+    try:
+        return timezones.from_notion((date.fromisoformat(value) + timedelta(days=1)).isoformat(), tz)
+    except ValueError:
+        return None
+
+
+def event_span(event, tz=None):
+    """Time an event occupies, as UTC timestamps.
+
+    Date-only starts take up the whole day (through the end date's day, if there is one) in tz,
+    the current zone if None; timed events without an end last DEFAULT_DURATION.
+
+    Returns:
+        tuple: (start, end) timestamps, or None if the event has no usable start
+    """
+    start_value = str(event.get("start_date") or "")
+    start = timezones.from_notion(start_value, tz) if start_value else None
+    if start is None:
+        return None
+
+    end_value = str(event.get("end_date") or "")
+    end = None
+    if end_value:
+        # An end date without a time means the event runs through that day
+        end = _midnight_after(end_value, tz) if _is_date(end_value) else timezones.from_notion(end_value, tz)
+    if end is None or end <= start:
+        end = _midnight_after(start_value, tz) if _is_date(start_value) else start + DEFAULT_DURATION
+    return start.timestamp(), end.timestamp()
+
+
+def to_timestamp(moment, tz=None):
+    """UTC timestamp of a datetime, a date (its midnight) or a date string, naive ones taken to be in tz."""
+    if isinstance(moment, (int, float)):
+        return float(moment)
+    if isinstance(moment, str):
+        moment = timezones.from_notion(moment, tz)
+        if moment is None:
+            raise ValueError("Not a date")
+    if not isinstance(moment, datetime) or moment.tzinfo is None:
+        moment = timezones.localize(moment, tz or timezones.current_zone())
+    return moment.timestamp()
+
+
+class IntervalIndex:
+    """Events ordered by start time, for finding the ones that overlap a time range.
+
+    Starts are kept in a sorted list searched with bisect. An event overlapping [start, end)
+    starts before end and no earlier than start minus the longest event's duration, so a lookup
+    is O(log n + k) in the events starting in that stretch. Events are added, replaced and
+    removed one at a time as they change.
+    """
+
+    def __init__(self):
+        self.synced_at = None
+        self._starts = []
+        self._spans = {}
+        self._longest = 0.0
+
+    def __len__(self):
+        return len(self._spans)
+
+    def add(self, event):
+        """Index an event, replacing the entry with the same id; events without a start are skipped."""
+        if not event or "id" not in event:
+            return
+        key = self._store(event)
+        if key is not None:
+            bisect.insort(self._starts, key)
+
+    def _store(self, event):
+        """Record an event's span, replacing its old one, and return its key for _starts (None if it has no start)."""
+        self.remove(event["id"])
+        span = event_span(event)
+        if span is None:
+            return None
+        start, end = span
+        self._spans[event["id"]] = (start, end, event)
+        self._longest = max(self._longest, end - start)
+        return (start, str(event["id"]), event["id"])
+
+    def remove(self, event_id):
+        """Remove an event from the index."""
+        entry = self._spans.pop(event_id, None)
+        if entry is None:
+            return
+        start, end = entry[0], entry[1]
+        position = bisect.bisect_left(self._starts, (start, str(event_id)))
+        if position < len(self._starts) and self._starts[position][2] == event_id:
+            del self._starts[position]
+        if end - start >= self._longest:
+            self._longest = max((end - start for start, end, _ in self._spans.values()), default=0.0)
+
+    def sync(self, events):
+        """Bring the index in line with a fresh list of events, touching only what changed."""
+        seen = set()
+        added = []
+        for event in events:
+            if not event or "id" not in event or event["id"] in seen:
+                continue
+            seen.add(event["id"])
+            entry = self._spans.get(event["id"])
+            if entry is None or entry[2] != event:
+                key = self._store(event)
+                if key is not None:
+                    added.append(key)
+        for event_id in [event_id for event_id in self._spans if event_id not in seen]:
+            self.remove(event_id)
+        if added:
+            # One sort of the merged list rather than an insertion per event
+            self._starts.extend(added)
+            self._starts.sort()
+        self.synced_at = time.monotonic()
+
+    def _entries_between(self, start, end):
+        """(start, end, event) of every event overlapping [start, end), by start time."""
+        low = bisect.bisect_left(self._starts, (start - self._longest,))
+        high = bisect.bisect_left(self._starts, (end,))
+        entries = []
+        for _, _, event_id in self._starts[low:high]:
+            entry = self._spans[event_id]
+            if entry[1] > start:
+                entries.append(entry)
+        return entries
+
+    def overlapping(self, start, end, exclude=None):
+        """Find the events overlapping a time range.
+
+        Args:
+            start: Range start (datetime, date, ISO string or UTC timestamp; naive ones in the current zone)
+            end: Range end, exclusive
+            exclude: Id of an event to leave out, e.g. the one being checked
+
+        Returns:
+            list: The overlapping events, by start time
+        """
+        return [event for _, _, event in self._entries_between(to_timestamp(start), to_timestamp(end))
+                if event["id"] != exclude]
+
+    def conflicts_with(self, event):
+        """Events overlapping an event (which doesn't have to be indexed), by start time."""
+        span = event_span(event)
+        if span is None:
+            return []
+        return self.overlapping(span[0], span[1], exclude=event.get("id"))
+
+    def find_conflicts(self, start, end):
+        """Find every pair of overlapping events in a time range with one sweep over their starts.
+
+        Args:
+            start: Range start (as for overlapping)
+            end: Range end, exclusive
+
+        Returns:
+            list: (earlier event, later event) tuples, by the later event's start
+        """
+        pairs = []
+        active = []
+        for number, (event_start, event_end, event) in enumerate(
+                self._entries_between(to_timestamp(start), to_timestamp(end))):
+            # Events that ended by the time this one starts can't overlap anything later either
+            while active and active[0][0] <= event_start:
+                heapq.heappop(active)
+            for _, _, other in sorted(active, key=lambda entry: entry[1]):
+                pairs.append((other, event))
+            heapq.heappush(active, (event_end, number, event))
+        return pairs
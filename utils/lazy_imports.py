@@ -0,0 +1,98 @@
+import importlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Every facade created through lazy_module, in creation order, for warm-up
+_registry = []
+
+
+def warm_up_from_env():
+    """Whether to warm up lazily imported modules in the background, from WARM_UP_IMPORTS (default on)."""
+    return os.getenv("WARM_UP_IMPORTS", "1").lower() not in ("0", "false", "no")
+
+
+class LazyModule:
+    """Stand-in for a heavy module that is only imported when one of its attributes is first used.
+
+    Attribute access goes straight to the real module once it is loaded, so callers write
+    `genai.configure(...)` exactly as with a plain import.
+    """
+
+    def __init__(self, name, warm_up=None):
+        """Initialize the facade.
+
+        Args:
+            name (str): Dotted name of the module
+            warm_up (callable, optional): Called with the module during warm-up to load its data
+        """
+        self._name = name
+        self._warm_up = warm_up
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the module has been imported."""
+        return self._module is not None
+
+    def load(self):
+        """Import the module if that hasn't happened yet.
+
+        Returns:
+            module: The real module
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def warm_up(self):
+        """Import the module and run its warm-up, if it has one."""
+        module = self.load()
+        if self._warm_up is not None:
+            self._warm_up(module)
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{' (loaded)' if self.loaded else ''}>"
+
+
+def lazy_module(name, warm_up=None):
+    """Create a facade for a module that is imported on first use (see LazyModule).
+
+    Args:
+        name (str): Dotted name of the module
+        warm_up (callable, optional): Called with the module during warm-up
+
+    Returns:
+        LazyModule: The facade
+    """
+    module = LazyModule(name, warm_up)
+    _registry.append(module)
+    return module
+
+
+def _warm_up_all():
+    for module in list(_registry):
+        try:
+            module.warm_up()
+        except Exception as e:
+            # The first real use will raise the error where it can be handled
+            logger.warning(f"Warm-up of {module._name} failed: {str(e)}")
+
+
+def start_warm_up():
+    """Import every lazily imported module in a background thread, e.g. while waiting for input.
+
+    Returns:
+        threading.Thread: The warm-up thread (a daemon, so it never delays exit)
+    """
+    thread = threading.Thread(target=_warm_up_all, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,374 @@
+import contextvars
+import functools
+import math
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import tracing
+
+# Histograms keep SUB_BUCKETS linear buckets per power of two, HDR style: relative error stays
+# below 1 / SUB_BUCKETS at every magnitude while the bucket array has a fixed size.
+SUB_BUCKETS = 16
+MAX_EXPONENT = 40
+
+# Fixed "le" bounds used when exposing histograms to Prometheus
+PROMETHEUS_BOUNDS = [2.0 ** exponent for exponent in range(21)]
+
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increase the counter."""
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """A value that can go up and down."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        """Set the gauge to a value."""
+        self.value = value
+
+
+class Histogram:
+    """Fixed-size log-linear histogram of non-negative values."""
+
+    __slots__ = ("count", "sum", "max", "_counts", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._counts = [0] * (1 + (MAX_EXPONENT + 1) * SUB_BUCKETS)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket_index(value):
+        """Map a value to its bucket without allocating."""
+        if value < 1:
+            return 0
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        exponent = min(exponent - 1, MAX_EXPONENT)
+        sub = min(int((mantissa * 2 - 1) * SUB_BUCKETS), SUB_BUCKETS - 1)
+        return 1 + exponent * SUB_BUCKETS + sub
+
+    @staticmethod
+    def _bucket_lower_bound(index):
+        """Lower bound of the values stored in a bucket."""
+        if index == 0:
+            return 0.0
+        exponent, sub = divmod(index - 1, SUB_BUCKETS)
+        return (2 ** exponent) * (1 + sub / SUB_BUCKETS)
+
+    @staticmethod
+    def _bucket_upper_bound(index):
+        """Upper bound of the values stored in a bucket."""
+        if index == 0:
+            return 1.0
+        exponent, sub = divmod(index - 1, SUB_BUCKETS)
+        return (2 ** exponent) * (1 + (sub + 1) / SUB_BUCKETS)
+
+    def observe(self, value):
+        """Record a value."""
+        index = self._bucket_index(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """Estimate the q-th percentile (0-100) of the recorded values.
+
+        Returns:
+            float: Upper bound of the bucket holding the percentile, 0.0 if empty
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self._bucket_upper_bound(index), self.max)
+        return self.max
+
+    def cumulative_counts(self, bounds):
+        """Count values at or below each bound (for Prometheus buckets), to bucket resolution."""
+        results = []
+        index = 0
+        seen = 0
+        for bound in bounds:
+            while index < len(self._counts) and self._bucket_lower_bound(index) <= bound:
+                seen += self._counts[index]
+                index += 1
+            results.append(seen)
+        return results
+
+
+class MetricsRegistry:
+    """In-process registry of labelled counters, gauges and histograms.
+
+    Metric children are created once per label set and cached. Looking one up still builds a
+    sorted label tuple, so hot paths keep the children they update (see request_metrics and
+    cache_counter) and then only pay for a lock and an integer update.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = kind()
+                    self._metrics[key] = metric
+                    self._help.setdefault(name, (kind.__name__.lower(), help_text))
+        return metric
+
+    def counter(self, name, help_text="", **labels):
+        """Get or create a counter."""
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", **labels):
+        """Get or create a gauge."""
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", **labels):
+        """Get or create a histogram."""
+        return self._get(Histogram, name, help_text, labels)
+
+    def collect(self):
+        """Get a snapshot of all metrics.
+
+        Returns:
+            list: List of (name, labels dict, metric) tuples sorted by name
+        """
+        with self._lock:
+            items = list(self._metrics.items())
+        return [(name, dict(labels), metric) for (name, labels), metric in sorted(items, key=lambda item: item[0])]
+
+    def cache_hit_ratios(self):
+        """Get the hit ratio of every cache recorded through record_cache().
+
+        Returns:
+            dict: Mapping of cache name to (hits, misses, ratio)
+        """
+        totals = {}
+        for name, labels, metric in self.collect():
+            if name == "cache_requests_total":
+                hits, misses = totals.get(labels["cache"], (0, 0))
+                if labels["result"] == "hit":
+                    hits += metric.value
+                else:
+                    misses += metric.value
+                totals[labels["cache"]] = (hits, misses)
+        return {cache: (hits, misses, hits / (hits + misses) if hits + misses else 0.0)
+                for cache, (hits, misses) in totals.items()}
+
+    def format_summary(self):
+        """Format all metrics for the `stats` command."""
+        lines = []
+        for name, labels, metric in self.collect():
+            label_str = ",".join(f"{k}={v}" for k, v in labels.items())
+            title = f"{name}{{{label_str}}}" if label_str else name
+            if isinstance(metric, Histogram):
+                if metric.count:
+                    lines.append(f"{title}: count={metric.count} avg={metric.sum / metric.count:.1f} "
+                                 f"p50={metric.percentile(50):.1f} p95={metric.percentile(95):.1f} "
+                                 f"p99={metric.percentile(99):.1f} max={metric.max:.1f}")
+            else:
+                lines.append(f"{title}: {metric.value}")
+
+        for cache, (hits, misses, ratio) in sorted(self.cache_hit_ratios().items()):
+            lines.append(f"cache hit ratio {cache}: {ratio:.1%} ({hits} hits, {misses} misses)")
+
+        return "\n".join(lines) if lines else "No metrics recorded yet."
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        seen = set()
+        for name, labels, metric in self.collect():
+            if name not in seen:
+                seen.add(name)
+                kind, help_text = self._help[name]
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            if isinstance(metric, Histogram):
+                for bound, cumulative in zip(PROMETHEUS_BOUNDS, metric.cumulative_counts(PROMETHEUS_BOUNDS)):
+                    lines.append(f"{name}_bucket{_format_labels(labels, le=_format_number(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {metric.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(metric.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels, **extra):
+    """Format a label set as {k="v",...}."""
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_number(value):
+    """Format a number the way Prometheus expects."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+registry = MetricsRegistry()
+
+
+class RequestScope:
+    """Per-request tally of external calls."""
+
+    __slots__ = ("notion_calls", "gemini_calls")
+
+    def __init__(self):
+        self.notion_calls = 0
+        self.gemini_calls = 0
+
+
+@contextmanager
+def request_scope():
+    """Count the external calls made while handling one user request.
+
+    Yields:
+        RequestScope: The tally for the request
+    """
+    scope = RequestScope()
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_scope.reset(token)
+
+
+def count_call(service):
+    """Add an external call to the current request's tally, if there is one.
+
+    Args:
+        service (str): Either "notion" or "gemini"
+    """
+    scope = _request_scope.get()
+    if scope is not None:
+        if service == "notion":
+            scope.notion_calls += 1
+        else:
+            scope.gemini_calls += 1
+
+
+@functools.lru_cache(maxsize=None)
+def request_metrics(request_type):
+    """The metric children record_request updates for a request type, looked up once.
+
+    Returns:
+        tuple: (requests, notion calls, gemini calls) counters and (notion calls, gemini calls,
+            duration) histograms
+    """
+    return (
+        registry.counter("requests_total", "User requests handled", request_type=request_type),
+        registry.counter("notion_calls_total", "Notion API calls by request type", request_type=request_type),
+        registry.counter("gemini_calls_total", "Gemini API calls by request type", request_type=request_type),
+        registry.histogram("notion_calls_per_request", "Notion API calls per request", request_type=request_type),
+        registry.histogram("gemini_calls_per_request", "Gemini API calls per request", request_type=request_type),
+        registry.histogram("request_duration_ms", "User request latency in milliseconds", request_type=request_type),
+    )
+
+
+def record_request(scope, request_type, duration_ms):
+    """Record the totals of a finished request.
+
+    Args:
+        scope (RequestScope): The request's tally
+        request_type (str): Agent type the request was routed to
+        duration_ms (float): Request latency in milliseconds
+    """
+    requests, notion_calls, gemini_calls, notion_per_request, gemini_per_request, duration = request_metrics(request_type)
+    requests.inc()
+    notion_calls.inc(scope.notion_calls)
+    gemini_calls.inc(scope.gemini_calls)
+    notion_per_request.observe(scope.notion_calls)
+    gemini_per_request.observe(scope.gemini_calls)
+    duration.observe(duration_ms)
+
+
+@functools.lru_cache(maxsize=None)
+def cache_counter(cache, hit):
+    """The lookup counter of a cache for hits or misses, looked up once."""
+    return registry.counter("cache_requests_total", "Cache lookups", cache=cache, result="hit" if hit else "miss")
+
+
+def record_cache(cache, hit):
+    """Record a cache lookup.
+
+    Args:
+        cache (str): Name of the cache
+        hit (bool): Whether the lookup was a hit
+    """
+    cache_counter(cache, hit).inc()
+    tracing.record("cache_hits" if hit else "cache_misses")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry at /metrics."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the console
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve Prometheus metrics at http://host:port/metrics from a background thread.
+
+    Args:
+        port (int): Port to listen on
+        host (str): Interface to bind (localhost only by default, "0.0.0.0" for every interface)
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
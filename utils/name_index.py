@@ -0,0 +1,252 @@
+import math
+import os
+import re
+import time
+from collections import Counter
+from utils import timezones
+
+try:
+    import numpy as np
+except ImportError:  # Counting falls back to pure Python
+    np = None
+
+# Matches scoring below this aren't considered at all
+MIN_SCORE = 0.35
+# resolve() first looks only for matches scoring at least this; the far cheaper pass is exact
+# whenever its best match beats the floor by AMBIGUITY_MARGIN, as it usually does
+RESOLVE_FLOOR = 0.7
+# The best match is ambiguous when the runner-up scores within this of it
+AMBIGUITY_MARGIN = 0.05
+# Statuses of finished items, which lose ties against open ones
+DONE_STATUSES = {"done", "completed", "complete", "archived"}
+
+# Queries touching more postings than this are counted with NumPy when it is available
+VECTORIZE_THRESHOLD = 512
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# Words people put in front of names ("mark the report as done") that aren't part of them
+_FILLER_WORDS = re.compile(r"\b(?:the|a|an|my)\b")
+
+
+def ttl_from_env():
+    """Get how long a synced index is trusted without refetching from NAME_INDEX_TTL_SECONDS (default 30)."""
+    return float(os.getenv("NAME_INDEX_TTL_SECONDS", "30"))
+
+
+def normalize_name(name):
+    """Lowercase, without punctuation or articles: "Finish the Q3-report!" -> "finish q3 report"."""
+    return " ".join(_FILLER_WORDS.sub(" ", _NON_WORD.sub(" ", (name or "").lower())).split())
+
+
+def trigrams(name):
+    """Character trigrams of a normalized name, each word padded so word starts and ends count."""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """Trigram index resolving a name the user typed ("the report") to the todo or event meant.
+
+    Candidates come from the posting lists of the query's trigrams, so a lookup only touches
+    items sharing some of them. Each is scored by how much of the query it contains and by the
+    Jaccard similarity of the two trigram sets; ties go to open items, then to the item dated
+    closest to now. Items are added, replaced and removed one at a time as they change.
+
+    Items live in integer slots (reused after removal) so postings can be counted as arrays.
+    """
+
+    def __init__(self, name_field, date_field=None, status_field="status"):
+        """Initialize the index.
+
+        Args:
+            name_field (str): Item key holding the name ("task_name", "event_name")
+            date_field (str, optional): Item key holding the date used to break ties
+            status_field (str): Item key holding the status used to break ties
+        """
+        self.name_field = name_field
+        self.date_field = date_field
+        self.status_field = status_field
+        self.synced_at = None
+        self._slots = {}
+        self._entries = {}
+        self._free_slots = []
+        self._next_slot = 0
+        self._postings = {}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, item):
+        """Index an item, replacing the entry with the same id."""
+        if not item or "id" not in item:
+            return
+        self.remove(item["id"])
+        name = normalize_name(item.get(self.name_field))
+        grams = trigrams(name) if name else set()
+        when = None
+        if self.date_field and item.get(self.date_field):
+            parsed = timezones.from_notion(str(item[self.date_field]))
+            when = parsed.timestamp() if parsed else None
+        done = str(item.get(self.status_field) or "").lower() in DONE_STATUSES
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+        self._slots[item["id"]] = slot
+        self._entries[slot] = (item, name, grams, when, done)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(slot)
+            self._arrays.pop(gram, None)
+
+    def remove(self, item_id):
+        """Remove an item from the index."""
+        slot = self._slots.pop(item_id, None)
+        if slot is None:
+            return
+        for gram in self._entries.pop(slot)[2]:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting:
+                    del self._postings[gram]
+            self._arrays.pop(gram, None)
+        self._free_slots.append(slot)
+
+    def sync(self, items):
+        """Bring the index in line with a fresh list of items, touching only what changed."""
+        seen = set()
+        for item in items:
+            if not item or "id" not in item:
+                continue
+            seen.add(item["id"])
+            slot = self._slots.get(item["id"])
+            if slot is None or self._entries[slot][0] != item:
+                self.add(item)
+            else:
+                # Same content; keep the fresh object so callers get current data
+                self._entries[slot] = (item,) + self._entries[slot][1:]
+        for item_id in [item_id for item_id in self._slots if item_id not in seen]:
+            self.remove(item_id)
+        self.synced_at = time.monotonic()
+
+    def is_fresh(self, ttl):
+        """Whether the index was synced within the last ttl seconds."""
+        return self.synced_at is not None and time.monotonic() - self.synced_at < ttl
+
+    def get(self, item_id, default=None):
+        """The indexed item with an id, or default."""
+        slot = self._slots.get(item_id)
+        return default if slot is None else self._entries[slot][0]
+
+    def items(self):
+        """Every indexed item."""
+        return [entry[0] for entry in self._entries.values()]
+
+    def _posting_array(self, gram):
+        """Slots of a trigram's postings as a NumPy array, cached until it changes."""
+        array = self._arrays.get(gram)
+        if array is None:
+            posting = self._postings.get(gram, ())
+            array = np.fromiter(posting, dtype=np.int64, count=len(posting))
+            self._arrays[gram] = array
+        return array
+
+    def _shared_counts(self, grams, needed):
+        """Count the query trigrams each item shares, keeping the items sharing at least needed.
+
+        Returns:
+            list: (slot, shared count) tuples
+        """
+        postings_size = sum(len(self._postings.get(gram, ())) for gram in grams)
+        if np is not None and postings_size > VECTORIZE_THRESHOLD:
+            counts = np.bincount(np.concatenate([self._posting_array(gram) for gram in grams]),
+                                 minlength=self._next_slot)
+            slots = np.flatnonzero(counts >= needed)
+            return list(zip(slots.tolist(), counts[slots].tolist()))
+
+        # A name sharing needed trigrams shares at least one of the rarest len(grams) - needed + 1
+        grams = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        prefix = len(grams) - needed + 1
+        shared = Counter()
+        for gram in grams[:prefix]:
+            shared.update(self._postings.get(gram, ()))
+        remaining = len(grams) - prefix
+        for gram in grams[prefix:]:
+            shared.update(shared.keys() & self._postings.get(gram, set()))
+            remaining -= 1
+            # Drop candidates that can no longer reach needed even sharing every trigram left
+            shared = Counter({slot: count for slot, count in shared.items() if count + remaining >= needed})
+        return [(slot, count) for slot, count in shared.items() if count >= needed]
+
+    def _rank(self, query, min_score, now):
+        name = normalize_name(query)
+        if not name:
+            return []
+        grams = trigrams(name)
+        query_size = len(grams)
+        # The score is at most shared / query_size, so weaker candidates can be skipped uncounted
+        needed = max(1, math.ceil(min_score * query_size - 1e-9))
+
+        now = time.time() if now is None else now
+        ranked = []
+        for slot, count in self._shared_counts(grams, needed):
+            item, item_name, item_grams, when, done = self._entries[slot]
+            if item_name == name:
+                score = 1.0
+            else:
+                # Half for how much of the query the name contains, half for overall likeness
+                score = 0.5 * count / query_size + 0.5 * count / (query_size + len(item_grams) - count)
+                score = min(round(score, 6), 0.99)
+            if score >= min_score:
+                distance = abs(when - now) if when is not None else float("inf")
+                ranked.append((-score, done, distance, item_name, str(item["id"]), item))
+        ranked.sort(key=lambda entry: entry[:5])
+        return ranked
+
+    def search(self, query, limit=5, min_score=MIN_SCORE, now=None):
+        """Rank the items by how well their name matches a query.
+
+        Args:
+            query (str): Name as the user wrote it
+            limit (int): Maximum number of results
+            min_score (float): Lowest score to return
+            now (float, optional): Timestamp date tie-breaks are measured from (defaults to now)
+
+        Returns:
+            list: (item, score) tuples, best first; score is 1.0 for an exact name match
+        """
+        return [(entry[5], -entry[0]) for entry in self._rank(query, min_score, now)[:limit]]
+
+    def resolve(self, query, limit=5, min_score=MIN_SCORE, now=None):
+        """Find the item a query most likely means.
+
+        The match is ambiguous when another item scores within AMBIGUITY_MARGIN of it and the
+        status tie-breaker doesn't separate them (both open or both done), e.g. two open
+        "report" todos for "the report".
+
+        Returns:
+            dict: "item" (the best match, or None), "score", "candidates" ((item, score) tuples of
+                the best matches, best first; a clear match doesn't list weak ones) and "ambiguous"
+                (True when the user should be asked which one they meant; "candidates" then starts
+                with the items in question)
+        """
+        ranked = self._rank(query, max(min_score, RESOLVE_FLOOR), now)
+        if min_score < RESOLVE_FLOOR and (not ranked or -ranked[0][0] < RESOLVE_FLOOR + AMBIGUITY_MARGIN):
+            ranked = self._rank(query, min_score, now)
+        if not ranked:
+            return {"item": None, "score": 0.0, "candidates": [], "ambiguous": False}
+        best = ranked[0]
+        ambiguous = best[0] > -1.0 and any(
+            entry[0] - best[0] < AMBIGUITY_MARGIN and entry[1] == best[1] for entry in ranked[1:])
+        return {
+            "item": best[5],
+            "score": -best[0],
+            "candidates": [(entry[5], -entry[0]) for entry in ranked[:limit]],
+            "ambiguous": ambiguous,
+        }
@@ -0,0 +1,44 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting how often an operation may start."""
+
+    def __init__(self, rate, burst=1):
+        """Initialize the rate limiter.
+
+        Args:
+            rate (float): Operations allowed per second (0 or less disables limiting)
+            burst (int): Number of operations that may start back to back
+        """
+        self.rate = float(rate or 0)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it.
+
+        Returns:
+            float: Seconds spent waiting for the token
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+
+                delay = (1 - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
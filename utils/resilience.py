@@ -0,0 +1,141 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from utils.deadline import DeadlineExceeded
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling a dependency while too many recent calls failed or were slow.
+
+    The breaker is closed while things are healthy. Once at least min_calls calls are in the
+    rolling window and the share of failed or slow calls reaches failure_rate, it opens and
+    every call is refused for open_seconds. After that a single probe call is let through
+    (half open): success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_rate=0.5, slow_call_ms=10000, window=20, min_calls=5, open_seconds=30):
+        """Initialize the circuit breaker.
+
+        Args:
+            name (str): Name of the protected call, for logging and metrics
+            failure_rate (float): Share of bad calls in the window that trips the breaker
+            slow_call_ms (float): Calls slower than this count as bad even if they succeed
+            window (int): Number of recent calls considered
+            min_calls (int): Calls needed in the window before the breaker may trip
+            open_seconds (float): How long the breaker refuses calls once tripped
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, success, duration_ms):
+        """Record the outcome of a call that allow() let through.
+
+        Args:
+            success (bool): Whether the call succeeded
+            duration_ms (float): How long the call took
+        """
+        good = success and duration_ms < self.slow_call_ms
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if good:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+
+            self._outcomes.append(good)
+            bad = len(self._outcomes) - sum(self._outcomes)
+            if len(self._outcomes) >= self.min_calls and bad / len(self._outcomes) >= self.failure_rate:
+                self._trip()
+
+    def _trip(self):
+        """Open the breaker (caller holds the lock)."""
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+def hedged_call(executor, func, args, timeout, hedge_delay=None, on_hedge=None):
+    """Call func on an executor, optionally sending a second identical call if the first is slow.
+
+    Args:
+        executor (Executor): Executor that runs the calls
+        func (callable): Function to call
+        args (tuple): Positional arguments for func
+        timeout (float): Seconds to wait for an answer in total
+        hedge_delay (float, optional): Seconds after which a second call is started (None disables hedging)
+        on_hedge (callable, optional): Called without arguments when the second call is started
+
+    Returns:
+        The result of whichever call succeeds first
+
+    Raises:
+        DeadlineExceeded: If no call succeeded within timeout
+        Exception: The last call's error if every call failed
+    """
+    start = time.monotonic()
+    # Run each call in a copy of the caller's context so deadlines and spans carry over
+    pending = {executor.submit(contextvars.copy_context().run, func, *args)}
+    hedged = hedge_delay is None or hedge_delay >= timeout
+    error = None
+
+    while pending:
+        left = timeout - (time.monotonic() - start)
+        if left <= 0:
+            break
+
+        wait_for = left if hedged else min(left, max(0.0, hedge_delay - (time.monotonic() - start)))
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+
+        if not hedged and time.monotonic() - start >= hedge_delay:
+            hedged = True
+            if done and not pending:
+                # The first call already failed; hedging a failure is just a retry
+                break
+            pending.add(executor.submit(contextvars.copy_context().run, func, *args))
+            if on_hedge:
+                on_hedge()
+
+    if error is not None and not pending:
+        raise error
+    raise DeadlineExceeded(f"No answer within {timeout:.2f}s")
@@ -0,0 +1,149 @@
+import contextvars
+import functools
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, time, timezone
+import pytz
+
+# Preference (in MemoryManager) holding the user's IANA time zone name, e.g. "Africa/Cairo"
+TIMEZONE_PREFERENCE = "timezone"
+
+_current_zone = contextvars.ContextVar("current_zone", default=None)
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name):
+    """Get the time zone object for an IANA name, created once per name.
+
+    Args:
+        name (str): Zone name, e.g. "Europe/Berlin" or "UTC"
+
+    Returns:
+        tzinfo: The pytz zone
+
+    Raises:
+        ValueError: If the name isn't a known zone
+    """
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+@functools.lru_cache(maxsize=None)
+def system_zone_name():
+    """IANA name of the system's zone: from TZ, else where /etc/localtime links to, else "UTC".
+
+    A fixed offset like the one datetime.astimezone() gives would get DST wrong half the year,
+    so a zone that can't be named is taken to be UTC.
+    """
+    for candidate in (os.getenv("TZ", "").lstrip(":"), os.path.realpath("/etc/localtime")):
+        # "Europe/Berlin", or a path like /usr/share/zoneinfo/Europe/Berlin
+        name = candidate.rpartition("zoneinfo/")[2]
+        if name in pytz.all_timezones_set:
+            return name
+    return "UTC"
+
+
+def default_zone():
+    """The zone to use when the user hasn't set one: TIMEZONE if set, else the system's zone."""
+    name = os.getenv("TIMEZONE")
+    if name:
+        return get_zone(name)
+    return get_zone(system_zone_name())
+
+
+@contextmanager
+def user_zone(tz):
+    """Make tz the zone dates are parsed and formatted in while handling one request.
+
+    Args:
+        tz (tzinfo): The user's zone
+    """
+    token = _current_zone.set(tz)
+    try:
+        yield tz
+    finally:
+        _current_zone.reset(token)
+
+
+def current_zone():
+    """The zone of the request being handled, or the default zone outside of one."""
+    return _current_zone.get() or default_zone()
+
+
+def zone_name(tz):
+    """IANA name of a zone (pytz and zoneinfo zones), or None for fixed offsets."""
+    return getattr(tz, "zone", None) or getattr(tz, "key", None)
+
+
+def localize(moment, tz):
+    """Attach a zone to a naive datetime (or midnight of a date) without shifting its wall time.
+
+    pytz zones need localize() to pick the offset in effect at that moment; other tzinfos are
+    attached directly. Aware datetimes are converted to tz instead.
+    """
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, time())
+    if moment.tzinfo is not None:
+        return moment.astimezone(tz)
+    if hasattr(tz, "localize"):
+        return tz.localize(moment)
+    return moment.replace(tzinfo=tz)
+
+
+def normalize(moment):
+    """Fix the offset of an aware datetime after arithmetic crossed a DST change (pytz zones)."""
+    tz = moment.tzinfo
+    return tz.normalize(moment) if hasattr(tz, "normalize") else moment
+
+
+def now(tz=None):
+    """The current time in a zone (the current zone if None)."""
+    return datetime.now(tz or current_zone())
+
+
+def to_utc(moment, tz=None):
+    """Convert a datetime to UTC; naive datetimes are taken to be in tz (the current zone if None)."""
+    if moment.tzinfo is None:
+        moment = localize(moment, tz or current_zone())
+    return moment.astimezone(timezone.utc)
+
+
+def utc_key(moment, tz=None):
+    """Normalized UTC form of a datetime, e.g. "2025-03-05T07:00:00Z", for cache and index keys.
+
+    The same instant gives the same key whichever zone it was expressed in.
+    """
+    return to_utc(moment, tz).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def to_notion(moment, tz=None):
+    """Format a date or datetime for the Notion API.
+
+    Dates stay dates ("2025-03-05"); datetimes get an explicit UTC offset so Notion doesn't have
+    to guess the zone (naive ones are taken to be in tz, the current zone if None).
+    """
+    if not isinstance(moment, datetime):
+        return moment.isoformat()
+    if moment.tzinfo is None:
+        moment = localize(moment, tz or current_zone())
+    return moment.isoformat()
+
+
+def from_notion(value, tz=None):
+    """Parse a date Notion returned into an aware datetime in tz (the current zone if None).
+
+    Args:
+        value (str): "2025-03-05", or a datetime with an offset like "2025-03-05T09:00:00.000+02:00"
+
+    Returns:
+        datetime: The datetime in tz (a date-only value is midnight of that day), or None if value isn't a date
+    """
+    tz = tz or current_zone()
+    try:
+        if len(value) == len("2025-03-05"):
+            return localize(date.fromisoformat(value), tz)
+        return localize(datetime.fromisoformat(value.replace("Z", "+00:00")), tz)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,248 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Name of the root span opened by the orchestrator for every user request
+REQUEST_SPAN = "request"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed unit of work inside a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "attributes", "children",
+                 "status", "start_time", "duration_ms", "_start")
+
+    def __init__(self, name, parent=None, attributes=None):
+        """Initialize and start the span.
+
+        Args:
+            name (str): Name of the operation (e.g. "notion.request")
+            parent (Span, optional): Enclosing span, None for the root of a new trace
+            attributes (dict, optional): Initial attributes
+        """
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration_ms = None
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key, value):
+        """Set an attribute on the span."""
+        self.attributes[key] = value
+
+    def increment(self, key, amount=1):
+        """Add to a numeric attribute such as bytes, cache_hits or retries."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self):
+        """Stop the span's clock."""
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def iter_spans(self, depth=0):
+        """Yield (depth, span) for this span and all of its descendants."""
+        yield depth, self
+        for child in list(self.children):
+            yield from child.iter_spans(depth + 1)
+
+    def to_dict(self):
+        """Flat, JSON serializable representation of the span."""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Collects spans into traces and exports finished traces."""
+
+    def __init__(self, export_path=None, otlp_path=None, service_name="notion-agent"):
+        """Initialize the tracer.
+
+        Args:
+            export_path (str, optional): JSON Lines file receiving one line per span
+            otlp_path (str, optional): File receiving one OTLP/JSON trace export request per line
+            service_name (str): Service name reported in OTLP resources
+        """
+        self.export_path = export_path
+        self.otlp_path = otlp_path
+        self.service_name = service_name
+        self._last_request = None
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Open a span as a child of the current span.
+
+        Args:
+            name (str): Name of the operation
+            **attributes: Initial span attributes
+
+        Yields:
+            Span: The open span
+        """
+        parent = _current_span.get()
+        span = Span(name, parent=parent, attributes=attributes)
+        if parent is not None:
+            parent.children.append(span)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", f"{type(e).__name__}: {str(e)}")
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            if parent is None:
+                self._finish_trace(span)
+
+    def last_request(self):
+        """Get the root span of the most recently finished request."""
+        return self._last_request
+
+    def _finish_trace(self, root):
+        """Remember and export a finished trace."""
+        if root.name == REQUEST_SPAN:
+            self._last_request = root
+
+        if not self.export_path and not self.otlp_path:
+            return
+
+        try:
+            with self._export_lock:
+                if self.export_path:
+                    with open(self.export_path, "a", encoding="utf-8") as f:
+                        for _, span in root.iter_spans():
+                            f.write(json.dumps(span.to_dict(), default=str) + "\n")
+                if self.otlp_path:
+                    with open(self.otlp_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(self.to_otlp(root), default=str) + "\n")
+        except OSError as e:
+            print(f"Error exporting trace: {str(e)}")
+
+    def to_otlp(self, root):
+        """Convert a trace to an OpenTelemetry OTLP/JSON ExportTraceServiceRequest.
+
+        Args:
+            root (Span): Root span of the trace
+
+        Returns:
+            dict: OTLP/JSON document
+        """
+        spans = []
+        for _, span in root.iter_spans():
+            start_ns = int(span.start_time * 1e9)
+            spans.append({
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent.span_id if span.parent else "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int((span.duration_ms or 0.0) * 1e6)),
+                "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 2 if span.status == "error" else 1},
+            })
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+
+    @staticmethod
+    def format_trace(root):
+        """Format a trace as an indented breakdown of where the time went.
+
+        Args:
+            root (Span): Root span of the trace
+
+        Returns:
+            str: Human readable breakdown
+        """
+        total = root.duration_ms or 0.0
+        lines = []
+        for depth, span in root.iter_spans():
+            duration = span.duration_ms or 0.0
+            share = f" ({duration / total * 100:.0f}%)" if total and depth else ""
+            attributes = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            marker = " !" if span.status == "error" else ""
+            lines.append(f"{'  ' * depth}{span.name}: {duration:.1f} ms{share}{marker}"
+                         + (f"  [{attributes}]" if attributes else ""))
+        return "\n".join(lines)
+
+
+def _otlp_attribute(key, value):
+    """Encode a key/value pair as an OTLP attribute."""
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+tracer = Tracer()
+
+
+def configure_from_env():
+    """Point trace exports at the files named by TRACE_FILE and TRACE_OTLP_FILE."""
+    tracer.export_path = os.getenv("TRACE_FILE") or None
+    tracer.otlp_path = os.getenv("TRACE_OTLP_FILE") or None
+
+
+def span(name, **attributes):
+    """Open a span on the shared tracer (see Tracer.span)."""
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """Get the innermost open span, or None outside of any trace."""
+    return _current_span.get()
+
+
+def record(key, amount=1):
+    """Add to a numeric attribute of the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.increment(key, amount)
+
+
+def traced(name):
+    """Decorator that wraps every call of a function in a span.
+
+    Args:
+        name (str): Span name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
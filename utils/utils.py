@@ -1,11 +1,16 @@
 import os
 import re
-from datetime import datetime
+from datetime import date, datetime
 from dotenv import load_dotenv
+from utils import timezones
+from utils.date_parser import parse_date, parse_dates, parse_iso
 
 # Load environment variables from .env file
 load_dotenv()
 
+# A date without a time, which Notion keeps as a whole day
+_DATE_ONLY = re.compile(r"\d{4}-\d{2}-\d{2}")
+
 def get_env_variable(var_name):
     """Get an environment variable or raise an exception if it doesn't exist."""
     value = os.getenv(var_name)
@@ -13,34 +18,44 @@ def get_env_variable(var_name):
         raise ValueError(f"Environment variable {var_name} is not set")
     return value
 
-def format_date_for_notion(date_obj):
-    """Format a date object for Notion API."""
-    from datetime import datetime
+def format_date_for_notion(date_obj, tz=None):
+    """Format a date object for Notion API.
     
-    # If it's already a string, try to parse it
+    Datetimes get an explicit UTC offset; naive ones (and strings without an offset) are taken to
+    be in tz, the user's zone of the current request by default. Dates, and strings like
+    "2025-03-05", stay dates.
+    """
+    # If it's a string, parse it (ISO or natural language)
     if isinstance(date_obj, str):
-        try:
-            # Try to parse the string as a datetime
-            date_obj = datetime.fromisoformat(date_obj.replace('Z', '+00:00'))
-        except ValueError:
-            # If it fails, try to parse as date only
+        if _DATE_ONLY.fullmatch(date_obj.strip()):
             try:
-                date_obj = datetime.strptime(date_obj, "%Y-%m-%d")
+                return date.fromisoformat(date_obj.strip()).isoformat()
             except ValueError:
-                # If all parsing fails, try natural language parsing
-                date_obj = parse_natural_language_date(date_obj)
-                # If it's still a string after natural language parsing, return it
-                # (the API will handle the error)
-                if isinstance(date_obj, str):
-                    return date_obj
+                return date_obj
+        parsed = parse_date(date_obj, tz=tz)
+        if parsed is None:
+            # Leave it to the API to report the error
+            return date_obj
+        date_obj = parsed
     
-    if isinstance(date_obj, datetime):
+    if isinstance(date_obj, (datetime, date)):
         # Format as ISO 8601 string
-        return date_obj.isoformat()
+        return timezones.to_notion(date_obj, tz)
     
     # If it's neither a string nor a datetime, return as is
     return date_obj
 
+def format_dates_for_notion(values, tz=None):
+    """Format a column of dates for Notion API at once (see date_parser.parse_dates).
+    
+    Strings that aren't dates are returned unchanged, as format_date_for_notion does.
+    """
+    parsed = parse_dates(values, tz)
+    return [format_date_for_notion(value, tz) if isinstance(value, str) and _DATE_ONLY.fullmatch(value.strip())
+            else timezones.to_notion(date_obj, tz) if date_obj is not None
+            else format_date_for_notion(value, tz) if not isinstance(value, str) else value
+            for value, date_obj in zip(values, parsed)]
+
 def extract_notion_page_id(page_url):
     """Extract the Notion page ID from a URL or ID string."""
     # If it's already just an ID (32 chars with dashes), return it
@@ -58,80 +73,18 @@ def extract_notion_page_id(page_url):
     
     raise ValueError(f"Could not extract Notion page ID from: {page_url}")
 
-# Add this function to your utils.py file
-
 def parse_date_string(date_str):
-    """Parse a date string into a datetime object."""
-    # Try to parse the string as a datetime
-    try:
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-    except ValueError:
-        # If it fails, try to parse as date only
-        try:
-            return datetime.strptime(date_str, "%Y-%m-%d")
-        except ValueError:
-            # If all parsing fails, raise ValueError
-            raise ValueError(f"Could not parse date string: {date_str}")
+    """Parse an ISO 8601 date string into a datetime object."""
+    parsed = parse_iso(date_str)
+    if parsed is None:
+        raise ValueError(f"Could not parse date string: {date_str}")
+    return parsed
 
 def parse_natural_language_date(date_string):
     """
     Parse a natural language date string into a datetime object.
     Examples: "tomorrow", "next week", "in 3 days", etc.
+
+    Returns None if the string isn't a date. Same engine as utils.date_parser, which returns ISO strings.
     """
-    from datetime import datetime, timedelta
-    import re
-    
-    # Current date as reference point
-    now = datetime.now()
-    
-    if not date_string or not isinstance(date_string, str):
-        return None
-        
-    date_string = date_string.lower().strip()
-    
-    # Handle common natural language date expressions
-    if date_string in ["today", "now"]:
-        return now
-    
-    if date_string == "tomorrow":
-        return now + timedelta(days=1)
-    
-    if date_string == "next week":
-        return now + timedelta(weeks=1)
-    
-    # Handle "in X days/weeks/months"
-    in_pattern = re.compile(r"in\s+(\d+)\s+(day|days|week|weeks|month|months)")
-    match = in_pattern.match(date_string)
-    if match:
-        amount = int(match.group(1))
-        unit = match.group(2)
-        
-        if unit in ["day", "days"]:
-            return now + timedelta(days=amount)
-        elif unit in ["week", "weeks"]:
-            return now + timedelta(weeks=amount)
-        elif unit in ["month", "months"]:
-            # Approximate a month as 30 days
-            return now + timedelta(days=30 * amount)
-    
-    # Handle "after X days/weeks/months"
-    after_pattern = re.compile(r"after\s+(\d+)\s+(day|days|week|weeks|month|months)")
-    match = after_pattern.match(date_string)
-    if match:
-        amount = int(match.group(1))
-        unit = match.group(2)
-        
-        if unit in ["day", "days"]:
-            return now + timedelta(days=amount)
-        elif unit in ["week", "weeks"]:
-            return now + timedelta(weeks=amount)
-        elif unit in ["month", "months"]:
-            # Approximate a month as 30 days
-            return now + timedelta(days=30 * amount)
-    
-    # Try standard date parsing as a fallback
-    try:
-        return parse_date_string(date_string)
-    except:
-        # If all parsing fails, return None
-        return None
\ No newline at end of file
+    return parse_date(date_string)